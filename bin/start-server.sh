@@ -48,6 +48,19 @@ if [[ $TOURNAMENT_NAME == *-test ]]; then
   python manage.py loaddata testing_db;
 fi
 
+# Pairing, judge/room assignment and the break run in their own process so
+# that they don't block the gevent workers serving everyone else. Its pool
+# solves the brackets of a round side by side, so give it every core
+JOB_CPU_POOL_WORKERS="${MITTAB_JOB_CPU_POOL_WORKERS:-$(nproc 2>/dev/null || echo 2)}"
+MITTAB_CPU_POOL_WORKERS="$JOB_CPU_POOL_WORKERS" python manage.py run_jobs &
+JOB_WORKER_PID=$!
+trap 'kill "$JOB_WORKER_PID" ${MEMCACHED_PID:+"$MEMCACHED_PID"}' EXIT
+export MITTAB_JOB_WORKER=1
+
+# Large matchings in requests (e.g. re-pairing) run in a process pool so the
+# gevent workers keep serving other requests meanwhile
+export MITTAB_CPU_POOL_WORKERS="${MITTAB_CPU_POOL_WORKERS:-1}"
+
 GUNICORN_WORKERS=${GUNICORN_WORKERS:-2}
 GUNICORN_CONNECTIONS=${GUNICORN_CONNECTIONS:-512}
 
@@ -4,7 +4,6 @@ import os
 import itertools
 import pprint
 
-from django.db import transaction
 from django import forms
 from django.core.exceptions import ValidationError
 
@@ -19,9 +18,8 @@ from mittab.apps.tab.written_rfd import (
     written_rfd_deadline_display,
     written_rfd_editing_open,
 )
-from mittab.libs import errors
+from mittab.libs import ballots, errors
 from mittab import settings
-from mittab.libs.cacheing import cache_logic
 
 
 class UploadBackupForm(forms.Form):
@@ -359,9 +357,13 @@ class ResultEntryForm(forms.Form):
     winner = forms.ChoiceField(label="Which team won the round?",
                                choices=Round.VICTOR_CHOICES)
 
+    # Refuse the ballot if the round got one since it was validated
+    first_ballot_only = False
+
     def __init__(self, *args, **kwargs):
         # Have to pop these off before sending to the super constructor
         round_object = kwargs.pop("round_instance")
+        self.round_object = round_object
         no_fill = False
         if "no_fill" in kwargs:
             kwargs.pop("no_fill")
@@ -510,44 +512,37 @@ class ResultEntryForm(forms.Form):
                     ["Non handled error, preventing data contamination"]))
         return cleaned_data
 
+    def submitted_round(self):
+        """The round the ballot is for, reusing the round the form was built on"""
+        round_id = self.cleaned_data["round_instance"]
+        if self.round_object.pk == round_id:
+            return self.round_object
+        return Round.objects.select_related("chair").get(pk=round_id)
+
+    def speaker_results(self):
+        return [
+            ballots.SpeakerResult(
+                debater_role=debater,
+                debater_id=self.deb_attr_val(debater, "debater", int),
+                speaks=self.deb_attr_val(debater, "speaks", float),
+                ranks=self.deb_attr_val(debater, "ranks", int),
+            )
+            for debater in self.DEBATERS
+        ]
+
     def save(self, _commit=True):
         cleaned_data = self.cleaned_data
-        round_obj = Round.objects.get(pk=cleaned_data["round_instance"])
+        round_obj = self.submitted_round()
 
-        if not round_obj.victor == cleaned_data["winner"]:
-            cache_logic.invalidate_cache("team_rankings")
-            cache_logic.invalidate_cache("speaker_rankings")
+        rfd = None
+        if "rfd" in cleaned_data and written_rfd_editing_open(round_obj):
+            rfd = cleaned_data.get("rfd", "")
 
-        round_obj.victor = cleaned_data["winner"]
-
-        with transaction.atomic():
-            for debater in self.DEBATERS:
-                old_stats = RoundStats.objects.filter(round=round_obj,
-                                                      debater_role=debater)
-                debater_obj = Debater.objects.get(
-                    pk=self.deb_attr_val(debater, "debater"))
-                stats = RoundStats(
-                    debater=debater_obj,
-                    round=round_obj,
-                    speaks=self.deb_attr_val(debater, "speaks", float),
-                    ranks=self.deb_attr_val(debater, "ranks", int),
-                    debater_role=debater)
-
-                if old_stats.exists():
-                    for old_stat in old_stats:
-                        if (old_stat.debater != stats.debater) or \
-                           (old_stat.speaks != stats.speaks) or \
-                           (old_stat.ranks != stats.ranks) or \
-                           (old_stat.debater_role != stats.debater_role) or \
-                           (old_stat.round != stats.round):
-                            cache_logic.invalidate_cache("team_rankings")
-                            cache_logic.invalidate_cache("speaker_rankings")
-                    old_stats.delete()
-                stats.save()
-            round_obj.save()
-            if "rfd" in self.cleaned_data and written_rfd_editing_open(round_obj):
-                round_obj.rfd = self.cleaned_data.get("rfd", "")
-                round_obj.save(update_fields=["rfd"])
+        ballots.commit_ballot(round_obj,
+                              cleaned_data["winner"],
+                              self.speaker_results(),
+                              rfd=rfd,
+                              first_ballot=self.first_ballot_only)
         return round_obj
 
     def deb_attr_val(self, position, attr, cast=None):
@@ -572,6 +567,8 @@ class EBallotForm(ResultEntryForm):
         min_length=0,
     )
 
+    first_ballot_only = True
+
     def __init__(self, *args, **kwargs):
         ballot_code = ""
 
@@ -583,7 +580,7 @@ class EBallotForm(ResultEntryForm):
 
     def clean(self):
         cleaned_data = self.cleaned_data
-        round_obj = Round.objects.get(pk=cleaned_data["round_instance"])
+        round_obj = self.submitted_round()
         cur_round = TabSettings.get("cur_round", 0) - 1
 
         try:
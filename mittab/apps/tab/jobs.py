@@ -0,0 +1,116 @@
+"""
+Tab operations that are run by the job worker, see ``mittab.libs.jobs``
+"""
+from django.db import transaction
+
+from mittab.apps.tab.models import Outround, TabSettings
+from mittab.libs import assign_judges, assign_rooms, backup
+from mittab.libs import outround_tab_logic, tab_logic
+from mittab.libs.cacheing import cache_logic
+from mittab.libs.cacheing.public_cache import (
+    invalidate_inround_public_pairings_cache,
+    invalidate_public_ballots_cache,
+    invalidate_public_rankings_cache,
+)
+from mittab.libs.errors import JudgeAssignmentError, RoomAssignmentError
+from mittab.libs.jobs import register_job, report_progress
+
+
+def _scope_label(round_specs):
+    return ", ".join(
+        f"Ro{num_teams}-{'Varsity' if round_type == Outround.VARSITY else 'Novice'}"
+        for round_type, num_teams in round_specs
+    )
+
+
+@register_job("pair_round", "Pairing Round",
+              failure_message="Could not pair next round, got error: {error}")
+def pair_round():
+    cache_logic.clear_cache()
+    current_round = TabSettings.objects.get(key="cur_round")
+    TabSettings.set("pairing_released", 0)
+    report_progress(5, "Backing up the tournament")
+    backup.backup_round(btype=backup.BEFORE_PAIRING)
+
+    report_progress(20, f"Pairing round {current_round.value}")
+    with transaction.atomic():
+        tab_logic.pair_round()
+        invalidate_inround_public_pairings_cache()
+        current_round.value = current_round.value + 1
+        current_round.save()
+        invalidate_public_ballots_cache()
+        invalidate_public_rankings_cache()
+    return True, f"Paired round {current_round.value - 1}"
+
+
+@register_job("preview_re_pair", "Previewing the Re-Pair",
+              failure_message="Could not preview the re-pair, got error: {error}")
+def preview_re_pair():
+    report_progress(20, "Working out the new pairing")
+    tab_logic.store_re_pair_preview(tab_logic.preview_re_pair())
+    return True, "The re-pair preview is ready"
+
+
+@register_job("add_judges", "Assigning Judges",
+              failure_message="Got error during judge assignment")
+def add_judges():
+    current_round_number = TabSettings.objects.get(key="cur_round").value - 1
+    report_progress(5, "Backing up the tournament")
+    backup.backup_round(round_number=current_round_number,
+                        btype=backup.BEFORE_JUDGE_ASSIGN)
+    report_progress(20, f"Assigning judges to round {current_round_number}")
+    try:
+        assign_judges.add_judges()
+    except JudgeAssignmentError as e:
+        return False, str(e).replace("'", "")
+    return True, "Judges assigned successfully."
+
+
+@register_job("add_rooms", "Assigning Rooms",
+              failure_message="Got error during room assignment")
+def add_rooms():
+    current_round_number = TabSettings.objects.get(key="cur_round").value - 1
+    report_progress(5, "Backing up the tournament")
+    backup.backup_round(round_number=current_round_number,
+                        btype=backup.BEFORE_ROOM_ASSIGN)
+    report_progress(20, f"Assigning rooms to round {current_round_number}")
+    assign_rooms.add_rooms()
+    return True, "Rooms assigned successfully."
+
+
+@register_job("add_outround_judges", "Assigning Outround Judges",
+              failure_message="Got error during judge assignment")
+def add_outround_judges(round_specs):
+    round_specs = [tuple(spec) for spec in round_specs]
+    report_progress(5, "Backing up the tournament")
+    backup.backup_round(round_number=_scope_label(round_specs),
+                        btype=backup.BEFORE_JUDGE_ASSIGN)
+    report_progress(20, f"Assigning judges to {_scope_label(round_specs)}")
+    try:
+        assign_judges.add_outround_judges(round_specs=round_specs)
+    except JudgeAssignmentError as e:
+        return False, str(e).replace("'", "")
+    return True, "Outround judges assigned successfully."
+
+
+@register_job("add_outround_rooms", "Assigning Outround Rooms",
+              failure_message="Got error during room assignment")
+def add_outround_rooms(round_specs):
+    round_specs = [tuple(spec) for spec in round_specs]
+    report_progress(5, "Backing up the tournament")
+    backup.backup_round(round_number=_scope_label(round_specs),
+                        btype=backup.BEFORE_ROOM_ASSIGN)
+    report_progress(20, f"Assigning rooms to {_scope_label(round_specs)}")
+    try:
+        assign_rooms.add_outround_rooms(round_specs=round_specs)
+    except RoomAssignmentError as e:
+        return False, str(e).replace("'", "")
+    return True, "Outround rooms assigned successfully."
+
+
+@register_job("perform_the_break", "Breaking Teams")
+def perform_the_break():
+    report_progress(5, "Backing up the tournament")
+    backup.backup_round(btype=backup.BEFORE_BREAK)
+    report_progress(20, "Ranking teams and pairing the first outrounds")
+    return outround_tab_logic.perform_the_break()
@@ -0,0 +1,272 @@
+import json
+import platform
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from mittab.apps.tab.models import (
+    CheckIn,
+    Debater,
+    Judge,
+    Outround,
+    Room,
+    RoomCheckIn,
+    School,
+    TabSettings,
+    Team,
+)
+from mittab.libs import assign_judges, assign_rooms, outround_tab_logic, tab_logic
+from mittab.libs.cacheing import cache_logic
+from mittab.libs.tab_logic.rankings import rank_speakers, rank_teams
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the tabbing stages on a synthetic tournament. "
+            "THIS ERASES THE CONFIGURED DATABASE, point it at a scratch one.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--teams", dest="teams", type=int, default=64,
+                            help="The number of teams to generate")
+        parser.add_argument("--judges", dest="judges", type=int, default=None,
+                            help="The number of judges to generate, defaults "
+                                 "to enough for every round and outround")
+        parser.add_argument("--rooms", dest="rooms", type=int, default=None,
+                            help="The number of rooms to generate, defaults "
+                                 "to one per pairing plus a few spares")
+        parser.add_argument("--rounds", dest="rounds", type=int, default=5,
+                            help="The number of inrounds to pair and simulate")
+        parser.add_argument("--var-break", dest="var_break", type=int, default=8,
+                            help="Varsity teams to break, 0 to skip outrounds")
+        parser.add_argument("--nov-break", dest="nov_break", type=int, default=4,
+                            help="Novice teams to break")
+        parser.add_argument("--seed", dest="seed", type=int, default=0,
+                            help="Seed for the generated tournament and results")
+        parser.add_argument("--skip-memory", dest="skip_memory",
+                            action="store_true", default=False,
+                            help="Don't trace peak memory, which slows every "
+                                 "stage down")
+        parser.add_argument("--output", dest="output", default=None,
+                            help="Write the results as JSON to this file")
+        parser.add_argument("--baseline", dest="baseline", default=None,
+                            help="A previous --output file to compare against")
+        parser.add_argument("--noinput", "--no-input", dest="interactive",
+                            action="store_false", default=True,
+                            help="Don't ask before erasing the database")
+
+    def handle(self, *args, **options):
+        if options["teams"] < 4:
+            raise CommandError("Need at least 4 teams")
+
+        db_name = connection.settings_dict["NAME"]
+        if options["interactive"]:
+            confirm = input(f"This will erase every row in {db_name}. "
+                            "Type 'yes' to continue: ")
+            if confirm != "yes":
+                raise CommandError("Benchmark cancelled")
+
+        self.stdout.write("Clearing data from database")
+        call_command("flush", interactive=False, verbosity=0)
+
+        random.seed(options["seed"])
+        sizes = generate_tournament(options)
+        self.stdout.write(
+            f"Generated {sizes['teams']} teams, {sizes['judges']} judges and "
+            f"{sizes['rooms']} rooms"
+        )
+
+        self.bench = Bench(trace_memory=not options["skip_memory"])
+        for round_number in range(1, options["rounds"] + 1):
+            self.run_inround(round_number)
+        self.bench.measure("rank_teams", None, rank_teams)
+        self.bench.measure("rank_speakers", None, rank_speakers)
+        if options["var_break"]:
+            self.run_outrounds(options["var_break"], options["nov_break"])
+
+        results = {
+            "config": dict(sizes,
+                           rounds=options["rounds"],
+                           var_break=options["var_break"],
+                           nov_break=options["nov_break"],
+                           seed=options["seed"],
+                           trace_memory=not options["skip_memory"],
+                           database=connection.vendor,
+                           python=platform.python_version()),
+            "stages": self.bench.results,
+        }
+
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"], encoding="utf-8") as baseline_file:
+                baseline = json.load(baseline_file)
+        self.write_summary(results, baseline)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Wrote results to {options['output']}")
+
+    def run_inround(self, round_number):
+        self.stdout.write(f"Round {round_number}...")
+        self.bench.measure("pair_round", round_number, pair_round)
+        self.bench.measure("add_judges", round_number, assign_judges.add_judges)
+        self.bench.measure("add_rooms", round_number, assign_rooms.add_rooms)
+        call_command("simulate_rounds")
+
+    def run_outrounds(self, var_break, nov_break):
+        self.stdout.write("Outrounds...")
+        self.bench.measure("perform_the_break", None, perform_the_break)
+        specs = [(Outround.VARSITY, var_break)]
+        if nov_break:
+            specs.append((Outround.NOVICE, nov_break))
+        self.bench.measure("add_outround_judges", None,
+                           assign_judges.add_outround_judges, round_specs=specs)
+        self.bench.measure("add_outround_rooms", None,
+                           assign_rooms.add_outround_rooms, specs)
+
+    def write_summary(self, results, baseline=None):
+        previous = {}
+        if baseline is not None:
+            previous = {(stage["stage"], stage["round"]): stage
+                        for stage in baseline["stages"]}
+
+        header = f"{'stage':<22}{'round':>6}{'seconds':>10}{'queries':>9}" \
+                 f"{'peak KiB':>10}"
+        if previous:
+            header += f"{'vs base':>9}"
+        self.stdout.write(header)
+        for stage in results["stages"]:
+            peak = stage["peak_memory_kb"]
+            row = f"{stage['stage']:<22}{stage['round'] or '-':>6}" \
+                  f"{stage['seconds']:>10.3f}{stage['queries']:>9}" \
+                  f"{'-' if peak is None else peak:>10}"
+            old = previous.get((stage["stage"], stage["round"]))
+            if old and old["seconds"]:
+                row += f"{stage['seconds'] / old['seconds']:>8.2f}x"
+            self.stdout.write(row)
+
+
+class Bench:
+    """Times a stage and counts its queries and peak Python allocations"""
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.results = []
+
+    def measure(self, stage, round_number, fxn, *args, **kwargs):
+        # Every stage should start cold, the way it does on a tab request
+        cache_logic.clear_cache()
+        if self.trace_memory:
+            tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            result = fxn(*args, **kwargs)
+            seconds = time.perf_counter() - start
+        peak_memory_kb = None
+        if self.trace_memory:
+            peak_memory_kb = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.stop()
+
+        self.results.append({
+            "stage": stage,
+            "round": round_number,
+            "seconds": round(seconds, 6),
+            "queries": len(queries),
+            "peak_memory_kb": peak_memory_kb,
+        })
+        return result
+
+
+def pair_round():
+    """Pair the next round the way the pair round view does"""
+    with transaction.atomic():
+        tab_logic.pair_round()
+        TabSettings.set("cur_round", TabSettings.get("cur_round") + 1)
+
+
+def perform_the_break():
+    success, msg = outround_tab_logic.perform_the_break()
+    if not success:
+        raise CommandError(msg)
+
+
+def generate_tournament(options):
+    num_teams = options["teams"]
+    num_rounds = options["rounds"]
+    pairings = num_teams // 2
+    outround_panels = (options["var_break"] // 2 + options["nov_break"] // 2) * 3
+    num_judges = options["judges"] or max(pairings, outround_panels) + 4
+    num_rooms = options["rooms"] or pairings + 4
+
+    TabSettings.set("tot_rounds", num_rounds)
+    TabSettings.set("cur_round", 1)
+    TabSettings.set("var_teams_to_break", options["var_break"])
+    TabSettings.set("nov_teams_to_break", options["nov_break"])
+
+    schools = School.objects.bulk_create(
+        [School(name=f"Bench School {i}") for i in range(max(2, num_teams // 4))]
+    )
+
+    teams, team_debaters = [], []
+    for i in range(num_teams):
+        # About a quarter of the field is novice so that there is a novice break
+        novice = i % 4 == 3
+        status = Debater.NOVICE if novice else Debater.VARSITY
+        school = schools[i % len(schools)]
+        debaters = [Debater(name=f"Bench Debater {i}-{j}",
+                            novice_status=status,
+                            school=school)
+                    for j in range(2)]
+        team_debaters.append(debaters)
+        teams.append(Team(name=f"Bench Team {i}",
+                          school=school,
+                          seed=random.choice(Team.SEED_CHOICES)[0],
+                          break_preference=Team.NOVICE if novice else Team.VARSITY))
+    Debater.objects.bulk_create(
+        [debater for debaters in team_debaters for debater in debaters]
+    )
+    Team.objects.bulk_create(teams)
+    Team.debaters.through.objects.bulk_create([
+        Team.debaters.through(team_id=team.id, debater_id=debater.id)
+        for team, debaters in zip(teams, team_debaters)
+        for debater in debaters
+    ])
+
+    judges = Judge.objects.bulk_create([
+        Judge(name=f"Bench Judge {i}",
+              rank=Decimal(random.randint(100, 1000)) / 100)
+        for i in range(num_judges)
+    ])
+    Judge.schools.through.objects.bulk_create([
+        Judge.schools.through(judge_id=judge.id,
+                              school_id=random.choice(schools).id)
+        for judge in judges
+    ])
+
+    rooms = Room.objects.bulk_create([
+        Room(name=f"Bench Room {i}",
+             rank=Decimal(random.randint(100, 1000)) / 100)
+        for i in range(num_rooms)
+    ])
+
+    # Round 0 is the outround check in
+    round_numbers = range(0, num_rounds + 1)
+    CheckIn.objects.bulk_create([
+        CheckIn(judge=judge, round_number=round_number)
+        for judge in judges for round_number in round_numbers
+    ])
+    RoomCheckIn.objects.bulk_create([
+        RoomCheckIn(room=room, round_number=round_number)
+        for room in rooms for round_number in round_numbers
+    ])
+
+    return {
+        "teams": num_teams,
+        "judges": num_judges,
+        "rooms": num_rooms,
+    }
@@ -5,6 +5,8 @@ from django.core.management.base import BaseCommand
 
 from mittab.apps.tab.models import Debater
 from mittab.libs import tab_logic
+from mittab.libs.cacheing.cache_logic import stat_memo_scope
+from mittab.libs.tab_logic.rankings import RANKS, SPEAKS
 
 
 class Command(BaseCommand):
@@ -44,10 +46,11 @@ class Command(BaseCommand):
                 tab_logic.tot_wins(team), tab_logic.tot_speaks(team),
                 tab_logic.tot_ranks(team))
 
-    def make_debater_row(self, debater):
-        return (debater.name, debater.team().name if debater.team() else "",
-                tab_logic.tot_speaks_deb(debater),
-                tab_logic.tot_ranks_deb(debater))
+    def make_debater_row(self, deb_score):
+        debater = deb_score.debater
+        team = tab_logic.debater_team(debater)
+        return (debater.name, team.name if team else "",
+                deb_score[SPEAKS], deb_score[RANKS])
 
     def write_to_csv(self, filename, headers, rows):
         with open(filename, "w", encoding="utf-8", newline="") as f:
@@ -55,6 +58,7 @@ class Command(BaseCommand):
             writer.writerow(headers)
             writer.writerows(rows)
 
+    @stat_memo_scope()
     def handle(self, *args, **kwargs):
         if not os.path.exists(kwargs["root"]):
             os.makedirs(kwargs["root"])
@@ -74,13 +78,12 @@ class Command(BaseCommand):
             for team_score in tab_logic.rankings.rank_teams()
             if is_novice_team(team_score.team)
         ]
-        debaters = [
-            self.make_debater_row(deb_score.debater)
-            for deb_score in tab_logic.rankings.rank_speakers()
-        ]
+        # The speaker scores already hold every stat the rows need
+        speakers = tab_logic.rankings.rank_speakers()
+        debaters = [self.make_debater_row(deb_score) for deb_score in speakers]
         nov_debaters = [
-            self.make_debater_row(deb_score.debater)
-            for deb_score in tab_logic.rankings.rank_speakers()
+            self.make_debater_row(deb_score)
+            for deb_score in speakers
             if deb_score.debater.novice_status == Debater.NOVICE
         ]
 
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from mittab.libs import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued tab jobs (pairing, judge/room assignment and the break)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll-interval",
+                            dest="poll_interval",
+                            type=float,
+                            default=1.0,
+                            help="seconds to wait between checks of an empty queue")
+        parser.add_argument("--once",
+                            dest="once",
+                            action="store_true",
+                            help="exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Waiting for tab jobs")
+        jobs.work(poll_interval=options["poll_interval"], once=options["once"])
@@ -18,6 +18,7 @@ from mittab.apps.tab.helpers import redirect_and_flash_info
 from mittab.apps.tab.public_rankings import get_standings_publication_setting
 from mittab.apps.tab.views.tournament_todo_views import StaffLoginView
 from mittab.libs.backup import is_backup_active
+from mittab.libs.cacheing.cache_logic import stat_memo_scope
 
 LOGIN_WHITELIST = ("/", "/public/", "/public/login/", "/public/pairings/",
                    "/public/missing-ballots/","/public/e-ballots/",
@@ -214,3 +215,17 @@ class FailoverDuringBackup:
                 """
             )
         return self.get_response(request)
+
+
+class StatMemoScope:
+    """
+    Memoize stat calculations (wins, speaks, opp strength, ...) for the
+    duration of a single request
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with stat_memo_scope():
+            return self.get_response(request)
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.26 on 2026-10-18 11:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tab', '0046_judgecodeemaillog_source'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DebaterStanding',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('speaks', models.FloatField(default=0)),
+                ('ranks', models.FloatField(default=0)),
+                ('single_adjusted_speaks', models.FloatField(default=0)),
+                ('single_adjusted_ranks', models.FloatField(default=0)),
+                ('double_adjusted_speaks', models.FloatField(default=0)),
+                ('double_adjusted_ranks', models.FloatField(default=0)),
+                ('cur_round', models.IntegerField()),
+                ('lenient_late', models.IntegerField()),
+                ('dirty', models.BooleanField(default=False)),
+                ('debater', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='standing', to='tab.debater')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TeamStanding',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.IntegerField(choices=[(0, 'All rounds'), (1, 'Public (excluding the last round)')], default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('speaks', models.FloatField(default=0)),
+                ('ranks', models.FloatField(default=0)),
+                ('single_adjusted_speaks', models.FloatField(default=0)),
+                ('single_adjusted_ranks', models.FloatField(default=0)),
+                ('double_adjusted_speaks', models.FloatField(default=0)),
+                ('double_adjusted_ranks', models.FloatField(default=0)),
+                ('opp_strength', models.FloatField(default=0)),
+                ('cur_round', models.IntegerField()),
+                ('lenient_late', models.IntegerField()),
+                ('dirty', models.BooleanField(default=False)),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='tab.team')),
+            ],
+            options={
+                'unique_together': {('team', 'scope')},
+            },
+        ),
+    ]
@@ -174,18 +174,7 @@ class TabSettings(models.Model):
 
     @classmethod
     def get(cls, key, default=_TABSETTING_MISSING):
-        def safe_get():
-            setting = cls.objects.filter(key=key).first()
-            if setting is not None:
-                return (setting.value_string if setting.value_string
-                        is not None else setting.value)
-            return None
-
-        result = cache_logic.cache_fxn_key(
-            safe_get,
-            f"tab_settings_{key}",
-            cache_logic.PERSISTENT,
-        )
+        result = _tab_settings_snapshot.get().get(key)
         if result is None and default is _TABSETTING_MISSING:
             raise ValueError(f"No TabSetting with key '{key}'")
         elif result is None:
@@ -193,6 +182,17 @@ class TabSettings(models.Model):
         else:
             return result
 
+    @classmethod
+    def load_all(cls):
+        """Every setting by key, loaded with a single query"""
+        values = {}
+        # Iterated newest first so that, as with get(), the oldest row of a
+        # duplicated key wins
+        for key, value, value_string in cls.objects.order_by("-pk").values_list(
+                "key", "value", "value_string"):
+            values[key] = value_string if value_string is not None else value
+        return values
+
     @classmethod
     def set(cls, key, value):
         if isinstance(value, str):
@@ -212,22 +212,24 @@ class TabSettings(models.Model):
                                      value_string=value_string)
 
     def delete(self, using=None, keep_parents=False):
-        cache_logic.invalidate_cache(f"tab_settings_{self.key}",
-                                     cache_logic.PERSISTENT)
         if self.key == SPEAKER_SINGLE_ADJUSTED_RANKINGS_SETTING:
-            cache_logic.invalidate_cache("speaker_rankings")
+            cache_logic.invalidate_rankings()
         super(TabSettings, self).delete(using, keep_parents)
+        _tab_settings_snapshot.invalidate()
 
     def save(self,
              force_insert=False,
              force_update=False,
              using=None,
              update_fields=None):
-        cache_logic.invalidate_cache(f"tab_settings_{self.key}",
-                                     cache_logic.PERSISTENT)
         if self.key == SPEAKER_SINGLE_ADJUSTED_RANKINGS_SETTING:
-            cache_logic.invalidate_cache("speaker_rankings")
+            cache_logic.invalidate_rankings()
         super(TabSettings, self).save(force_insert, force_update, using, update_fields)
+        _tab_settings_snapshot.invalidate()
+
+
+_tab_settings_snapshot = cache_logic.ProcessSnapshot("tab_settings",
+                                                     TabSettings.load_all)
 
 
 class UserTournamentSetupPreference(models.Model):
@@ -1064,6 +1066,44 @@ class AuditEvent(models.Model):
         return f"{self.label} {self.object_repr} by {self.user_display}"
 
 
+class TabJob(models.Model):
+    """A long running tab operation, queued for the job worker"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    )
+    ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+    kind = models.CharField(max_length=50, db_index=True)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20,
+                              choices=STATUS_CHOICES,
+                              default=QUEUED,
+                              db_index=True)
+    result_message = models.TextField(blank=True, default="")
+    success_url = models.CharField(max_length=255, default="/")
+    failure_url = models.CharField(max_length=255, default="/")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at", "id"]
+
+    @property
+    def finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def __str__(self):
+        return f"{self.kind} ({self.get_status_display()})"
+
+
 class Bye(models.Model):
     bye_team = models.ForeignKey(Team, related_name="byes", on_delete=models.CASCADE)
     round_number = models.IntegerField()
@@ -1108,6 +1148,62 @@ class RoundStats(models.Model):
         return f"Results for {self.debater} in round {self.round.round_number}"
 
 
+class TeamStanding(models.Model):
+    """
+    Stored result of the team ranking stats, maintained by
+    ``mittab.libs.tab_logic.standings``. ``scope`` says which rounds were
+    counted, ``cur_round`` and ``lenient_late`` record the settings the row
+    was computed under and ``dirty`` is set whenever a result it depends on
+    changes.
+    """
+    ALL_ROUNDS = 0
+    PUBLIC = 1
+    SCOPE_CHOICES = (
+        (ALL_ROUNDS, "All rounds"),
+        (PUBLIC, "Public (excluding the last round)"),
+    )
+    team = models.ForeignKey(Team,
+                             related_name="standings",
+                             on_delete=models.CASCADE)
+    scope = models.IntegerField(choices=SCOPE_CHOICES, default=ALL_ROUNDS)
+    wins = models.IntegerField(default=0)
+    speaks = models.FloatField(default=0)
+    ranks = models.FloatField(default=0)
+    single_adjusted_speaks = models.FloatField(default=0)
+    single_adjusted_ranks = models.FloatField(default=0)
+    double_adjusted_speaks = models.FloatField(default=0)
+    double_adjusted_ranks = models.FloatField(default=0)
+    opp_strength = models.FloatField(default=0)
+    cur_round = models.IntegerField()
+    lenient_late = models.IntegerField()
+    dirty = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ("team", "scope")
+
+    def __str__(self):
+        return f"Standing for {self.team} ({self.get_scope_display()})"
+
+
+class DebaterStanding(models.Model):
+    """Stored result of the speaker ranking stats, see ``TeamStanding``"""
+    debater = models.OneToOneField(Debater,
+                                   related_name="standing",
+                                   on_delete=models.CASCADE)
+    speaks = models.FloatField(default=0)
+    ranks = models.FloatField(default=0)
+    single_adjusted_speaks = models.FloatField(default=0)
+    single_adjusted_ranks = models.FloatField(default=0)
+    double_adjusted_speaks = models.FloatField(default=0)
+    double_adjusted_ranks = models.FloatField(default=0)
+    cur_round = models.IntegerField()
+    lenient_late = models.IntegerField()
+    dirty = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"Standing for {self.debater}"
+
+
 class CheckIn(models.Model):
     judge = models.ForeignKey(Judge, on_delete=models.CASCADE)
     round_number = models.IntegerField()
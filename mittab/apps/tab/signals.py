@@ -1,7 +1,16 @@
-from django.db.models.signals import m2m_changed
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from mittab.apps.tab.models import ManualJudgeAssignment, Round
+from mittab.apps.tab.models import (
+    Bye,
+    ManualJudgeAssignment,
+    NoShow,
+    Round,
+    RoundStats,
+    Team,
+)
+from mittab.libs.tab_logic import standings
 
 
 @receiver(m2m_changed, sender=Round.judges.through)
@@ -51,3 +60,68 @@ def track_manual_judge_assignments(instance, action, reverse, pk_set, **kwargs):
         else:
             round_obj = instance
             ManualJudgeAssignment.objects.filter(round=round_obj).delete()
+
+
+# Standings bookkeeping: every write that can change a stat marks the
+# standings it touches as dirty, see mittab.libs.tab_logic.standings
+
+
+@receiver(pre_save, sender=Round)
+def mark_previous_round_teams_dirty(instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    # The round may be moving to new teams, the old ones lose it
+    standings.mark_teams_dirty(
+        Q(team__gov_team__pk=instance.pk) | Q(team__opp_team__pk=instance.pk)
+    )
+
+
+@receiver(post_save, sender=Round)
+@receiver(post_delete, sender=Round)
+def mark_round_teams_dirty(instance, raw=False, **kwargs):
+    if raw:
+        return
+    standings.mark_team_ids_dirty(instance.gov_team_id, instance.opp_team_id)
+
+
+@receiver(post_save, sender=RoundStats)
+@receiver(post_delete, sender=RoundStats)
+def mark_round_stats_debater_dirty(instance, raw=False, **kwargs):
+    if raw:
+        return
+    standings.mark_debaters_dirty(Q(debater_id=instance.debater_id))
+
+
+@receiver(post_save, sender=Bye)
+@receiver(post_delete, sender=Bye)
+def mark_bye_team_dirty(instance, raw=False, **kwargs):
+    if raw:
+        return
+    standings.mark_team_ids_dirty(instance.bye_team_id)
+
+
+@receiver(post_save, sender=NoShow)
+@receiver(post_delete, sender=NoShow)
+def mark_no_show_team_dirty(instance, raw=False, **kwargs):
+    if raw:
+        return
+    standings.mark_team_ids_dirty(instance.no_show_team_id)
+
+
+@receiver(m2m_changed, sender=Team.debaters.through)
+def mark_team_membership_dirty(instance, action, reverse, pk_set, **kwargs):
+    if action not in {"post_add", "post_remove", "pre_clear"}:
+        return
+
+    if reverse:
+        debater_filter = Q(debater=instance)
+        team_filter = Q(team__debaters=instance)
+        if pk_set:
+            team_filter |= Q(team_id__in=pk_set)
+    else:
+        team_filter = Q(team=instance)
+        debater_filter = Q(debater__team=instance)
+        if pk_set:
+            debater_filter |= Q(debater_id__in=pk_set)
+    standings.mark_teams_dirty(team_filter)
+    standings.mark_debaters_dirty(debater_filter)
@@ -177,6 +177,7 @@ def rank_debaters_ajax(request):
                   {"title": "Debater Rankings"})
 
 
+@cache_logic.stat_memo_scope()
 def get_speaker_rankings(request=None):
     speakers = tab_logic.rank_speakers()
     debaters = []
@@ -193,7 +194,7 @@ def get_speaker_rankings(request=None):
             debater_stats.debater,
             debater_stats[rankings.SPEAKS],
             debater_stats[rankings.RANKS],
-            debater_stats.debater.team(),
+            tab_logic.debater_team(debater_stats.debater),
             tiebreaker,
             _speaker_score_columns(debater_stats),
         ))
@@ -207,7 +208,7 @@ def get_speaker_rankings(request=None):
 def rank_debaters(request):
     debaters, nov_debaters = cache_logic.cache_fxn_key(
         get_speaker_rankings,
-        "speaker_rankings",
+        cache_logic.rankings_key("speaker_rankings"),
         cache_logic.DEFAULT,
         request
     )
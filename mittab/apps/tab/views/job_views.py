@@ -0,0 +1,43 @@
+from django.contrib.auth.decorators import permission_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, render
+
+from mittab.apps.tab.helpers import redirect_and_flash_error, \
+    redirect_and_flash_success
+from mittab.apps.tab.models import TabJob
+from mittab.libs import jobs
+
+
+def _job_json(job):
+    progress = jobs.job_progress(job)
+    return {
+        "id": job.pk,
+        "kind": job.kind,
+        "status": job.status,
+        "finished": job.finished,
+        "percent": progress["percent"],
+        "message": progress["message"],
+    }
+
+
+@permission_required("tab.tab_settings.can_change", login_url="/403/")
+def job_status(request, job_id):
+    job = get_object_or_404(TabJob, pk=job_id)
+    if job.status == TabJob.SUCCEEDED:
+        return redirect_and_flash_success(request, job.result_message,
+                                          path=job.success_url)
+    if job.status == TabJob.FAILED:
+        return redirect_and_flash_error(request, job.result_message,
+                                        path=job.failure_url)
+
+    registered = jobs.JOBS.get(job.kind)
+    return render(request, "pairing/job_status.html", {
+        "title": registered.title if registered else job.kind,
+        "job": _job_json(job),
+    })
+
+
+@permission_required("tab.tab_settings.can_change", login_url="/403/")
+def job_progress(request, job_id):
+    job = get_object_or_404(TabJob, pk=job_id)
+    return JsonResponse(_job_json(job))
@@ -6,6 +6,7 @@ from django.urls import reverse
 
 from mittab.apps.tab.helpers import redirect_and_flash_error, redirect_and_flash_success
 from mittab.apps.tab.models import Motion, TabSettings, BreakingTeam
+from mittab.libs.cacheing import data_versions
 from mittab.libs.cacheing.public_cache import cache_public_view, invalidate_public_motions_cache
 
 
@@ -213,7 +214,7 @@ def unpublish_all_motions(request):
     return redirect_and_flash_success(request, "All motions unpublished.", path=reverse("manage_motions"))
 
 
-@cache_public_view(timeout=60)
+@cache_public_view(timeout=60, depends_on=(data_versions.MOTIONS,))
 def public_motions(request):
     motions_enabled = TabSettings.get("motions_enabled", 0)
 
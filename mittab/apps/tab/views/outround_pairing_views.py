@@ -9,10 +9,10 @@ from django.contrib.contenttypes.models import ContentType
 from django.db.models import Q, Exists, OuterRef, Min
 from django.shortcuts import redirect, reverse
 
-from mittab.apps.tab.helpers import redirect_and_flash_error, \
-    redirect_and_flash_success
+from mittab.apps.tab.helpers import get_redirect_target, \
+    redirect_and_flash_error, redirect_and_flash_success
 from mittab.apps.tab.models import *
-from mittab.libs import assign_judges, assign_rooms
+from mittab.libs import assign_judges, assign_rooms, jobs
 from mittab.libs.errors import *
 from mittab.apps.tab.forms import OutroundResultEntryForm
 import mittab.libs.tab_logic as tab_logic
@@ -53,8 +53,9 @@ def pair_next_outround(request, num_teams, type_of_round):
 
     check_status = []
 
-    judges = outround_tab_logic.have_enough_judges_type(type_of_round)
-    rooms = outround_tab_logic.have_enough_rooms_type(type_of_round)
+    status = outround_tab_logic.OutroundStatus.load()
+    judges = status.enough_judges(type_of_round)
+    rooms = status.enough_rooms(type_of_round)
 
     msg = (
         "Enough judges checked in for Out-rounds? "
@@ -283,17 +284,10 @@ def _existing_selected_specs(selected_specs):
 def break_teams(request):
     if request.method == "POST":
         # Perform the break
-        backup.backup_round(btype=backup.BEFORE_BREAK)
-
-        success, msg = outround_tab_logic.perform_the_break()
-
-        if success:
-            return redirect_and_flash_success(
-                request, msg, path="/outround_pairing"
-            )
-        return redirect_and_flash_error(
-            request, msg, path="/"
-        )
+        job = jobs.enqueue("perform_the_break",
+                           success_url="/outround_pairing",
+                           failure_url="/")
+        return redirect("job_status", job_id=job.pk)
 
     # See if we can pair the round
     title = "Pairing Outrounds"
@@ -394,7 +388,7 @@ def outround_pairing_view(request,
             else option["path"]
         )
 
-    lost_outrounds = [t.loser.id for t in Outround.objects.all() if t.loser]
+    status = outround_tab_logic.OutroundStatus.load()
 
     outround_sections = []
     excluded_teams_map = {}
@@ -435,25 +429,14 @@ def outround_pairing_view(request,
             "pairing_released": pairing_released,
         })
 
-        section_excluded_teams = BreakingTeam.objects.filter(
-            type_of_team=selected_type
-        ).exclude(
-            team__id__in=lost_outrounds
-        )
-        section_excluded_teams = [t.team for t in section_excluded_teams]
-        section_excluded_teams = [
-            t for t in section_excluded_teams
-            if not Outround.objects.filter(
-                type_of_round=selected_type,
-                num_teams=selected_num,
-                gov_team=t
-            ).exists()
-            and not Outround.objects.filter(
-                type_of_round=selected_type,
-                num_teams=selected_num,
-                opp_team=t
-            ).exists()
+        paired_ids = {outround.gov_team_id for outround in section_outrounds}
+        paired_ids |= {outround.opp_team_id for outround in section_outrounds}
+        unpaired_ids = [
+            team_id for team_id in status.remaining.get(selected_type, [])
+            if team_id not in paired_ids
         ]
+        unpaired = Team.objects.in_bulk(unpaired_ids)
+        section_excluded_teams = [unpaired[team_id] for team_id in unpaired_ids]
         for team in section_excluded_teams:
             excluded_teams_map[team.id] = team
     excluded_teams = list(excluded_teams_map.values())
@@ -597,7 +580,7 @@ def alternative_judges(request, round_id, judge_id=None):
     # All of these variables are for the convenience of the template
     try:
         current_judge_id = int(judge_id)
-        current_judge_obj = Judge.objects.prefetch_related("scratches", "schools").get(
+        current_judge_obj = Judge.objects.get(
             id=current_judge_id
         )
         current_judge_name = current_judge_obj.name
@@ -618,7 +601,7 @@ def alternative_judges(request, round_id, judge_id=None):
     )
     checked_in_judges = Judge.objects.filter(
         checkin__round_number=0
-    ).prefetch_related("scratches", "schools", "judges").distinct()
+    ).prefetch_related("judges").distinct()
     if selected_specs:
         included_judges = checked_in_judges.filter(scope_filter).distinct()
         occupied_in_scope = included_judges.exclude(
@@ -1035,24 +1018,12 @@ def assign_judges_to_pairing(request, round_type=None):
             request, "No valid outround scope selected for judge assignment."
         )
 
-    try:
-        scope_label = ", ".join(
-            f"Ro{num_teams}-{'Varsity' if round_type == Outround.VARSITY else 'Novice'}"
-            for round_type, num_teams in selected_specs
-        )
-        backup.backup_round(
-            round_number=scope_label,
-            btype=backup.BEFORE_JUDGE_ASSIGN
-        )
-        assign_judges.add_outround_judges(round_specs=selected_specs)
-    except JudgeAssignmentError as e:
-        return redirect_and_flash_error(request, str(e).replace("'", ""))
-    except Exception:
-        emit_current_exception()
-        return redirect_and_flash_error(request,
-                                        "Got error during judge assignment")
-
-    return redirect_and_flash_success(request, "Outround judges assigned successfully.")
+    redirect_to = get_redirect_target(request)
+    job = jobs.enqueue("add_outround_judges",
+                       success_url=redirect_to,
+                       failure_url=redirect_to,
+                       round_specs=selected_specs)
+    return redirect("job_status", job_id=job.pk)
 
 
 @permission_required("tab.tab_settings.can_change", login_url="/403/")
@@ -1068,21 +1039,9 @@ def assign_rooms_to_pairing(request):
             request, "No valid outround scope selected for room assignment."
         )
 
-    try:
-        scope_label = ", ".join(
-            f"Ro{num_teams}-{'Varsity' if round_type == Outround.VARSITY else 'Novice'}"
-            for round_type, num_teams in selected_specs
-        )
-        backup.backup_round(
-            round_number=scope_label,
-            btype=backup.BEFORE_ROOM_ASSIGN
-        )
-        assign_rooms.add_outround_rooms(round_specs=selected_specs)
-    except RoomAssignmentError as e:
-        return redirect_and_flash_error(request, str(e).replace("'", ""))
-    except Exception:
-        emit_current_exception()
-        return redirect_and_flash_error(request,
-                                        "Got error during room assignment")
-
-    return redirect_and_flash_success(request, "Outround rooms assigned successfully.")
+    redirect_to = get_redirect_target(request)
+    job = jobs.enqueue("add_outround_rooms",
+                       success_url=redirect_to,
+                       failure_url=redirect_to,
+                       round_specs=selected_specs)
+    return redirect("job_status", job_id=job.pk)
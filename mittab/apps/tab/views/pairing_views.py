@@ -11,17 +11,17 @@ from django.contrib.auth.decorators import permission_required
 from django.contrib import messages
 from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
-from django.db.models import Exists, OuterRef
+from django.db.models import Exists, OuterRef, prefetch_related_objects
 from django.shortcuts import redirect
 
-from mittab.apps.tab.helpers import redirect_and_flash_error, \
-    redirect_and_flash_success
+from mittab.apps.tab.helpers import get_redirect_target, \
+    redirect_and_flash_error, redirect_and_flash_success
 from mittab.apps.tab.models import *
 from mittab.apps.tab.written_rfd import (
     round_allows_written_rfd,
     written_rfd_editing_open,
 )
-from mittab.libs import assign_rooms
+from mittab.libs import assign_rooms, jobs, profiler
 from mittab.libs.errors import *
 from mittab.apps.tab.forms import BackupForm, ResultEntryForm, \
     UploadBackupForm, score_panel, \
@@ -33,45 +33,28 @@ import mittab.libs.tab_logic as tab_logic
 import mittab.libs.assign_judges as assign_judges
 from mittab.libs.assign_judges import judge_team_rejudge_counts
 import mittab.libs.backup as backup
+from mittab.libs.tab_logic.pairing_data import judge_team_counts, load_round_pairings
 from mittab.libs.tab_logic.stats import get_all_round_stats
 from mittab.libs.cacheing.public_cache import (
     invalidate_inround_public_pairings_cache,
-    invalidate_public_rankings_cache,
+    invalidate_public_ballots_cache,
 )
 
 logger = logging.getLogger(__name__)
 
 
-def invalidate_public_ballot_cache():
-    tot_rounds = int(TabSettings.get("tot_rounds", 0) or 0)
-    for round_number in range(1, tot_rounds + 1):
-        cache_logic.invalidate_cache(f"public_ballots_round_{round_number}")
-    invalidate_public_rankings_cache()
-
-
 @permission_required("tab.tab_settings.can_change", login_url="/403/")
 def pair_round(request):
     cache_logic.clear_cache()
     current_round = TabSettings.objects.get(key="cur_round")
     current_round_number = current_round.value
     if request.method == "POST":
-        # We should pair the round
-        try:
-            TabSettings.set("pairing_released", 0)
-            backup.backup_round(btype=backup.BEFORE_PAIRING)
-
-            with transaction.atomic():
-                tab_logic.pair_round()
-                invalidate_inround_public_pairings_cache()
-                current_round.value = current_round.value + 1
-                current_round.save()
-                invalidate_public_ballot_cache()
-        except Exception as exp:
-            emit_current_exception()
-            return redirect_and_flash_error(
-                request,
-                f"Could not pair next round, got error: {exp}")
-        return view_status(request)
+        # We should pair the round, the job worker does it and the status page
+        # shows how far along it is
+        job = jobs.enqueue("pair_round",
+                           success_url=reverse("view_status"),
+                           failure_url=get_redirect_target(request))
+        return redirect("job_status", job_id=job.pk)
     else:
         # See if we can pair the round
         title = f"Pairing Round {current_round_number}"
@@ -139,11 +122,15 @@ def re_pair_round(request):
     """
     Re-pair the current round by clearing existing pairings and
     re-running the pairing algorithm.
-    This is a safe operation that:
+    The confirmation page can queue a preview of what the re-pair would
+    change, which is shown once it is ready. Confirming it:
     1. Backs up the current state
     2. Clears Round, Bye, and NoShow objects for the current round
     3. Decrements cur_round temporarily
     4. Re-runs the pairing algorithm which will re-increment cur_round
+
+    Only brackets whose teams or records changed since the preview are
+    matched again.
     """
     cache_logic.clear_cache()
     current_round_obj = TabSettings.objects.get(key="cur_round")
@@ -155,6 +142,12 @@ def re_pair_round(request):
             "No round has been paired yet to re-pair"
         )
 
+    if request.method == "POST" and "preview" in request.POST:
+        job = jobs.enqueue("preview_re_pair",
+                           success_url=reverse("re_pair_round"),
+                           failure_url=reverse("re_pair_round"))
+        return redirect("job_status", job_id=job.pk)
+
     if request.method == "POST":
         try:
             backup_name = (
@@ -167,16 +160,8 @@ def re_pair_round(request):
             )
 
             with transaction.atomic():
-                tab_logic.clear_current_round_pairing()
-
-                # Decrement cur_round so pair_round() will pair for same round
-                current_round_obj.value = current_round_number
-                current_round_obj.save()
-
-                # Re-run the pairing algorithm
-                tab_logic.pair_round()
-                current_round_obj.value = current_round_obj.value + 1
-                current_round_obj.save()
+                tab_logic.re_pair_current_round()
+            tab_logic.clear_re_pair_preview(current_round_number)
 
             # Add success message and redirect to view_status
             messages.add_message(
@@ -192,42 +177,31 @@ def re_pair_round(request):
                 f"Could not re-pair round, got error: {exp}"
             )
 
+    diff, previewed_at = tab_logic.stored_re_pair_preview(current_round_number)
     return render(request, "pairing/confirm_re_pair.html", {
         "round_number": current_round_number,
+        "diff": diff,
+        "previewed_at": previewed_at,
     })
 
 
 @permission_required("tab.tab_settings.can_change", login_url="/403/")
 def assign_judges_to_pairing(request):
-    current_round_number = TabSettings.objects.get(key="cur_round").value - 1
     if request.method == "POST":
-        try:
-            backup.backup_round(
-                round_number=current_round_number,
-                btype=backup.BEFORE_JUDGE_ASSIGN)
-            assign_judges.add_judges()
-        except JudgeAssignmentError as e:
-            return redirect_and_flash_error(request, str(e).replace("'", ""))
-        except Exception:
-            emit_current_exception()
-            return redirect_and_flash_error(request,
-                                            "Got error during judge assignment")
+        job = jobs.enqueue("add_judges",
+                           success_url="/pairings/status/",
+                           failure_url=get_redirect_target(request))
+        return redirect("job_status", job_id=job.pk)
     return redirect("/pairings/status/")
 
 
 @permission_required("tab.tab_settings.can_change", login_url="/403/")
 def assign_rooms_to_pairing(request):
-    current_round_number = TabSettings.objects.get(key="cur_round").value - 1
     if request.method == "POST":
-        try:
-            backup.backup_round(
-                round_number=current_round_number,
-                btype=backup.BEFORE_ROOM_ASSIGN)
-            assign_rooms.add_rooms()
-        except Exception:
-            emit_current_exception()
-            return redirect_and_flash_error(request,
-                                            "Got error during room assignment")
+        job = jobs.enqueue("add_rooms",
+                           success_url="/pairings/status/",
+                           failure_url=get_redirect_target(request))
+        return redirect("job_status", job_id=job.pk)
     return redirect("/pairings/status/")
 
 
@@ -431,7 +405,11 @@ def restore_backup(request, filename):
 
 def view_status(request):
     current_round_number = TabSettings.get("cur_round") - 1
-    return view_round(request, current_round_number)
+    return view_round(request, current_round_number, show_profiles=True)
+
+
+def operation_profiles(request):
+    return JsonResponse(profiler.recent_runs())
 
 
 def quick_judge_checkin(request):
@@ -514,25 +492,23 @@ def quick_judge_checkin(request):
     })
 
 
-def view_round(request, round_number):
+def view_round(request, round_number, show_profiles=False):
     errors, excluded_teams = [], []
 
     tot_rounds = TabSettings.get("tot_rounds", 5)
 
-    round_pairing = tab_logic.sorted_pairings(
-        round_number
-    )
+    round_pairing, tag_names = load_round_pairings(round_number)
     warnings = []
     for pairing in round_pairing:
         if pairing.room is None:
             continue
-        required_tags = assign_rooms.get_required_tags(pairing)
-        actual_tags = set(pairing.room.tags.all())
+        required_tags = pairing.required_tag_ids()
+        actual_tags = pairing.room.tag_ids
 
         if not required_tags <= actual_tags:
             missing_tags = required_tags - actual_tags
             plural = "s" if len(missing_tags) > 1 else ""
-            missing_tags_str = ", ".join(str(tag) for tag in missing_tags)
+            missing_tags_str = ", ".join(tag_names[tag] for tag in missing_tags)
 
             warnings.append(
                 f"{pairing.gov_team} vs {pairing.opp_team} "
@@ -569,15 +545,16 @@ def view_round(request, round_number):
         for entry in audit_entries:
             manual_judge_audit_events.setdefault(entry.object_id, []).append(entry)
 
-    all_judges_in_round = [j for pairing in round_info for j in pairing.judges.all()]
+    all_judges_in_round = [j for pairing in round_info for j in pairing.judges]
 
     if all_judges_in_round:
-        all_teams = []
+        all_team_ids = set()
         for pairing in round_info:
-            all_teams.extend([pairing.gov_team, pairing.opp_team])
+            all_team_ids.update([pairing.gov_team.id, pairing.opp_team.id])
 
-        # Make single batch call instead of nested loops (fixes N+1 issue)
-        display_counts = judge_team_rejudge_counts(all_judges_in_round, all_teams)
+        display_counts = judge_team_counts(
+            [judge.id for judge in all_judges_in_round], all_team_ids
+        )
 
         judge_rejudge_counts = {}
         for judge in all_judges_in_round:
@@ -596,10 +573,11 @@ def view_round(request, round_number):
 
     paired_teams = [team.gov_team for team in round_pairing
                     ] + [team.opp_team for team in round_pairing]
+    paired_team_ids = {team.id for team in paired_teams}
     n_over_two = Team.objects.filter(checked_in=True).count() / 2
 
     for present_team in Team.objects.filter(checked_in=True):
-        if present_team not in paired_teams:
+        if present_team.id not in paired_team_ids:
             excluded_teams.append(present_team)
 
     excluded_teams_no_bye = [team for team in excluded_teams
@@ -611,7 +589,7 @@ def view_round(request, round_number):
     )
     pairing_exists = len(round_pairing) > 0
     pairing_released = TabSettings.get("pairing_released", 0) == 1
-    judges_assigned = all((r.judges.count() > 0 for r in round_info))
+    judges_assigned = all((len(r.judges) > 0 for r in round_info))
     rooms_assigned = all((r.room is not None for r in round_info))
     excluded_judges = Judge.objects.exclude(
         judges__round_number=round_number).filter(
@@ -673,6 +651,7 @@ def view_round(request, round_number):
         "manual_judge_assignment_labels": manual_judge_assignment_labels,
         "manual_judge_audit_events": manual_judge_audit_events,
         "all_schools": School.objects.order_by("name"),
+        "operation_profiles": profiler.recent_runs() if show_profiles else {},
     }
     return render(request, "pairing/pairing_control.html", context)
 
@@ -683,10 +662,10 @@ def alternative_judges(request, round_id, judge_id=None):
     round_gov, round_opp = round_obj.gov_team, round_obj.opp_team
     excluded_judges = Judge.objects.exclude(judges__round_number=round_number) \
                                    .filter(checkin__round_number=round_number) \
-                                   .prefetch_related("judges", "scratches", "schools")
+                                   .prefetch_related("judges")
     included_judges = Judge.objects.filter(judges__round_number=round_number) \
                                    .filter(checkin__round_number=round_number) \
-                                   .prefetch_related("judges", "scratches", "schools")
+                                   .prefetch_related("judges")
 
     excluded_judges_list = assign_judges.can_judge_teams(
         excluded_judges, round_gov, round_opp)
@@ -697,7 +676,7 @@ def alternative_judges(request, round_id, judge_id=None):
     try:
         current_judge_id = int(judge_id)
         current_judge_obj = Judge.objects.prefetch_related(
-            "judges", "scratches", "schools").get(id=current_judge_id)
+            "judges").get(id=current_judge_id)
         current_judge_name = current_judge_obj.name
         current_judge_rank = current_judge_obj.rank
     except TypeError:
@@ -783,17 +762,22 @@ def team_stats(request, round_number, outround=False):
     """
     Returns the tab card data for all teams in the pairings of this given round number
     """
-    if outround:
-        pairings = tab_logic.sorted_pairings(round_number, outround=True)
-    else:
-        pairings = tab_logic.sorted_pairings(round_number)
+    standings = tab_logic.Standings.load()
+    pairings = tab_logic.sorted_pairings(round_number, outround=outround,
+                                         standings=standings)
+    # num_govs and num_opps count every round the team has been in
+    prefetch_related_objects(
+        [team for p in pairings for team in (p.gov_team, p.opp_team) if team],
+        "gov_team", "opp_team", "gov_team_outround", "opp_team_outround",
+    )
     stats_by_team_id = {}
 
     def stats_for_team(team):
         stats = {}
+        team_stats = standings.team_stats(team.id)
         stats["seed"] = Team.get_seed_display(team).split(" ")[0]
-        stats["wins"] = tab_logic.tot_wins(team)
-        stats["total_speaks"] = tab_logic.tot_speaks(team)
+        stats["wins"] = team_stats.wins
+        stats["total_speaks"] = team_stats.speaks
         stats["govs"] = tab_logic.num_govs(team)
         stats["opps"] = tab_logic.num_opps(team)
         stats["debaters"] = ", ".join(
@@ -1015,6 +999,7 @@ def enter_result(request,
             except ValueError:
                 return redirect_and_flash_error(
                     request, "Invalid round result, could not remedy.")
+            invalidate_public_ballots_cache()
             return redirect_and_flash_success(request,
                                               "Result entered successfully",
                                               path=redirect_to)
@@ -33,7 +33,13 @@ from mittab.apps.tab.views.debater_views import get_speaker_rankings
 from mittab.apps.registration.models import InfoLink, RegistrationConfig
 from mittab.apps.tab.views.pairing_views import enter_result
 from mittab.libs.bracket_display_logic import get_bracket_data_json
-from mittab.libs.cacheing.public_cache import cache_public_view
+from mittab.libs.errors import BallotAlreadyEnteredError
+from mittab.libs.outround_tab_logic import OutroundStatus
+from mittab.libs.cacheing import data_versions
+from mittab.libs.cacheing.public_cache import (
+    cache_public_view,
+    invalidate_public_ballots_cache,
+)
 from mittab.libs.tab_logic import rankings
 from mittab.apps.tab.written_rfd import (
     round_allows_written_rfd,
@@ -100,7 +106,11 @@ def _fallback_favicon_response():
     return FileResponse(open(favicon_path, "rb"), content_type="image/x-icon")
 
 
-@cache_public_view(timeout=60)
+@cache_public_view(timeout=60, depends_on=(
+    data_versions.PAIRINGS,
+    data_versions.outrounds(BreakingTeam.VARSITY),
+    data_versions.outrounds(BreakingTeam.NOVICE),
+))
 def public_home(request):
     # Drain any pending flash messages (e.g. "Successfully logged out") before
     # we render. The response is cached for 60s and shared across visitors, so
@@ -223,7 +233,7 @@ def public_home(request):
         },
     )
 
-@cache_public_view(timeout=60)
+@cache_public_view(timeout=60, depends_on=(data_versions.JUDGES,))
 def public_view_judges(request):
     display_judges = TabSettings.get("judges_public", 0)
 
@@ -245,7 +255,7 @@ def public_view_judges(request):
     )
 
 
-@cache_public_view(timeout=60)
+@cache_public_view(timeout=60, depends_on=(data_versions.TEAMS,))
 def public_view_teams(request):
     display_teams = TabSettings.get("teams_public", 0)
 
@@ -263,7 +273,7 @@ def public_view_teams(request):
         })
 
 
-@cache_public_view(timeout=60)
+@cache_public_view(timeout=60, depends_on=(data_versions.RANKINGS,))
 def rank_teams_public(request):
     settings = get_ranking_settings("team")
     if not settings["public"]:
@@ -285,7 +295,7 @@ def rank_teams_public(request):
     )
 
 
-@cache_public_view(timeout=60)
+@cache_public_view(timeout=60, depends_on=(data_versions.RANKINGS,))
 def public_speaker_rankings(request):
     ranking_configs = {
         "varsity": get_ranking_settings("varsity"),
@@ -330,7 +340,8 @@ def public_speaker_rankings(request):
     )
 
 
-@cache_public_view(timeout=60)
+@cache_public_view(timeout=60, depends_on=(data_versions.RANKINGS,
+                                               data_versions.BALLOTS))
 def public_ballots(request):
     tot_rounds = int(TabSettings.get("tot_rounds", 0) or 0)
     ballot_settings = get_all_ballot_round_settings(tot_rounds)
@@ -489,7 +500,7 @@ def serialize_debaters(team, stats_by_debater):
         "ranks": getattr(stats_by_debater.get(debater.id), "ranks", None),
     } for debater in team.debaters.all()]
 
-@cache_public_view(timeout=60)
+@cache_public_view(timeout=60, depends_on=(data_versions.PAIRINGS,))
 def pretty_pair(request):
     errors, byes = [], []
 
@@ -543,7 +554,8 @@ def pretty_pair(request):
     return render(request, "public/pairing_display.html", context)
 
 
-@cache_public_view(timeout=30)
+@cache_public_view(timeout=30, depends_on=(data_versions.PAIRINGS,
+                                               data_versions.BALLOTS))
 def missing_ballots(request):
     round_number = TabSettings.get("cur_round") - 1
     rounds = Round.objects.prefetch_related("gov_team", "opp_team",
@@ -932,20 +944,29 @@ def enter_e_ballot(request, ballot_code):
         round_id = request.POST.get("round_instance")
 
         if round_id:
-            round_obj = Round.objects.prefetch_related(
-                "judges", "chair", "gov_team", "gov_team__debaters",
-                "opp_team", "opp_team__debaters", "roundstats_set",
-                "roundstats_set__debater",
+            # Only what validating the ballot reads, the form builds the
+            # debater choices from the teams
+            round_obj = Round.objects.select_related(
+                "chair", "gov_team", "opp_team",
+            ).prefetch_related(
+                "gov_team__debaters", "opp_team__debaters",
             ).get(id=round_id)
 
             form = EBallotForm(request.POST, round_instance=round_obj)
             if form.is_valid():
                 try:
                     form.save()
+                except BallotAlreadyEnteredError:
+                    return redirect_and_flash_error(
+                        request,
+                        "A ballot has already been completed for this round. "
+                        "Go to tab if you need to change the results.",
+                        path=reverse("e_ballot_search"))
                 except ValueError:
                     return redirect_and_flash_error(
                         request, "Invalid round result, could not remedy.",
                         path=reverse("e_ballot_search"))
+                invalidate_public_ballots_cache()
                 # Redirect to frozen ballot view
                 return redirect(
                     reverse(
@@ -1035,7 +1056,9 @@ def enter_e_ballot(request, ballot_code):
     return redirect_and_flash_error(request, message, path=reverse("tab_login"))
 
 
-@cache_public_view(timeout=60)
+@cache_public_view(timeout=60, depends_on=(
+    data_versions.outrounds("{type_of_round}"),
+))
 def outround_pretty_pair(request, type_of_round=BreakingTeam.VARSITY):
     gov_opp_display = TabSettings.get("gov_opp_display", 0)
 
@@ -1057,28 +1080,19 @@ def outround_pretty_pair(request, type_of_round=BreakingTeam.VARSITY):
 
     outround_pairings = []
 
-    for value in unique_values:
-        lost_outrounds = [t.loser.id for t in Outround.objects.all() if t.loser]
+    remaining_ids = OutroundStatus.load().remaining.get(type_of_round, [])
+    remaining = Team.objects.in_bulk(remaining_ids)
 
-        excluded_teams = BreakingTeam.objects.filter(
-            type_of_team=type_of_round
-        ).exclude(
-            team__id__in=lost_outrounds
-        )
-
-        excluded_teams = [t.team for t in excluded_teams]
-
-        excluded_teams = [t for t in excluded_teams if not Outround.objects.filter(
-            type_of_round=type_of_round,
-            num_teams=value,
-            gov_team=t
-        ).exists()]
-
-        excluded_teams = [t for t in excluded_teams if not Outround.objects.filter(
-            type_of_round=type_of_round,
-            num_teams=value,
-            opp_team=t
-        ).exists()]
+    for value in unique_values:
+        paired_ids = set()
+        for gov_team_id, opp_team_id in Outround.objects.filter(
+                type_of_round=type_of_round,
+                num_teams=value
+        ).values_list("gov_team_id", "opp_team_id"):
+            paired_ids.update((gov_team_id, opp_team_id))
+
+        excluded_teams = [remaining[team_id] for team_id in remaining_ids
+                          if team_id not in paired_ids]
 
         outround_pairings.append({
             "label": f"[{'N' if type_of_round else 'V'}] Ro{value}",
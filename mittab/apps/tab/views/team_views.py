@@ -450,7 +450,7 @@ def rank_teams_ajax(request):
 def rank_teams(request):
     teams, nov_teams = cache_logic.cache_fxn_key(
         rankings.get_team_rankings,
-        "team_rankings_private",
+        cache_logic.rankings_key("team_rankings_private"),
         cache_logic.DEFAULT,
         request,
         public=False
@@ -1,7 +1,9 @@
 import random
+from collections import defaultdict
 from types import SimpleNamespace
-from django.db.models import Min
-from mittab.libs import tab_logic, mwmatching, errors
+from django.db.models import Min, Q
+from mittab.libs import tab_logic, matching, errors, profiler
+from mittab.libs.cacheing.cache_logic import stat_memo_scope
 from mittab.apps.tab.models import *
 
 class JudgePairingMode:
@@ -41,6 +43,7 @@ def get_inround_settings():
         ),
         allow_rejudges=TabSettings.get("allow_rejudges", False),
         rejudge_penalty=TabSettings.get("rejudge_penalty", 100),
+        candidate_limit=TabSettings.get("judge_candidate_limit", 0),
     )
 
 
@@ -96,7 +99,10 @@ def construct_judge_scores(judges, mode=JudgePairingMode.DEFAULT):
     return judge_scores
 
 
+@profiler.profile_operation("add_judges")
+@stat_memo_scope()
 def add_judges():
+    profiler.checkpoint("load")
     round_number = TabSettings.get("cur_round") - 1
     pairing_settings = get_inround_settings()
 
@@ -112,10 +118,9 @@ def add_judges():
             checkin__round_number=round_number
         ).prefetch_related(
             "judges",  # poorly named relation for the round
-            "scratches",
-            "schools",
         )
     )
+    conflict_index = ConflictIndex.load()
 
     # Sort all_judges once before creating filtered subsets
     random.seed(1337)
@@ -124,7 +129,8 @@ def add_judges():
 
     chairs = [j for j in all_judges if not j.wing_only]
 
-    pairings = tab_logic.sorted_pairings(round_number)
+    standings = tab_logic.Standings.load()
+    pairings = tab_logic.sorted_pairings(round_number, standings=standings)
 
     random.seed(1337)
     random.shuffle(pairings)
@@ -135,20 +141,24 @@ def add_judges():
         pairing_settings.round_priority == InroundRoundPriority.BUBBLE_ROUNDS
     )
     if bubble_priority and round_number > 1:
-        bubble_rounds = [p for p in pairings if is_bubble_round(p, round_number)]
+        bubble_rounds = [
+            p for p in pairings if is_bubble_round(p, round_number, standings)
+        ]
         non_bubble_rounds = [p for p in pairings if p not in bubble_rounds]
 
         def pairing_sort_key(pairing):
-            return tab_logic.team_comp(pairing, round_number)
+            return tab_logic.team_comp(pairing, round_number, standings)
 
         bubble_rounds.sort(key=pairing_sort_key, reverse=True)
         non_bubble_rounds.sort(key=pairing_sort_key, reverse=True)
         pairings = bubble_rounds + non_bubble_rounds
     else:
         pairings.sort(
-            key=lambda x: tab_logic.team_comp(x, round_number), reverse=True
+            key=lambda x: tab_logic.team_comp(x, round_number, standings),
+            reverse=True
         )
 
+    profiler.checkpoint("chairs")
     num_rounds = len(pairings)
     all_teams = []
     for pairing in pairings:
@@ -162,10 +172,10 @@ def add_judges():
         chair_score = chair_scores[chair_i]
 
         for pairing_i, pairing in enumerate(pairings):
-            has_conflict = judge_conflict(
-                chair,
-                pairing.gov_team,
-                pairing.opp_team,
+            has_conflict = conflict_index.judge_conflict(
+                chair.id,
+                pairing.gov_team_id,
+                pairing.opp_team_id,
                 pairing_settings.allow_rejudges,
             )
             if has_conflict:
@@ -186,7 +196,9 @@ def add_judges():
                 weight -= penalty * rejudge_sum
 
             graph_edges.append((pairing_i, num_rounds + chair_i, weight))
-    judge_assignments = mwmatching.maxWeightMatching(graph_edges, maxcardinality=True)
+    judge_assignments = match_judges(
+        graph_edges, num_rounds, pairing_settings.candidate_limit, "Chair"
+    )
 
     if -1 in judge_assignments[:num_rounds] or (num_rounds > 0 and not graph_edges):
         if not graph_edges:
@@ -237,6 +249,7 @@ def add_judges():
         )
 
     Round.objects.bulk_update(pairings, ["chair"])
+    profiler.checkpoint("wings")
     if (
             pairing_settings.pair_wings
             and num_rounds
@@ -267,10 +280,10 @@ def add_judges():
                 judge_score = wing_judge_scores[wing_judge_i]
                 for pairing_i in pairing_indices:
                     pairing = pairings[pairing_i]
-                    has_conflict = judge_conflict(
-                        judge,
-                        pairing.gov_team,
-                        pairing.opp_team,
+                    has_conflict = conflict_index.judge_conflict(
+                        judge.id,
+                        pairing.gov_team_id,
+                        pairing.opp_team_id,
                         pairing_settings.allow_rejudges,
                     )
                     if has_conflict:
@@ -305,7 +318,9 @@ def add_judges():
             if not wing_edges:
                 break
 
-            wing_matches = mwmatching.maxWeightMatching(wing_edges, maxcardinality=True)
+            wing_matches = match_judges(
+                wing_edges, num_rounds, pairing_settings.candidate_limit, "Wing"
+            )
             for pairing_i, padded_wing_judge_i in enumerate(wing_matches[:num_rounds]):
                 if padded_wing_judge_i == -1:
                     continue
@@ -321,9 +336,52 @@ def add_judges():
                 )
                 assigned_judge_objects.add(judge.id)
 
+    profiler.checkpoint("writes")
     Round.judges.through.objects.bulk_create(judge_round_joins)
 
 
+def prune_candidate_edges(graph_edges, limit):
+    """
+    Keep only the ``limit`` highest weight edges of each pairing, where each
+    edge is ``(pairing_i, padded_judge_i, weight)``
+    """
+    by_pairing = {}
+    for edge in graph_edges:
+        by_pairing.setdefault(edge[0], []).append(edge)
+    pruned = []
+    for edges in by_pairing.values():
+        edges.sort(key=lambda edge: edge[2], reverse=True)
+        pruned.extend(edges[:limit])
+    return pruned
+
+
+def match_judges(graph_edges, num_rounds, candidate_limit=0, label="Judge"):
+    """
+    Match judges to pairings. With a candidate limit only the best judges
+    for each pairing are considered, falling back to the full graph if that
+    matches fewer pairings than the judges available could cover.
+    """
+    if candidate_limit > 0:
+        pruned_edges = prune_candidate_edges(graph_edges, candidate_limit)
+        if len(pruned_edges) < len(graph_edges):
+            judges = {edge[1] for edge in graph_edges}
+            matches = matching.max_weight_matching(
+                pruned_edges, maxcardinality=True, num_left=num_rounds
+            )
+            matched = sum(1 for mate in matches[:num_rounds] if mate != -1)
+            fell_back = matched < min(num_rounds, len(judges))
+            profiler.note(
+                f"{label} matching kept {len(pruned_edges)} of {len(graph_edges)} "
+                f"candidate edges ({len(pruned_edges) / len(graph_edges):.0%})"
+                + (", falling back to the full graph" if fell_back else "")
+            )
+            if not fell_back:
+                return matches
+    return matching.max_weight_matching(
+        graph_edges, maxcardinality=True, num_left=num_rounds
+    )
+
+
 def _normalize_round_specs(round_specs=None, round_type=None):
     if round_specs is None:
         if round_type is None:
@@ -391,6 +449,27 @@ def _build_active_pairings(
     return active_pairings
 
 
+def _panel_slots(round_specs, pairings_by_spec, panel_size_by_spec,
+                 snake_draft_mode, force_novice_last):
+    """
+    Every seat to fill as ``(pairing, panel_member)``, seat by seat in the
+    order the seats used to be drafted in, chairs first
+    """
+    max_panel_size = max(panel_size_by_spec.values()) if panel_size_by_spec else 0
+    slots = []
+    for panel_member in range(max_panel_size):
+        active_pairings = _build_active_pairings(
+            round_specs=round_specs,
+            pairings_by_spec=pairings_by_spec,
+            panel_size_by_spec=panel_size_by_spec,
+            panel_member=panel_member,
+            snake_draft_mode=snake_draft_mode,
+            force_novice_last=force_novice_last,
+        )
+        slots.extend((pairing, panel_member) for pairing in active_pairings)
+    return slots
+
+
 def _assign_outround_judges_for_specs(
         round_specs,
         pairings_by_spec,
@@ -399,73 +478,81 @@ def _assign_outround_judges_for_specs(
         judge_scores,
         pairing_settings,
         available_indices,
+        conflict_index,
         force_novice_last=False):
+    """
+    Fill every panel seat of the given rounds in a single matching. Each
+    seat is weighted by its position in the draft order, so a judge is only
+    penalised for sitting in a seat a better judge was due, and a conflict
+    early in the draft can be made up for anywhere on the panels rather than
+    only in the seats drafted after it. Returns the judge joins and the total
+    weight of the matching.
+    """
     link_outround = Outround.judges.through
-    judge_round_joins = []
-
-    max_panel_size = max(panel_size_by_spec.values()) if panel_size_by_spec else 0
     snake_draft_mode = (
         pairing_settings.draft_mode == OutroundJudgePairingMode.SNAKE_DRAFT
     )
-
-    for panel_member in range(max_panel_size):
-        active_pairings = _build_active_pairings(
-            round_specs=round_specs,
-            pairings_by_spec=pairings_by_spec,
-            panel_size_by_spec=panel_size_by_spec,
-            panel_member=panel_member,
-            snake_draft_mode=snake_draft_mode,
-            force_novice_last=force_novice_last,
-        )
-        num_rounds = len(active_pairings)
-        if num_rounds == 0:
-            continue
-
-        graph_edges = []
-        for judge_i in available_indices:
-            judge = judges[judge_i]
-            for pairing_i, pairing in enumerate(active_pairings):
-                has_conflict = judge_conflict(
-                    judge,
-                    pairing.gov_team,
-                    pairing.opp_team,
+    slots = _panel_slots(round_specs, pairings_by_spec, panel_size_by_spec,
+                         snake_draft_mode, force_novice_last)
+    num_slots = len(slots)
+    if num_slots == 0:
+        return [], 0
+
+    eligible = {}
+    for pairing, _ in slots:
+        if pairing.id not in eligible:
+            eligible[pairing.id] = [
+                judge_i for judge_i in available_indices
+                if not conflict_index.judge_conflict(
+                    judges[judge_i].id,
+                    pairing.gov_team_id,
+                    pairing.opp_team_id,
                     True,
                 )
-                if has_conflict:
-                    continue
-                weight = calc_weight(
-                    judge_scores[judge_i],
-                    pairing_i,
-                    pairing_settings.mode,
-                    num_rounds=num_rounds,
-                )
-                graph_edges.append((pairing_i, num_rounds + judge_i, weight))
+            ]
 
-        panel_matches = mwmatching.maxWeightMatching(
-            graph_edges,
-            maxcardinality=True,
-        )
-        if -1 in panel_matches[:num_rounds] or (num_rounds > 0 and not graph_edges):
-            if not graph_edges:
-                raise errors.JudgeAssignmentError("Impossible to assign judges.")
-            pairing_list = panel_matches[:len(active_pairings)]
-            bad_pairing = active_pairings[pairing_list.index(-1)]
-            raise errors.JudgeAssignmentError(
-                f"Could not find a judge for: {bad_pairing}"
+    graph_edges = []
+    weights = {}
+    for slot_i, (pairing, _) in enumerate(slots):
+        for judge_i in eligible[pairing.id]:
+            weight = calc_weight(
+                judge_scores[judge_i],
+                slot_i,
+                pairing_settings.mode,
+                num_rounds=num_slots,
             )
+            weights[slot_i, judge_i] = weight
+            graph_edges.append((slot_i, num_slots + judge_i, weight))
+
+    if not graph_edges:
+        raise errors.JudgeAssignmentError("Impossible to assign judges.")
+    slot_matches = matching.max_weight_matching(
+        graph_edges,
+        maxcardinality=True,
+        num_left=num_slots,
+    )[:num_slots]
+    if -1 in slot_matches:
+        bad_pairing = slots[slot_matches.index(-1)][0]
+        raise errors.JudgeAssignmentError(
+            f"Could not find a judge for: {bad_pairing}"
+        )
 
-        for pairing_i, padded_judge_i in enumerate(panel_matches[:num_rounds]):
-            judge_i = padded_judge_i - num_rounds
-            round_obj = active_pairings[pairing_i]
-            judge = judges[judge_i]
+    judge_round_joins = []
+    objective = 0
+    for slot_i, padded_judge_i in enumerate(slot_matches):
+        judge_i = padded_judge_i - num_slots
+        round_obj, panel_member = slots[slot_i]
+        judge = judges[judge_i]
+        objective += weights[slot_i, judge_i]
 
-            if panel_member == 0:
-                round_obj.chair = judge
+        if panel_member == 0:
+            round_obj.chair = judge
 
-            judge_round_joins.append(link_outround(judge=judge, outround=round_obj))
-            available_indices.remove(judge_i)
+        judge_round_joins.append(link_outround(judge=judge, outround=round_obj))
 
-    return judge_round_joins
+    used = {padded_judge_i - num_slots for padded_judge_i in slot_matches}
+    available_indices[:] = [i for i in available_indices if i not in used]
+    return judge_round_joins, objective
 
 
 def _collect_outround_pairing_data(round_specs, round_priority):
@@ -491,7 +578,14 @@ def _collect_outround_pairing_data(round_specs, round_priority):
     return pairings_by_spec, panel_size_by_spec
 
 
+@profiler.profile_operation("add_outround_judges")
+@stat_memo_scope()
 def add_outround_judges(round_type=Outround.VARSITY, round_specs=None):
+    """
+    Fill the panels of the undecided outrounds in scope. The total weight of
+    the panels is noted on the profiled run and returned.
+    """
+    profiler.checkpoint("load")
     normalized_specs = _normalize_round_specs(round_specs, round_type=round_type)
     if not normalized_specs:
         return
@@ -514,15 +608,8 @@ def add_outround_judges(round_type=Outround.VARSITY, round_specs=None):
     Outround.judges.through.objects.filter(outround_id__in=active_round_ids).delete()
     Outround.objects.filter(id__in=active_round_ids).update(chair=None)
 
-    judges = list(
-        Judge.objects.filter(
-            checkin__round_number=0
-        ).prefetch_related(
-            "judges",
-            "scratches",
-            "schools",
-        )
-    )
+    judges = list(Judge.objects.filter(checkin__round_number=0))
+    conflict_index = ConflictIndex.load()
     random.seed(1337)
     random.shuffle(judges)
     judges = sorted(judges, key=lambda j: j.rank, reverse=True)
@@ -537,39 +624,43 @@ def add_outround_judges(round_type=Outround.VARSITY, round_specs=None):
         and pairing_settings.judge_priority == OutroundJudgePriority.NOVICE_CHAIRS
     )
 
+    profiler.checkpoint("panels")
     judge_round_joins = []
+    objective = 0
     if run_joint_novice_chairs:
-        judge_round_joins.extend(
-            _assign_outround_judges_for_specs(
-                round_specs=normalized_specs,
-                pairings_by_spec=pairings_by_spec,
-                panel_size_by_spec=panel_size_by_spec,
-                judges=judges,
-                judge_scores=judge_scores,
-                pairing_settings=pairing_settings,
-                available_indices=available_indices,
-                force_novice_last=True,
-            )
+        joins, objective = _assign_outround_judges_for_specs(
+            round_specs=normalized_specs,
+            pairings_by_spec=pairings_by_spec,
+            panel_size_by_spec=panel_size_by_spec,
+            judges=judges,
+            judge_scores=judge_scores,
+            pairing_settings=pairing_settings,
+            available_indices=available_indices,
+            conflict_index=conflict_index,
+            force_novice_last=True,
         )
+        judge_round_joins.extend(joins)
     else:
         varsity_specs = [s for s in normalized_specs if s[0] == Outround.VARSITY]
         novice_specs = [s for s in normalized_specs if s[0] == Outround.NOVICE]
         for specs in (varsity_specs, novice_specs):
             if not specs:
                 continue
-            judge_round_joins.extend(
-                _assign_outround_judges_for_specs(
-                    round_specs=specs,
-                    pairings_by_spec=pairings_by_spec,
-                    panel_size_by_spec=panel_size_by_spec,
-                    judges=judges,
-                    judge_scores=judge_scores,
-                    pairing_settings=pairing_settings,
-                    available_indices=available_indices,
-                    force_novice_last=False,
-                )
+            joins, specs_objective = _assign_outround_judges_for_specs(
+                round_specs=specs,
+                pairings_by_spec=pairings_by_spec,
+                panel_size_by_spec=panel_size_by_spec,
+                judges=judges,
+                judge_scores=judge_scores,
+                pairing_settings=pairing_settings,
+                available_indices=available_indices,
+                conflict_index=conflict_index,
+                force_novice_last=False,
             )
+            judge_round_joins.extend(joins)
+            objective += specs_objective
 
+    profiler.checkpoint("writes")
     rounds_to_update = []
     for round_type, num_teams in normalized_specs:
         rounds_to_update.extend(pairings_by_spec.get((round_type, num_teams), []))
@@ -579,6 +670,9 @@ def add_outround_judges(round_type=Outround.VARSITY, round_specs=None):
     if judge_round_joins:
         Outround.judges.through.objects.bulk_create(judge_round_joins)
 
+    profiler.note(f"Outround panels assigned with a total weight of {objective}")
+    return objective
+
 def calc_weight(
         judge_i,
         pairing_i,
@@ -622,10 +716,89 @@ def calc_weight(
     return base_weight
 
 
-def judge_conflict(judge, team1, team2, allow_rejudges=None):
+class ConflictIndex:
+    """
+    Every judge/team conflict needed for one assignment operation.
+
+    Built once from the Scratch, judge school and round judge rows, then each
+    judge's conflicts are kept as a bitset over the teams so that checking a
+    judge against a pairing is a couple of dict lookups and a bitwise and.
+    Scratches and school conflicts are kept apart from the teams a judge has
+    already judged because the latter only count when rejudges are not
+    allowed.
+    """
+
+    def __init__(self, teams, scratches, judge_schools, judged_rounds):
+        self.team_bits = {}
+        school_bits = defaultdict(int)
+        for team_id, school_id, hybrid_school_id in teams:
+            bit = 1 << len(self.team_bits)
+            self.team_bits[team_id] = bit
+            school_bits[school_id] |= bit
+            if hybrid_school_id is not None:
+                school_bits[hybrid_school_id] |= bit
+
+        self.scratched = defaultdict(int)
+        for judge_id, team_id in scratches:
+            self.scratched[judge_id] |= self.team_bits.get(team_id, 0)
+        for judge_id, school_id in judge_schools:
+            self.scratched[judge_id] |= school_bits.get(school_id, 0)
+
+        self.judged = defaultdict(int)
+        for judge_id, gov_team_id, opp_team_id in judged_rounds:
+            self.judged[judge_id] |= self.team_bits.get(gov_team_id, 0) | \
+                self.team_bits.get(opp_team_id, 0)
+
+    @classmethod
+    def load(cls, team_ids=None):
+        """
+        Load the index for every team, or only for ``team_ids`` when just a
+        few pairings need to be checked
+        """
+        teams = Team.objects.all()
+        scratches = Scratch.objects.all()
+        judge_schools = Judge.schools.through.objects.all()
+        judged_rounds = Round.judges.through.objects.all()
+        if team_ids is not None:
+            teams = teams.filter(id__in=team_ids)
+            scratches = scratches.filter(team_id__in=team_ids)
+            judge_schools = judge_schools.filter(
+                Q(school__team__id__in=team_ids)
+                | Q(school__hybrid_school__id__in=team_ids)
+            ).distinct()
+            judged_rounds = judged_rounds.filter(
+                Q(round__gov_team_id__in=team_ids)
+                | Q(round__opp_team_id__in=team_ids)
+            )
+        return cls(
+            teams.values_list("id", "school_id", "hybrid_school_id"),
+            scratches.values_list("judge_id", "team_id"),
+            judge_schools.values_list("judge_id", "school_id"),
+            judged_rounds.values_list(
+                "judge_id", "round__gov_team_id", "round__opp_team_id"
+            ),
+        )
+
+    def conflicts(self, judge_id, team_id, allow_rejudges=False):
+        return self.judge_conflict(judge_id, team_id, None, allow_rejudges)
+
+    def judge_conflict(self, judge_id, team1_id, team2_id, allow_rejudges=False):
+        teams = self.team_bits.get(team1_id, 0) | self.team_bits.get(team2_id, 0)
+        blocked = self.scratched.get(judge_id, 0)
+        if not allow_rejudges:
+            blocked |= self.judged.get(judge_id, 0)
+        return bool(blocked & teams)
+
+
+def judge_conflict(judge, team1, team2, allow_rejudges=None, conflict_index=None):
     if allow_rejudges is None:
         allow_rejudges = TabSettings.get("allow_rejudges", False)
 
+    if conflict_index is not None:
+        return conflict_index.judge_conflict(
+            judge.id, team1.id, team2.id, allow_rejudges
+        )
+
     has_scratches = any(
         s.team_id in (team1.id, team2.id)
         for s in judge.scratches.all()
@@ -647,9 +820,15 @@ def judge_conflict(judge, team1, team2, allow_rejudges=None):
     else:
         return has_scratches or has_school_conflict
 
-def is_bubble_round(pairing, round_number):
-    gov_losses = round_number - tab_logic.stats.tot_wins(pairing.gov_team)
-    opp_losses = round_number - tab_logic.stats.tot_wins(pairing.opp_team)
+def is_bubble_round(pairing, round_number, standings=None):
+    if standings is None:
+        gov_wins = tab_logic.stats.tot_wins(pairing.gov_team)
+        opp_wins = tab_logic.stats.tot_wins(pairing.opp_team)
+    else:
+        gov_wins = standings.tot_wins(pairing.gov_team_id)
+        opp_wins = standings.tot_wins(pairing.opp_team_id)
+    gov_losses = round_number - gov_wins
+    opp_losses = round_number - opp_wins
     return (gov_losses == 1) or (opp_losses == 1)
 
 
@@ -660,10 +839,14 @@ def had_judge(judge, team):
     return False
 
 
-def can_judge_teams(list_of_judges, team1, team2, allow_rejudges=None):
+def can_judge_teams(list_of_judges, team1, team2, allow_rejudges=None,
+                    conflict_index=None):
+    if conflict_index is None:
+        conflict_index = ConflictIndex.load(team_ids=[team1.id, team2.id])
     result = []
     for judge in list_of_judges:
-        if not judge_conflict(judge, team1, team2, allow_rejudges=allow_rejudges):
+        if not judge_conflict(judge, team1, team2, allow_rejudges=allow_rejudges,
+                              conflict_index=conflict_index):
             result.append(judge)
     return result
 
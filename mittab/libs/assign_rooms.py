@@ -1,14 +1,18 @@
 import random
 from django.db import transaction
 from mittab.apps.tab.models import Outround, RoomCheckIn, Round, TabSettings
-from mittab.libs import errors, mwmatching, tab_logic
+from mittab.libs import errors, matching, profiler, tab_logic
+from mittab.libs.cacheing.cache_logic import stat_memo_scope
 from mittab.libs.assign_judges import (
     OutroundRoundPriority,
     sort_outround_pairings,
 )
 
 
+@profiler.profile_operation("add_rooms")
+@stat_memo_scope()
 def add_rooms():
+    profiler.checkpoint("load")
     room_seeding = TabSettings.get("enable_room_seeding", 0)
 
     # Clear any existing room assignments
@@ -21,12 +25,6 @@ def add_rooms():
     rooms = sorted((r.room for r in rooms), key=lambda r: r.rank, reverse=True)
     pairings = tab_logic.sorted_pairings(round_number)
 
-    pairing_to_tag = {
-        pairing: get_required_tags(pairing) for pairing in pairings
-    }
-
-    room_to_tag = {room: set(room.tags.all()) for room in rooms}
-
     if not room_seeding:
         random.shuffle(pairings)
 
@@ -38,40 +36,13 @@ def add_rooms():
             f"Not enough rooms. Found {len(pairings)}\
                   rounds and only {len(rooms)} rooms")
 
-    graph_edges = []
-
-    for pairing_i, pairing in enumerate(pairings):
-        pairing_tags = pairing_to_tag[pairing]
-        for room_i, room in enumerate(rooms):
-            weight = 0
-
-            # High seed high room bonus
-            if room_seeding:
-                weight -= abs(pairing_i - room_i)
-
-            # Good room bonus
-            weight += room.rank * 100
-
-            # Missing tags penalty
-            missing = pairing_tags - room_to_tag[room]
-            weight -= 1000 * sum(tag.priority for tag in missing)
-
-            edge = (pairing_i, len(pairings) + room_i, weight)
-            graph_edges.append(edge)
-
-    room_assignments = mwmatching.maxWeightMatching(
-        graph_edges, maxcardinality=True)
-
-    if -1 in room_assignments[:len(pairings)]:
-        pairing_list = room_assignments[: len(pairings)]
-        bad_pairing = pairings[pairing_list.index(-1)]
-        raise errors.RoomAssignmentError(
-            f"Could not find a room for: {bad_pairing}"
-        )
+    profiler.checkpoint("weights")
+    weights = room_weights(pairings, rooms, room_seeding)
+    room_assignments = matching.max_weight_assignment(weights)
 
+    profiler.checkpoint("writes")
     updated_pairings = []
-    for pairing_i, pairing in enumerate(pairings):
-        room_i = room_assignments[pairing_i] - len(pairings)
+    for pairing, room_i in zip(pairings, room_assignments):
         pairing.room = rooms[room_i]
         updated_pairings.append(pairing)
 
@@ -79,6 +50,8 @@ def add_rooms():
         Round.objects.bulk_update(updated_pairings, ["room"])
 
 
+@profiler.profile_operation("add_outround_rooms")
+@stat_memo_scope()
 def add_outround_rooms(round_specs):
     normalized_specs = []
     seen = set()
@@ -127,43 +100,14 @@ def add_outround_rooms(round_specs):
             f"Not enough rooms. Found {len(pairings)} "
             f"rounds and only {len(rooms)} rooms")
 
-    pairing_to_tag = {
-        pairing: get_required_tags(pairing) for pairing in pairings
-    }
-    room_to_tag = {room: set(room.tags.all()) for room in rooms}
-
     if not room_seeding:
         random.shuffle(pairings)
 
-    graph_edges = []
-    for pairing_i, pairing in enumerate(pairings):
-        pairing_tags = pairing_to_tag[pairing]
-        for room_i, room in enumerate(rooms):
-            weight = 0
-
-            if room_seeding:
-                weight -= abs(pairing_i - room_i)
-
-            weight += room.rank * 100
-
-            missing = pairing_tags - room_to_tag[room]
-            weight -= 1000 * sum(tag.priority for tag in missing)
-
-            graph_edges.append((pairing_i, len(pairings) + room_i, weight))
-
-    room_assignments = mwmatching.maxWeightMatching(
-        graph_edges, maxcardinality=True)
-
-    if -1 in room_assignments[:len(pairings)]:
-        pairing_list = room_assignments[:len(pairings)]
-        bad_pairing = pairings[pairing_list.index(-1)]
-        raise errors.RoomAssignmentError(
-            f"Could not find a room for: {bad_pairing}"
-        )
+    weights = room_weights(pairings, rooms, room_seeding)
+    room_assignments = matching.max_weight_assignment(weights)
 
     updated_pairings = []
-    for pairing_i, pairing in enumerate(pairings):
-        room_i = room_assignments[pairing_i] - len(pairings)
+    for pairing, room_i in zip(pairings, room_assignments):
         pairing.room = rooms[room_i]
         updated_pairings.append(pairing)
 
@@ -171,6 +115,55 @@ def add_outround_rooms(round_specs):
         Outround.objects.bulk_update(updated_pairings, ["room"])
 
 
+def room_weights(pairings, rooms, room_seeding):
+    """
+    How good each room is for each pairing, as a row of weights per pairing.
+    Every tag gets a bit, so the tags a room lacks for a pairing are a
+    bitwise and-not of two masks, and the penalty for each distinct set of
+    missing tags is only added up once.
+    """
+    tag_bits = {}
+    tag_priorities = []
+
+    def tag_mask(tags):
+        mask = 0
+        for tag in tags:
+            if tag not in tag_bits:
+                tag_bits[tag] = 1 << len(tag_bits)
+                tag_priorities.append(tag.priority)
+            mask |= tag_bits[tag]
+        return mask
+
+    room_masks = [tag_mask(room.tags.all()) for room in rooms]
+    # Good room bonus
+    room_bonus = [room.rank * 100 for room in rooms]
+
+    # Missing tags penalty, by the mask of the tags that are missing
+    penalties = {0: 0}
+
+    def penalty(missing):
+        if missing not in penalties:
+            penalties[missing] = 1000 * sum(
+                priority for bit, priority in enumerate(tag_priorities)
+                if missing >> bit & 1
+            )
+        return penalties[missing]
+
+    weights = []
+    for pairing_i, pairing in enumerate(pairings):
+        pairing_mask = tag_mask(get_required_tags(pairing))
+        row = [
+            bonus - penalty(pairing_mask & ~room_mask)
+            for bonus, room_mask in zip(room_bonus, room_masks)
+        ]
+        # High seed high room bonus
+        if room_seeding:
+            row = [weight - abs(pairing_i - room_i)
+                   for room_i, weight in enumerate(row)]
+        weights.append(row)
+    return weights
+
+
 def get_required_tags(pairing):
     """Gets required room tags from a pairing.
     Only call after using appropriate prefetches"""
@@ -0,0 +1,116 @@
+"""
+Committing a ballot.
+
+Ballots are the busiest write of a tournament: every chair submits one at
+the end of each round, mostly within a few minutes of each other. A ballot
+is committed against the round it was validated against, so nothing is
+read again that the form already loaded. The round row is locked for the
+length of the write so that two submissions for the same round are
+serialised, and the four speaker results are written with one bulk insert
+or update.
+
+Bulk writes don't send the model signals the standings bookkeeping listens
+to (see ``mittab.apps.tab.signals``), so when the ballot changes anything
+the standings of its teams and debaters are marked dirty here, in a single
+``standings.invalidate_result`` call.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+
+from mittab.apps.tab.models import NoShow, Round, RoundStats
+from mittab.libs import errors
+from mittab.libs.cacheing import cache_logic
+from mittab.libs.tab_logic import standings
+
+# One speaker's result on a ballot
+SpeakerResult = namedtuple("SpeakerResult",
+                           ["debater_role", "debater_id", "speaks", "ranks"])
+
+
+def _same_result(stats, result):
+    return stats.debater_id == result.debater_id and \
+        Decimal(stats.speaks) == Decimal(str(result.speaks)) and \
+        Decimal(stats.ranks) == Decimal(str(result.ranks))
+
+
+def commit_ballot(round_obj, victor, results, rfd=None, first_ballot=False):
+    """
+    Record ``victor`` and the ``SpeakerResult`` of each debater for
+    ``round_obj``, replacing any earlier ballot for the round. ``rfd`` is
+    saved too unless it is None. With ``first_ballot`` the commit is refused
+    with ``BallotAlreadyEnteredError`` if a ballot landed for the round
+    after it was validated.
+
+    Returns whether anything about the round's result changed.
+    """
+    with transaction.atomic():
+        # Serialises concurrent ballots for the round until the commit, and
+        # reads the result they are compared against under the lock
+        stored_victor = (Round.objects.select_for_update()
+                         .filter(pk=round_obj.pk)
+                         .values_list("victor", flat=True).get())
+        existing = list(RoundStats.objects.filter(round_id=round_obj.pk))
+        if first_ballot and existing:
+            raise errors.BallotAlreadyEnteredError()
+
+        by_role = {}
+        stale = []
+        for stats in existing:
+            if stats.debater_role in by_role:
+                stale.append(stats)
+            else:
+                by_role[stats.debater_role] = stats
+
+        to_create, to_update = [], []
+        changed_debater_ids = set()
+        for result in results:
+            stats = by_role.pop(result.debater_role, None)
+            if stats is None:
+                to_create.append(RoundStats(round_id=round_obj.pk,
+                                            debater_id=result.debater_id,
+                                            speaks=result.speaks,
+                                            ranks=result.ranks,
+                                            debater_role=result.debater_role))
+                changed_debater_ids.add(result.debater_id)
+            elif not _same_result(stats, result):
+                changed_debater_ids.update((stats.debater_id, result.debater_id))
+                stats.debater_id = result.debater_id
+                stats.speaks = result.speaks
+                stats.ranks = result.ranks
+                to_update.append(stats)
+        stale.extend(by_role.values())
+        changed_debater_ids.update(stats.debater_id for stats in stale)
+
+        if stale:
+            RoundStats.objects.filter(pk__in=[s.pk for s in stale]).delete()
+        if to_update:
+            RoundStats.objects.bulk_update(
+                to_update, ["debater", "speaks", "ranks"]
+            )
+        if to_create:
+            RoundStats.objects.bulk_create(to_create)
+
+        changed = stored_victor != victor or bool(changed_debater_ids)
+        round_obj.victor = victor
+        update_fields = {"victor": victor}
+        if rfd is not None:
+            round_obj.rfd = rfd
+            update_fields["rfd"] = rfd
+        Round.objects.filter(pk=round_obj.pk).update(**update_fields)
+
+        # A team with a result showed up
+        NoShow.objects.filter(
+            round_number=round_obj.round_number,
+            no_show_team_id__in=[round_obj.gov_team_id, round_obj.opp_team_id],
+        ).delete()
+
+        if changed:
+            standings.invalidate_result(
+                [round_obj.gov_team_id, round_obj.opp_team_id],
+                changed_debater_ids,
+            )
+
+    cache_logic.invalidate_stat_memo()
+    return changed
@@ -1,13 +1,23 @@
 # Caching decorator taken from http://djangosnippets.org/snippets/564/
+from contextlib import contextmanager
+from functools import wraps
 from hashlib import sha1
 import random
+import threading
+import time
+from uuid import uuid4
 
 from django.core.cache import caches
+from django.db import transaction
 
 CACHE_TIMEOUT = 20
 
 DEFAULT = "default"
 PERSISTENT = "filesystem"
+# Shared by every worker (memcached in production)
+SHARED = "public"
+# How long a process snapshot is trusted before its version is checked again
+SNAPSHOT_REVALIDATE_SECONDS = 1
 
 
 def cache_fxn_key(fxn, key, cache_name, *args, **kwargs):
@@ -32,6 +42,28 @@ def invalidate_cache(key, cache_name=DEFAULT):
     caches[cache_name].delete(key)
 
 
+RANKINGS_VERSION_KEY = "rankings:version"
+
+
+def rankings_key(name):
+    """
+    Cache key for the rankings called ``name``. It carries a version shared
+    by every worker, so ``invalidate_rankings`` makes every cached ranking
+    stale at once without deleting anything.
+    """
+    return f"{name}:{caches[SHARED].get(RANKINGS_VERSION_KEY, 0)}"
+
+
+def invalidate_rankings():
+    cache = caches[SHARED]
+    try:
+        cache.incr(RANKINGS_VERSION_KEY)
+    except ValueError:
+        # First bump, another worker may be racing us to create it
+        cache.add(RANKINGS_VERSION_KEY, 0, None)
+        cache.incr(RANKINGS_VERSION_KEY)
+
+
 def cache(seconds=CACHE_TIMEOUT, stampede=CACHE_TIMEOUT):
     """
     Cache the result of a function call for the specified number of seconds,
@@ -66,6 +98,173 @@ def cache(seconds=CACHE_TIMEOUT, stampede=CACHE_TIMEOUT):
     return do_cache
 
 
+class StatMemo:
+    """
+    In-memory memo for stat calculations, scoped to a single request or
+    operation
+
+    Keys are (function, model, pk, *remaining args), so lookups don't need to
+    stringify or hash model instances and never go through a cache backend.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.values.clear()
+
+    def counters(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.values)}
+
+
+# threading.local is greenlet-local once gevent has monkey patched the process,
+# so concurrent requests on the same worker each get their own memo
+_memo_state = threading.local()
+
+
+def current_stat_memo():
+    """Returns the memo for the active scope, or None outside of one"""
+    return getattr(_memo_state, "memo", None)
+
+
+@contextmanager
+def stat_memo_scope():
+    """
+    Memoize stat functions for the duration of the block. Nested scopes share
+    the outermost memo.
+
+    Usage:
+
+    with stat_memo_scope() as memo:
+        rank_teams()
+        print(memo.counters())
+    """
+    memo = current_stat_memo()
+    if memo is not None:
+        yield memo
+        return
+
+    memo = StatMemo()
+    _memo_state.memo = memo
+    try:
+        yield memo
+    finally:
+        _memo_state.memo = None
+
+
+def invalidate_stat_memo():
+    """Drop memoized stats after results are written in the current scope"""
+    memo = current_stat_memo()
+    if memo is not None:
+        memo.clear()
+
+
+def _memo_key_part(value):
+    pk = getattr(value, "pk", None)
+    if pk is not None:
+        return (type(value), pk)
+    return value
+
+
+def stat_memo(f):
+    """
+    Memoize a stat function within the active stat_memo_scope.
+
+    The first argument is expected to be a team or debater and is keyed by its
+    primary key; the remaining arguments must be hashable (round numbers,
+    flags). Outside of a scope the function is called directly.
+    """
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        memo = current_stat_memo()
+        if memo is None:
+            return f(*args, **kwargs)
+
+        key = (f, tuple(_memo_key_part(arg) for arg in args),
+               tuple(sorted(kwargs.items())))
+        if key in memo.values:
+            memo.hits += 1
+            return memo.values[key]
+
+        memo.misses += 1
+        result = f(*args, **kwargs)
+        memo.values[key] = result
+        return result
+
+    return wrapper
+
+
+class ProcessSnapshot:
+    """
+    A value loaded once and held in process memory, e.g. every TabSetting
+    loaded with a single query.
+
+    The snapshot records the version token stored in the shared cache when it
+    was loaded. At most once every ``SNAPSHOT_REVALIDATE_SECONDS`` the token is
+    read again and the value is reloaded if another worker invalidated it.
+    Invalidating drops this process's copy straight away, and changes the
+    token for the other workers once the transaction commits.
+
+    Usage:
+
+    settings = ProcessSnapshot("tab_settings", load_settings)
+    settings.get()["cur_round"]
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        # (version token, time it was last checked, value)
+        self._state = None
+        _snapshots.append(self)
+
+    @property
+    def version_key(self):
+        return f"snapshot:{self.name}:version"
+
+    def get(self):
+        state = self._state
+        now = time.monotonic()
+        if state is not None and now - state[1] < SNAPSHOT_REVALIDATE_SECONDS:
+            return state[2]
+
+        cache = caches[SHARED]
+        token = cache.get(self.version_key)
+        if token is None:
+            # Nobody has invalidated it since the cache started, or it was
+            # evicted, so whatever we hold may be out of date
+            cache.add(self.version_key, uuid4().hex, None)
+            token = cache.get(self.version_key)
+            state = None
+        if state is not None and state[0] == token:
+            self._state = (token, now, state[2])
+            return state[2]
+
+        # The token is read before loading, so a change committed while we
+        # load leaves us with a token that is already out of date
+        value = self.loader()
+        self._state = (token, now, value)
+        return value
+
+    def invalidate(self):
+        self._state = None
+        transaction.on_commit(self.reset)
+
+    def reset(self):
+        """Invalidate straight away, outside of any transaction"""
+        self._state = None
+        caches[SHARED].set(self.version_key, uuid4().hex, None)
+
+
+_snapshots = []
+
+
 def clear_cache():
+    invalidate_stat_memo()
+    for snapshot in _snapshots:
+        snapshot.reset()
     caches[DEFAULT].clear()
     caches[PERSISTENT].clear()
@@ -0,0 +1,53 @@
+"""
+Version numbers for the data shown on public pages.
+
+Each data domain has a counter in the public cache. Public cache entries are
+keyed by (or record) the versions of the domains they depend on, so bumping a
+domain's version with a single ``incr`` invalidates every page built from it
+on every worker at once. Nothing is deleted: entries under old versions are
+never read again and expire on their own.
+
+Every page depends on ``site``, which is bumped when something shown across
+the whole public site changes (settings, the home page, registration).
+"""
+
+SITE = "site"
+PAIRINGS = "pairings"
+JUDGES = "judges"
+TEAMS = "teams"
+RANKINGS = "rankings"
+BALLOTS = "ballots"
+MOTIONS = "motions"
+
+
+def outrounds(type_of_round):
+    return f"outrounds:{type_of_round}"
+
+
+def version_key(domain):
+    return f"pv:version:{domain}"
+
+
+def resolve_domains(depends_on, kwargs):
+    """
+    The domains a view depends on for the given URL kwargs, ``depends_on``
+    entries may name kwargs, e.g. ``"outrounds:{type_of_round}"``
+    """
+    return (SITE,) + tuple(domain.format(**kwargs) for domain in depends_on)
+
+
+def current_versions(cache, domains):
+    keys = [version_key(domain) for domain in domains]
+    values = cache.get_many(keys)
+    return tuple(values.get(key, 0) for key in keys)
+
+
+def bump_versions(cache, domains):
+    for domain in domains:
+        key = version_key(domain)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # First bump, another worker may be racing us to create it
+            cache.add(key, 0, None)
+            cache.incr(key)
@@ -5,9 +5,12 @@ from functools import wraps
 
 from django.conf import settings
 from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from mittab.libs.cacheing import data_versions, public_snapshots
 
 PUBLIC_CACHE_ALIAS = getattr(settings, "PUBLIC_VIEW_CACHE_ALIAS", "public")
-AUTH_STATES = (False, True)
 
 
 def build_cache_key(view_name, kwargs, is_authenticated):
@@ -22,13 +25,52 @@ def build_cache_key(view_name, kwargs, is_authenticated):
     return f"pv:{view_name}:{digest}"
 
 
-def cache_public_view(timeout=60):
+def versioned_key(cache_key, versions):
+    return f"{cache_key}:v{'.'.join(str(version) for version in versions)}"
+
+
+def _get_with_versions(cache, domains, keys):
+    """Read ``keys`` and the versions of ``domains`` in a single round trip"""
+    version_keys = [data_versions.version_key(domain) for domain in domains]
+    values = cache.get_many(version_keys + keys)
+    return tuple(values.get(key, 0) for key in version_keys), values
+
+
+def _not_modified(request, validators, cache_control, versions=None):
+    """
+    Answer a conditional GET from the validators of a cached page, as long
+    as the page is still fresh
+    """
+    if validators is None or validators["expires_at"] <= time.time():
+        return None
+    if versions is not None and validators.get("versions") != versions:
+        return None
+    response = get_conditional_response(
+        request,
+        etag=validators["etag"],
+        last_modified=int(validators["last_modified"]),
+    )
+    if response is not None:
+        response["ETag"] = validators["etag"]
+        response["Last-Modified"] = http_date(validators["last_modified"])
+        response["Cache-Control"] = cache_control
+    return response
+
+
+def cache_public_view(timeout=60, depends_on=()):
     """
     Cache a public view with short CDN TTL and longer origin cache.
 
     The CDN is configured with a 10-second TTL, so changes propagate quickly.
     The origin cache uses the specified timeout for better performance.
-    When invalidated, both origin cache and response are cleared immediately.
+    ``depends_on`` lists the data domains (see ``data_versions``) the page is
+    built from, entries may name URL kwargs like
+    ``"outrounds:{type_of_round}"``. Cache keys embed the domains' versions,
+    so bumping one invalidates the page immediately.
+    Anonymous visitors are served pre-compressed snapshots, see
+    ``public_snapshots``. Cached pages carry an ETag and Last-Modified, and
+    conditional requests for them are answered with a 304 before the cached
+    page is read.
     """
 
     stale_extension = max(timeout, 30)
@@ -43,12 +85,103 @@ def cache_public_view(timeout=60):
     )
 
     def decorator(view_func):
+        def render_snapshot(request, cache, cache_key, versions, kwargs):
+            response = view_func(request, **kwargs)
+            if not public_snapshots.can_snapshot(response):
+                return None, response
+            entry = public_snapshots.build_snapshot(
+                response, request.path, request.get_host(), versions, timeout
+            )
+            public_snapshots.store_snapshot(cache, cache_key, entry)
+            response["ETag"] = entry["etag"]
+            response["Last-Modified"] = http_date(entry["last_modified"])
+            response["Cache-Control"] = cache_control_header
+            return entry, response
+
+        def serve_snapshot(request, cache, cache_key, domains, kwargs,
+                           conditional):
+            entry_key = public_snapshots.snapshot_key(cache_key)
+            validators_key = public_snapshots.validators_key(cache_key)
+            # Conditional requests usually end in a 304, so only read the
+            # bodies up front when there is nothing to compare against
+            keys = [validators_key]
+            if not conditional:
+                keys.append(entry_key)
+            versions, values = _get_with_versions(cache, domains, keys)
+            if conditional:
+                response = _not_modified(request, values.get(validators_key),
+                                         cache_control_header, versions)
+                if response is not None:
+                    return versions, response
+                values[entry_key] = cache.get(entry_key)
+            entry = values.get(entry_key)
+            if entry is None:
+                return versions, None
+
+            fresh = (entry["versions"] == versions
+                     and entry["expires_at"] > time.time())
+            lock_key = public_snapshots.publish_lock_key(cache_key)
+            if fresh or not cache.add(lock_key, True, lock_timeout):
+                # Whoever holds the lock is publishing a new snapshot
+                return versions, public_snapshots.snapshot_response(
+                    request, entry, cache_control_header)
+            try:
+                entry, response = render_snapshot(request, cache, cache_key,
+                                                  versions, kwargs)
+            finally:
+                cache.delete(lock_key)
+            if entry is None:
+                cache.delete_many([entry_key, validators_key])
+                return versions, None
+            return versions, response
+
+        def store_response(cache, entry_key, response, now):
+            validators = None
+            if public_snapshots.can_snapshot(response):
+                validators = {
+                    "etag": public_snapshots.etag_for(response.content),
+                    "last_modified": now,
+                    "expires_at": now + timeout,
+                }
+                response["ETag"] = validators["etag"]
+                response["Last-Modified"] = http_date(now)
+            cache.set_many(
+                {entry_key: {"response": response, "expires_at": now + timeout},
+                 public_snapshots.validators_key(entry_key): validators},
+                timeout + stale_extension,
+            )
+
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
             cache = caches[PUBLIC_CACHE_ALIAS]
+            is_authenticated = request.user.is_authenticated
             cache_key = build_cache_key(view_func.__name__, kwargs,
-                                         request.user.is_authenticated)
-            cached_entry = cache.get(cache_key)
+                                         is_authenticated)
+            domains = data_versions.resolve_domains(depends_on, kwargs)
+            conditional = ("HTTP_IF_NONE_MATCH" in request.META
+                           or "HTTP_IF_MODIFIED_SINCE" in request.META)
+            snapshot_allowed = (not is_authenticated and not args
+                                and request.method in ("GET", "HEAD"))
+            if snapshot_allowed:
+                versions, response = serve_snapshot(request, cache, cache_key,
+                                                    domains, kwargs,
+                                                    conditional)
+                if response is not None:
+                    return response
+                entry_key = versioned_key(cache_key, versions)
+            else:
+                versions = data_versions.current_versions(cache, domains)
+                entry_key = versioned_key(cache_key, versions)
+                if conditional:
+                    response = _not_modified(
+                        request,
+                        cache.get(public_snapshots.validators_key(entry_key)),
+                        cache_control_header,
+                    )
+                    if response is not None:
+                        return response
+
+            cached_entry = cache.get(entry_key)
             now = time.time()
 
             if isinstance(cached_entry, dict):
@@ -61,100 +194,108 @@ def cache_public_view(timeout=60):
                     if expires_at > now:
                         return response
 
-                    lock_key = f"{cache_key}:lock"
+                    lock_key = f"{entry_key}:lock"
                     if cache.add(lock_key, True, lock_timeout):
                         try:
                             fresh_response = view_func(request, *args, **kwargs)
-                            cache.set(
-                                cache_key,
-                                {"response": fresh_response,
-                                 "expires_at": now + timeout},
-                                timeout + stale_extension,
-                            )
+                            store_response(cache, entry_key, fresh_response, now)
                             return fresh_response
                         finally:
                             cache.delete(lock_key)
                     return response
 
-            fresh_response = view_func(request, *args, **kwargs)
+            if snapshot_allowed:
+                entry, fresh_response = render_snapshot(request, cache, cache_key,
+                                                        versions, kwargs)
+                if entry is not None:
+                    public_snapshots.remember_target(cache, cache_key,
+                                                     kwargs, domains)
+                    return fresh_response
+            else:
+                fresh_response = view_func(request, *args, **kwargs)
             if hasattr(fresh_response, "__setitem__"):
                 fresh_response["Cache-Control"] = cache_control_header
-            cache.set(
-                cache_key,
-                {"response": fresh_response, "expires_at": now + timeout},
-                timeout + stale_extension,
-            )
+            store_response(cache, entry_key, fresh_response, now)
             return fresh_response
 
+        wrapper.public_view = view_func
         return wrapper
 
     return decorator
 
 
-def _delete_key_for_all_auth_states(view_name, kwargs=None):
+def _bump_data_versions(*domains):
+    # Entries under the old versions are never read again, so nothing is
+    # deleted and there is no burst of misses on every key at once. Anonymous
+    # snapshots keep being served until a fresh render replaces them.
     cache = caches[PUBLIC_CACHE_ALIAS]
-    for is_authenticated in AUTH_STATES:
-        cache.delete(build_cache_key(view_name, kwargs or {}, is_authenticated))
+    data_versions.bump_versions(cache, domains)
+    public_snapshots.schedule_publish(cache, domains)
 
 
 def invalidate_inround_public_pairings_cache(*_args, **_kwargs):
     """
     Invalidate cached in-round public pages.
 
-    Clears origin cache immediately. CDN will refresh within 10 seconds
-    based on the short TTL configured in cache_public_view.
+    Bumps the pairings version for every worker at once. CDN will refresh
+    within 10 seconds based on the short TTL configured in cache_public_view.
     """
-    _delete_key_for_all_auth_states("pretty_pair")
-    _delete_key_for_all_auth_states("missing_ballots")
-    _delete_key_for_all_auth_states("public_home")
+    _bump_data_versions(data_versions.PAIRINGS)
 
 
 def invalidate_outround_public_pairings_cache(type_of_round, *_args, **_kwargs):
     """
     Invalidate cached outround public pages for the provided division.
 
-    Clears origin cache immediately. CDN will refresh within 10 seconds.
+    Bumps that division's outrounds version. CDN will refresh within 10
+    seconds.
     """
-    kwargs = {"type_of_round": type_of_round}
-    _delete_key_for_all_auth_states("outround_pretty_pair", kwargs)
+    _bump_data_versions(data_versions.outrounds(type_of_round))
 
 
 def invalidate_public_judges_cache(*_args, **_kwargs):
     """
     Invalidate cached public judges view.
 
-    Clears origin cache immediately. CDN will refresh within 10 seconds.
+    Bumps the judges version. CDN will refresh within 10 seconds.
     """
-    _delete_key_for_all_auth_states("public_view_judges")
+    _bump_data_versions(data_versions.JUDGES)
 
 
 def invalidate_public_teams_cache(*_args, **_kwargs):
     """
     Invalidate cached public teams view.
 
-    Clears origin cache immediately. CDN will refresh within 10 seconds.
+    Bumps the teams version. CDN will refresh within 10 seconds.
     """
-    _delete_key_for_all_auth_states("public_view_teams")
+    _bump_data_versions(data_versions.TEAMS)
 
 
 def invalidate_public_rankings_cache(*_args, **_kwargs):
     """
     Invalidate cached public rankings view.
 
-    Clears origin cache immediately. CDN will refresh within 10 seconds.
+    Bumps the rankings version. CDN will refresh within 10 seconds.
     """
-    _delete_key_for_all_auth_states("rank_teams_public")
-    _delete_key_for_all_auth_states("public_speaker_rankings")
-    _delete_key_for_all_auth_states("public_ballots")
+    _bump_data_versions(data_versions.RANKINGS)
+
+
+def invalidate_public_ballots_cache(*_args, **_kwargs):
+    """
+    Invalidate cached public pages that list ballots.
+
+    Bumps the ballots version. CDN will refresh within 10 seconds.
+    """
+    _bump_data_versions(data_versions.BALLOTS)
 
 
 def invalidate_public_motions_cache(*_args, **_kwargs):
     """
     Invalidate cached public motions view.
 
-    Clears origin cache immediately. CDN will refresh within 10 seconds.
+    Bumps the motions version. CDN will refresh within 10 seconds.
     """
-    _delete_key_for_all_auth_states("public_motions")
+    _bump_data_versions(data_versions.MOTIONS)
 
 
 def invalidate_all_public_caches(*_args, **_kwargs):
@@ -162,21 +303,7 @@ def invalidate_all_public_caches(*_args, **_kwargs):
     Invalidate all public view caches.
 
     Use this when settings change that could affect multiple public views.
-    Clears origin cache immediately. CDN will refresh within 10 seconds.
-    """
-    # Invalidate all view-specific caches
-    _delete_key_for_all_auth_states("pretty_pair")
-    _delete_key_for_all_auth_states("missing_ballots")
-    _delete_key_for_all_auth_states("public_home")
-    _delete_key_for_all_auth_states("public_view_judges")
-    _delete_key_for_all_auth_states("public_view_teams")
-    _delete_key_for_all_auth_states("rank_teams_public")
-    _delete_key_for_all_auth_states("public_speaker_rankings")
-    _delete_key_for_all_auth_states("public_ballots")
-    _delete_key_for_all_auth_states("e_ballot_search_page")
-    _delete_key_for_all_auth_states("public_motions")
-
-    # Invalidate outrounds for both divisions
-    for type_of_round in [0, 1]:  # VARSITY=0, NOVICE=1
-        kwargs = {"type_of_round": type_of_round}
-        _delete_key_for_all_auth_states("outround_pretty_pair", kwargs)
+    Bumps the site version, which every public page depends on. CDN will
+    refresh within 10 seconds.
+    """
+    _bump_data_versions(data_versions.SITE)
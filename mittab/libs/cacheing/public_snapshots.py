@@ -0,0 +1,251 @@
+"""
+Pre-rendered, pre-compressed snapshots of public pages.
+
+Anonymous visitors to a ``cache_public_view`` page are served a snapshot: the
+rendered body stored gzipped (and brotli compressed when the ``brotli``
+package is installed) along with its ETag. Serving one is a single cache
+read and no rendering.
+
+A snapshot records the data versions (see ``public_cache``) it was rendered
+at. When one of them is bumped the snapshot is stale, and the page is
+re-rendered in the background once the transaction commits. The new
+snapshot replaces the old one with a single ``cache.set``. Until then
+visitors keep getting the previous snapshot, unless no publish is running
+(it failed, or the change happened inside a transaction that never
+committed), in which case the page is rendered on the request as before.
+"""
+import gzip
+import hashlib
+from importlib import import_module
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage import default_storage
+from django.db import connections, transaction
+from django.http import HttpRequest, HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+
+from mittab.libs.cacheing.data_versions import current_versions
+
+SNAPSHOT_LOCK_TIMEOUT = 30
+SNAPSHOT_TIMEOUT = 60 * 60
+# Workers record the snapshots they render under a short lock per domain,
+# waiting for it a few milliseconds at a time
+TARGETS_LOCK_TIMEOUT = 2
+TARGETS_LOCK_ATTEMPTS = 200
+
+_accepts_brotli = re.compile(r"\bbr\b")
+_accepts_gzip = re.compile(r"\bgzip\b")
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def snapshot_key(cache_key):
+    return f"{cache_key}:snapshot"
+
+
+def publish_lock_key(cache_key):
+    return f"{cache_key}:publishing"
+
+
+def targets_key(domain):
+    """The snapshots rendered from ``domain``, which a bump of it publishes"""
+    return f"pv:snapshot_targets:{domain}"
+
+
+def validators_key(cache_key):
+    return f"{cache_key}:validators"
+
+
+def etag_for(body):
+    return f"\"{hashlib.sha256(body).hexdigest()[:32]}\""
+
+
+def can_snapshot(response):
+    return (
+        isinstance(response, HttpResponse)
+        and response.status_code == 200
+        and not response.has_header("Content-Encoding")
+        and not response.cookies
+    )
+
+
+def build_snapshot(response, path, host, versions, timeout):
+    body = response.content
+    now = time.time()
+    entry = {
+        "content_type": response["Content-Type"],
+        "etag": etag_for(body),
+        "last_modified": now,
+        "expires_at": now + timeout,
+        "timeout": timeout,
+        "versions": versions,
+        "path": path,
+        "host": host,
+        "gzip": gzip.compress(body, compresslevel=9),
+        "br": None,
+    }
+    brotli = _brotli()
+    if brotli is not None:
+        entry["br"] = brotli.compress(body)
+    return entry
+
+
+def store_snapshot(cache, cache_key, entry):
+    """
+    Swap in a new snapshot. Its validators are stored on their own so that
+    conditional requests can be answered without reading the bodies.
+    """
+    validators = {field: entry[field]
+                  for field in ("etag", "last_modified", "expires_at",
+                                "versions")}
+    cache.set_many({snapshot_key(cache_key): entry,
+                    validators_key(cache_key): validators},
+                   SNAPSHOT_TIMEOUT)
+
+
+def snapshot_response(request, entry, cache_control):
+    accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    encoding = None
+    if entry["br"] is not None and _accepts_brotli.search(accept_encoding):
+        body, encoding = entry["br"], "br"
+    elif _accepts_gzip.search(accept_encoding):
+        body, encoding = entry["gzip"], "gzip"
+    else:
+        body = gzip.decompress(entry["gzip"])
+
+    response = HttpResponse(body, content_type=entry["content_type"])
+    if encoding:
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ("Accept-Encoding",))
+    response["ETag"] = entry["etag"]
+    response["Last-Modified"] = http_date(entry["last_modified"])
+    response["Cache-Control"] = cache_control
+    return response
+
+
+def public_view(path):
+    """
+    The undecorated view behind the public page at ``path``, found through
+    the URLconf so that processes which never imported the views (like the
+    job worker) can publish too. None if ``path`` isn't a public page.
+    """
+    try:
+        view = resolve(path).func
+    except Resolver404:
+        return None
+    # Set by cache_public_view, and copied onto any decorator wrapping it
+    return getattr(view, "public_view", None)
+
+
+def render_snapshot_page(view, kwargs, path, host):
+    """Render a public view as an anonymous visitor would see it"""
+    request = HttpRequest()
+    request.method = "GET"
+    request.path = request.path_info = path
+    request.META = {"HTTP_HOST": host, "SERVER_NAME": host, "SERVER_PORT": "80"}
+    request.user = AnonymousUser()
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    request._messages = default_storage(request)  # pylint: disable=protected-access
+    return view(request, **kwargs)
+
+
+def remember_target(cache, cache_key, kwargs, domains):
+    known = cache.get_many([targets_key(domain) for domain in domains])
+    for domain in domains:
+        if cache_key not in known.get(targets_key(domain), {}):
+            _add_target(cache, targets_key(domain), cache_key, (kwargs, domains))
+
+
+def _add_target(cache, key, cache_key, target):
+    # Workers render their first snapshots at the same time after a
+    # release, so the read and write of the targets must not interleave
+    lock_key = f"{key}:lock"
+    for _ in range(TARGETS_LOCK_ATTEMPTS):
+        if cache.add(lock_key, True, TARGETS_LOCK_TIMEOUT):
+            break
+        time.sleep(0.01)
+    else:
+        return
+    try:
+        targets = cache.get(key) or {}
+        targets[cache_key] = target
+        cache.set(key, targets, None)
+    finally:
+        cache.delete(lock_key)
+
+
+def publish_snapshots(cache, targets):
+    """
+    Re-render the snapshot of each ``(cache_key, kwargs, domains)`` target
+    that has one, and release its publish lock
+    """
+    for cache_key, kwargs, domains in targets:
+        try:
+            entry = cache.get(snapshot_key(cache_key))
+            if entry is None:
+                continue
+            view = public_view(entry["path"])
+            if view is None:
+                continue
+            versions = current_versions(cache, domains)
+            response = render_snapshot_page(view, kwargs,
+                                             entry["path"], entry["host"])
+            if can_snapshot(response):
+                store_snapshot(cache, cache_key,
+                               build_snapshot(response, entry["path"],
+                                              entry["host"], versions,
+                                              entry["timeout"]))
+            else:
+                # The page now redirects or errors, serve it from the view
+                cache.delete_many([snapshot_key(cache_key),
+                                   validators_key(cache_key)])
+        finally:
+            cache.delete(publish_lock_key(cache_key))
+
+
+def schedule_publish(cache, domains):
+    """
+    Re-render the snapshots that depend on any of ``domains`` once the
+    current transaction commits
+    """
+    transaction.on_commit(lambda: _start_publish(cache, set(domains)))
+
+
+def _start_publish(cache, domains):
+    known = {}
+    for domain_targets in cache.get_many(
+            [targets_key(domain) for domain in domains]).values():
+        known.update(domain_targets)
+    # Only publish what isn't already being published, the lock is what
+    # lets visitors keep getting the stale snapshot in the meantime
+    targets = [
+        (cache_key, kwargs, target_domains)
+        for cache_key, (kwargs, target_domains) in known.items()
+        if cache.add(publish_lock_key(cache_key), True, SNAPSHOT_LOCK_TIMEOUT)
+    ]
+    if not targets:
+        return
+
+    if not getattr(settings, "PUBLIC_SNAPSHOTS_IN_BACKGROUND", True):
+        publish_snapshots(cache, targets)
+        return
+
+    def run():
+        try:
+            publish_snapshots(cache, targets)
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=run, daemon=True).start()
@@ -36,6 +36,10 @@ class BadBreak(Exception):
     pass
 
 
+class BallotAlreadyEnteredError(Exception):
+    pass
+
+
 class JudgeAssignmentError(Exception):
     def __init__(self, reason=None):
         super(JudgeAssignmentError, self).__init__()
@@ -0,0 +1,184 @@
+"""
+Database backed queue for long running tab operations.
+
+Pairing, judge and room assignment and the break are CPU bound, and running
+them inside a gevent web worker stalls every other request on that worker
+until they finish. Instead the view queues a ``TabJob`` and the tab staff's
+browser polls its status, while a separate worker process (``manage.py
+run_jobs``, started next to gunicorn) runs the queue one job at a time.
+
+Jobs are registered with ``register_job`` and return ``(success, message)``.
+They can report progress with ``report_progress``, which is kept in the
+shared cache so that it is visible while the job's transaction is still
+open. Unless ``TAB_JOBS_IN_BACKGROUND`` is set, e.g. in development and
+tests, queued jobs are run straight away in the request that queued them.
+"""
+from collections import namedtuple
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from mittab.apps.tab.models import TabJob
+from mittab.libs.errors import emit_current_exception
+
+PROGRESS_CACHE_ALIAS = "public"
+PROGRESS_TIMEOUT = 60 * 60
+
+RegisteredJob = namedtuple("RegisteredJob", ["function", "title", "failure_message"])
+
+# Registered jobs by kind
+JOBS = {}
+
+
+def register_job(kind, title, failure_message="Got error: {error}"):
+    """
+    Register the decorated function as the job ``kind``. ``failure_message``
+    is shown if it raises, with the exception as ``{error}``.
+
+    Usage:
+
+    @register_job("add_rooms", "Assigning Rooms",
+                  failure_message="Got error during room assignment")
+    def add_rooms():
+        ...
+        return True, "Rooms assigned"
+    """
+
+    def decorator(f):
+        JOBS[kind] = RegisteredJob(f, title, failure_message)
+        return f
+
+    return decorator
+
+
+def _progress_key(job_id):
+    return f"jobs:progress:{job_id}"
+
+
+# threading.local is greenlet-local once gevent has monkey patched the process
+_job_state = threading.local()
+
+
+def current_job():
+    """Returns the job being run, or None outside of one"""
+    return getattr(_job_state, "job", None)
+
+
+def report_progress(percent, message):
+    """Record how far along the current job is, does nothing outside a job"""
+    job = current_job()
+    if job is not None:
+        caches[PROGRESS_CACHE_ALIAS].set(
+            _progress_key(job.pk),
+            {"percent": percent, "message": message},
+            PROGRESS_TIMEOUT,
+        )
+
+
+def job_progress(job):
+    if job.finished:
+        return {"percent": 100, "message": job.result_message}
+    progress = caches[PROGRESS_CACHE_ALIAS].get(_progress_key(job.pk))
+    if progress is None:
+        return {"percent": 0, "message": job.get_status_display()}
+    return progress
+
+
+def in_background():
+    return getattr(settings, "TAB_JOBS_IN_BACKGROUND", False)
+
+
+def enqueue(kind, success_url="/", failure_url="/", **params):
+    """
+    Queue a job. If one of the same kind is already queued or running it is
+    returned instead, so a double submitted form doesn't pair twice.
+    """
+    # Jobs run in the request don't outlive it, so one left running was
+    # interrupted rather than still going
+    statuses = TabJob.ACTIVE_STATUSES if in_background() else (TabJob.QUEUED,)
+    with transaction.atomic():
+        job = (TabJob.objects.select_for_update()
+               .filter(kind=kind, status__in=statuses)
+               .first())
+        if job is not None:
+            return job
+        job = TabJob.objects.create(kind=kind,
+                                    params=params,
+                                    success_url=success_url,
+                                    failure_url=failure_url)
+
+    if not in_background():
+        run_job(job)
+    return job
+
+
+def claim_next_job():
+    """Mark the oldest queued job as running and return it"""
+    with transaction.atomic():
+        job = (TabJob.objects.select_for_update(skip_locked=True)
+               .filter(status=TabJob.QUEUED)
+               .first())
+        if job is None:
+            return None
+        job.status = TabJob.RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "started_at"])
+    return job
+
+
+def run_job(job):
+    if job.status == TabJob.QUEUED:
+        job.status = TabJob.RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "started_at"])
+
+    registered = JOBS[job.kind]
+    _job_state.job = job
+    try:
+        success, message = registered.function(**job.params)
+    except Exception as exp:  # pylint: disable=broad-except
+        emit_current_exception()
+        success, message = False, registered.failure_message.format(error=exp)
+    finally:
+        _job_state.job = None
+
+    job.status = TabJob.SUCCEEDED if success else TabJob.FAILED
+    job.result_message = message
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "result_message", "finished_at"])
+    caches[PROGRESS_CACHE_ALIAS].delete(_progress_key(job.pk))
+    return job
+
+
+def fail_abandoned_jobs():
+    """
+    Fail the jobs a previous worker was running when it stopped. There is a
+    single worker, so nothing else can be running them.
+    """
+    return TabJob.objects.filter(status=TabJob.RUNNING).update(
+        status=TabJob.FAILED,
+        result_message="The job worker stopped before this finished, "
+        "check the results and try again",
+        finished_at=timezone.now(),
+    )
+
+
+def work(poll_interval=1.0, once=False):
+    """Run queued jobs until stopped, or until the queue is empty if ``once``"""
+    fail_abandoned_jobs()
+    while True:
+        # Drop connections the database may have timed out between jobs. A
+        # connection in an atomic block (e.g. a test case) is still in use
+        if not connection.in_atomic_block:
+            close_old_connections()
+        job = claim_next_job()
+        if job is not None:
+            run_job(job)
+        elif once:
+            return
+        else:
+            time.sleep(poll_interval)
@@ -0,0 +1,247 @@
+"""
+Matching engines behind pairing, judge and room assignment.
+
+``max_weight_matching`` has the same contract as
+``mwmatching.maxWeightMatching``: it takes a list of ``(i, j, weight)``
+edges and returns the list of mates, with -1 for unmatched vertices.
+
+The blossom implementation in ``mwmatching`` is the reference backend and
+handles any graph. Judge and room assignment are bipartite, so callers pass
+``num_left`` to say that every edge joins a vertex below ``num_left`` to one
+at or above it. The ``assignment`` backend then solves the problem as a
+dense assignment problem with the Hungarian method. That gives the same
+optimal weight total far faster than the general blossom code.
+
+The backend is picked with the ``MATCHING_BACKEND`` setting. Matchings with
+at least ``MATCHING_OFFLOAD_MIN_EDGES`` edges are computed in the CPU process pool
+(see ``offload``) when it is enabled. ``max_weight_matchings`` solves a batch
+of independent graphs, such as the brackets of a round, concurrently there.
+
+Room assignment weighs every pairing against every room, so rather than an
+edge list it hands ``max_weight_assignment`` the dense matrix of weights,
+which the assignment backend passes straight to the Hungarian solver. The
+blossom backend solves it from the equivalent complete bipartite graph.
+"""
+from django.conf import settings
+
+from mittab.libs import mwmatching, offload, profiler
+
+# Below this the round trip to a pool process costs more than it saves
+OFFLOAD_MIN_EDGES = 2000
+
+
+class BlossomBackend:
+    """The reference general-graph solver"""
+
+    name = "blossom"
+
+    def match(self, edges, maxcardinality=False, num_left=None):
+        return mwmatching.maxWeightMatching(edges, maxcardinality=maxcardinality)
+
+    def assign(self, weights):
+        num_rows = len(weights)
+        edges = [(r, num_rows + c, float(weight))
+                 for r, row in enumerate(weights)
+                 for c, weight in enumerate(row)]
+        # Every row can be matched, so a maximum cardinality matching assigns
+        # all of them
+        mate = self.match(edges, maxcardinality=True)
+        return [mate[r] - num_rows for r in range(num_rows)]
+
+
+class AssignmentBackend:
+    """
+    Hungarian solver for bipartite graphs, falling back to the blossom
+    solver when the graph is not declared bipartite
+    """
+
+    name = "assignment"
+
+    def match(self, edges, maxcardinality=False, num_left=None):
+        if num_left is None:
+            return BlossomBackend().match(edges, maxcardinality)
+        if not edges:
+            return []
+
+        rows, cols, weights = {}, {}, {}
+        for i, j, weight in edges:
+            # Room ranks are Decimals, the solver works in floats
+            weight = float(weight)
+            if i > j:
+                i, j = j, i
+            if i >= num_left or j < num_left:
+                raise ValueError(f"Edge ({i}, {j}) does not cross the bipartition")
+            rows.setdefault(i, len(rows))
+            cols.setdefault(j, len(cols))
+            key = (rows[i], cols[j])
+            weights[key] = max(weight, weights.get(key, weight))
+
+        if maxcardinality:
+            # Lift every edge by more than any difference in total weight
+            # between two matchings, so that one more matched pair always
+            # beats any reweighting of the same number of pairs. The lifted
+            # edges must also be positive, since a missing edge costs 0 and
+            # would otherwise win over a negative one
+            min_weight = min(weights.values())
+            spread = max(weights.values()) - min_weight
+            lift = spread * min(len(rows), len(cols)) + 1 - min(0, min_weight)
+            weights = {key: weight + lift for key, weight in weights.items()}
+        else:
+            weights = {key: weight for key, weight in weights.items() if weight > 0}
+
+        transpose = len(rows) > len(cols)
+        if transpose:
+            weights = {(c, r): weight for (r, c), weight in weights.items()}
+            row_vertices, col_vertices = list(cols), list(rows)
+        else:
+            row_vertices, col_vertices = list(rows), list(cols)
+
+        # Missing edges cost nothing, which is the same as leaving the row
+        # unmatched
+        cost = [[0.0] * len(col_vertices) for _ in row_vertices]
+        for (r, c), weight in weights.items():
+            cost[r][c] = -weight
+
+        mate = [-1] * (max(max(rows), max(cols)) + 1)
+        for r, c in enumerate(hungarian(cost)):
+            if (r, c) not in weights:
+                continue
+            mate[row_vertices[r]] = col_vertices[c]
+            mate[col_vertices[c]] = row_vertices[r]
+        return mate
+
+    def assign(self, weights):
+        return hungarian([[-float(weight) for weight in row] for row in weights])
+
+
+def hungarian(cost):
+    """
+    Minimum cost assignment of every row of ``cost`` to a distinct column,
+    for a matrix with no more rows than columns. Returns the column of each
+    row. O(rows^2 * columns).
+    """
+    n = len(cost)
+    m = len(cost[0]) if n else 0
+    inf = float("inf")
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    # p[j] is the (1-indexed) row assigned to column j, column 0 is a sentinel
+    p = [0] * (m + 1)
+    way = [0] * (m + 1)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            row = cost[i0 - 1]
+            u_i0 = u[i0]
+            delta = inf
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - u_i0 - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    assignment = [0] * n
+    for j in range(1, m + 1):
+        if p[j]:
+            assignment[p[j] - 1] = j - 1
+    return assignment
+
+
+BACKENDS = {
+    backend.name: backend for backend in (BlossomBackend(), AssignmentBackend())
+}
+
+
+def get_backend(name=None):
+    name = name or getattr(settings, "MATCHING_BACKEND", AssignmentBackend.name)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown matching backend: {name}")
+    return BACKENDS[name]
+
+
+def max_weight_matching(edges, maxcardinality=False, num_left=None, backend=None):
+    """
+    Compute a maximum weight matching. See ``mwmatching.maxWeightMatching``
+    for the format of ``edges`` and the return value. Pass ``num_left`` when
+    the graph is bipartite to allow the faster assignment solver.
+    """
+    backend = get_backend(backend)
+    with profiler.stage("matching"):
+        min_edges = getattr(settings, "MATCHING_OFFLOAD_MIN_EDGES",
+                            OFFLOAD_MIN_EDGES)
+        if len(edges) >= min_edges:
+            return offload.run(_match, backend.name, list(edges),
+                               maxcardinality, num_left)
+        return backend.match(edges, maxcardinality, num_left)
+
+
+def max_weight_matchings(edge_lists, maxcardinality=False, num_left=None,
+                         backend=None):
+    """
+    Compute a maximum weight matching for each of a list of independent
+    graphs, in the same order. The graphs are solved concurrently in the CPU
+    process pool when they have at least ``MATCHING_OFFLOAD_MIN_EDGES`` edges
+    between them.
+    """
+    backend = get_backend(backend)
+    with profiler.stage("matching"):
+        min_edges = getattr(settings, "MATCHING_OFFLOAD_MIN_EDGES",
+                            OFFLOAD_MIN_EDGES)
+        if sum(len(edges) for edges in edge_lists) >= min_edges:
+            return offload.run_all(_match, [
+                (backend.name, list(edges), maxcardinality, num_left)
+                for edges in edge_lists
+            ])
+        return [backend.match(edges, maxcardinality, num_left)
+                for edges in edge_lists]
+
+
+def max_weight_assignment(weights, backend=None):
+    """
+    Assign each row of the dense matrix ``weights``, which has no more rows
+    than columns, to a distinct column so that the total weight is as large
+    as possible. Returns the column of each row.
+    """
+    backend = get_backend(backend)
+    with profiler.stage("matching"):
+        min_edges = getattr(settings, "MATCHING_OFFLOAD_MIN_EDGES",
+                            OFFLOAD_MIN_EDGES)
+        if sum(len(row) for row in weights) >= min_edges:
+            return offload.run(_assign, backend.name,
+                               [[float(weight) for weight in row]
+                                for row in weights])
+        return backend.assign(weights)
+
+
+def _match(backend_name, edges, maxcardinality, num_left):
+    # Runs in a pool process, which gets the backend by name rather than
+    # reading the settings
+    return BACKENDS[backend_name].match(edges, maxcardinality, num_left)
+
+
+def _assign(backend_name, weights):
+    return BACKENDS[backend_name].assign(weights)
@@ -0,0 +1,79 @@
+"""
+Run pure CPU bound computations in a pool of worker processes.
+
+Gunicorn runs gevent workers, so a long computation in a request stops every
+other greenlet on that worker until it finishes, e-ballot submissions
+included. ``run`` hands the computation to a ``ProcessPoolExecutor`` and the
+greenlet waits on the result cooperatively, since gevent patches the locks
+``concurrent.futures`` waits on. ``run_all`` does the same for a batch of
+independent calls, which then run side by side on the pool's processes.
+
+What is offloaded must be a module level function taking plain picklable
+data (ids, weights, lists and tuples of them) and never touch the ORM. The
+pool is started lazily in each web worker with ``spawn``, so nothing of the
+parent's gevent hub or database connections is inherited. It is disabled
+when ``CPU_POOL_WORKERS`` is 0, and ``run`` then calls the function directly.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+
+from django.conf import settings
+
+_pool = {"executor": None}
+_pool_lock = threading.Lock()
+
+
+def pool_workers():
+    return getattr(settings, "CPU_POOL_WORKERS", 0)
+
+
+def _get_pool():
+    with _pool_lock:
+        if _pool["executor"] is None:
+            _pool["executor"] = ProcessPoolExecutor(
+                max_workers=pool_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool["executor"]
+
+
+def shutdown():
+    with _pool_lock:
+        if _pool["executor"] is not None:
+            _pool["executor"].shutdown(wait=False, cancel_futures=True)
+            _pool["executor"] = None
+
+
+def run(fn, *args):
+    """
+    Returns ``fn(*args)``, computed in the process pool when there is one
+    """
+    if pool_workers() <= 0:
+        return fn(*args)
+    try:
+        return _get_pool().submit(fn, *args).result()
+    except BrokenProcessPool:
+        # A pool process died (e.g. it was killed for using too much memory),
+        # start a new pool next time and do this one here
+        shutdown()
+        return fn(*args)
+
+
+def run_all(fn, arg_tuples):
+    """
+    Returns ``[fn(*args) for args in arg_tuples]``, with the calls spread over
+    the process pool when there is one. Results are in the order of
+    ``arg_tuples`` however the pool schedules them.
+    """
+    arg_tuples = list(arg_tuples)
+    if pool_workers() <= 0 or len(arg_tuples) <= 1:
+        return [run(fn, *args) for args in arg_tuples]
+    try:
+        pool = _get_pool()
+        futures = [pool.submit(fn, *args) for args in arg_tuples]
+        return [future.result() for future in futures]
+    except BrokenProcessPool:
+        shutdown()
+        return [fn(*args) for args in arg_tuples]
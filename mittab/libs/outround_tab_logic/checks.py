@@ -1,43 +1,98 @@
+from django.db.models import Exists, OuterRef, Q
+
 from mittab.apps.tab.models import *
 from mittab.libs.errors import PrevRoundNotEnteredError
 
 
 def lost_teams():
-    return [outround.loser.id
-            for outround in Outround.objects.all()
-            if outround.loser]
-
-
-def have_enough_judges_type(type_of_round):
-    loser_ids = [outround.loser.id
-                 for outround in Outround.objects.all()
-                 if outround.loser]
-
-    panel_size = 3
-
-    if type_of_round == BreakingTeam.VARSITY:
-        panel_size = TabSettings.get("var_panel_size", 3)
-    else:
-        panel_size = TabSettings.get("nov_panel_size", 3)
-
-    teams_count = BreakingTeam.objects.filter(
-        type_of_team=type_of_round
-    ).exclude(team__id__in=loser_ids).count()
-
-    judges_needed = (
-        teams_count // 2
-    ) * panel_size
-
-    num_judges = CheckIn.objects.filter(round_number=0).count()
-
-    if num_judges < judges_needed:
-        return False, (num_judges, judges_needed)
-    return True, (num_judges, judges_needed)
-
-
-def have_enough_judges():
-    var = have_enough_judges_type(BreakingTeam.VARSITY)
-    nov = have_enough_judges_type(BreakingTeam.NOVICE)
+    """Ids of the teams that have lost an outround, read in one query"""
+    losers = []
+    for gov_team_id, opp_team_id, victor in Outround.objects.filter(
+            victor__in=(Outround.GOV, Outround.GOV_VIA_FORFEIT,
+                        Outround.OPP, Outround.OPP_VIA_FORFEIT)
+    ).values_list("gov_team_id", "opp_team_id", "victor"):
+        if victor in (Outround.GOV, Outround.GOV_VIA_FORFEIT):
+            losers.append(opp_team_id)
+        else:
+            losers.append(gov_team_id)
+    return losers
+
+
+class OutroundStatus:
+    """
+    Where the break stands: which breaking teams are out, which are left of
+    each type, and how many judges and rooms are checked in for outrounds.
+    The breakers come from one query annotated with whether each has lost an
+    outround, so the checks and the outround pages share a fixed number of
+    queries however many outrounds have been entered.
+    """
+
+    def __init__(self, eliminated, remaining, judges_checked_in,
+                 rooms_checked_in, panel_sizes):
+        self.eliminated = eliminated
+        self.remaining = remaining
+        self.judges_checked_in = judges_checked_in
+        self.rooms_checked_in = rooms_checked_in
+        self.panel_sizes = panel_sizes
+
+    @classmethod
+    def load(cls):
+        gov_won = (Outround.GOV, Outround.GOV_VIA_FORFEIT)
+        opp_won = (Outround.OPP, Outround.OPP_VIA_FORFEIT)
+        lost = Outround.objects.filter(
+            Q(opp_team_id=OuterRef("team_id"), victor__in=gov_won)
+            | Q(gov_team_id=OuterRef("team_id"), victor__in=opp_won)
+        )
+
+        eliminated = set()
+        remaining = {BreakingTeam.VARSITY: [], BreakingTeam.NOVICE: []}
+        for team_id, type_of_team, has_lost in BreakingTeam.objects.annotate(
+                has_lost=Exists(lost)
+        ).order_by("pk").values_list("team_id", "type_of_team", "has_lost"):
+            if has_lost:
+                eliminated.add(team_id)
+            else:
+                remaining.setdefault(type_of_team, []).append(team_id)
+
+        return cls(
+            eliminated=frozenset(eliminated),
+            remaining=remaining,
+            judges_checked_in=CheckIn.objects.filter(round_number=0).count(),
+            rooms_checked_in=RoomCheckIn.objects.filter(round_number=0).count(),
+            panel_sizes={
+                BreakingTeam.VARSITY: TabSettings.get("var_panel_size", 3),
+                BreakingTeam.NOVICE: TabSettings.get("nov_panel_size", 3),
+            },
+        )
+
+    def judges_needed(self, type_of_round):
+        panel_size = self.panel_sizes.get(type_of_round,
+                                          self.panel_sizes[BreakingTeam.NOVICE])
+        return self.rooms_needed(type_of_round) * panel_size
+
+    def rooms_needed(self, type_of_round):
+        return len(self.remaining.get(type_of_round, [])) // 2
+
+    def enough_judges(self, type_of_round):
+        needed = self.judges_needed(type_of_round)
+        return (self.judges_checked_in >= needed,
+                (self.judges_checked_in, needed))
+
+    def enough_rooms(self, type_of_round):
+        needed = self.rooms_needed(type_of_round)
+        return (self.rooms_checked_in >= needed,
+                (self.rooms_checked_in, needed))
+
+
+def have_enough_judges_type(type_of_round, status=None):
+    status = status or OutroundStatus.load()
+    return status.enough_judges(type_of_round)
+
+
+def have_enough_judges(status=None):
+    status = status or OutroundStatus.load()
+    var = have_enough_judges_type(BreakingTeam.VARSITY, status)
+    nov = have_enough_judges_type(BreakingTeam.NOVICE, status)
 
     return (
         var[0] and nov[0],
@@ -45,29 +100,15 @@ def have_enough_judges():
     )
 
 
-def have_enough_rooms_type(type_of_round):
-    loser_ids = [outround.loser.id
-                 for outround in Outround.objects.all()
-                 if outround.loser]
-
-    num_teams = BreakingTeam.objects.filter(
-        type_of_team=type_of_round
-    ).exclude(team__id__in=loser_ids).count()
-
-    rooms_needed = (
-        num_teams // 2
-    )
-
-    num_rooms = RoomCheckIn.objects.filter(round_number=0).count()
-
-    if num_rooms < rooms_needed:
-        return False, (num_rooms, rooms_needed)
-    return True, (num_rooms, rooms_needed)
+def have_enough_rooms_type(type_of_round, status=None):
+    status = status or OutroundStatus.load()
+    return status.enough_rooms(type_of_round)
 
 
-def have_enough_rooms():
-    var = have_enough_rooms_type(BreakingTeam.VARSITY)
-    nov = have_enough_rooms_type(BreakingTeam.NOVICE)
+def have_enough_rooms(status=None):
+    status = status or OutroundStatus.load()
+    var = have_enough_rooms_type(BreakingTeam.VARSITY, status)
+    nov = have_enough_rooms_type(BreakingTeam.NOVICE, status)
 
     return (
         var[0] and nov[0],
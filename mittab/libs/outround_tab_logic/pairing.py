@@ -1,24 +1,28 @@
+from collections import defaultdict
 import math
 import random
 
+from django.db.models import Count
+
 from mittab.apps.tab.models import *
 
-from mittab.libs.outround_tab_logic.checks import have_enough_rooms
+from mittab.libs.outround_tab_logic.checks import have_enough_rooms, lost_teams
 from mittab.libs.outround_tab_logic.bracket_generation import gen_bracket
 from mittab.libs.tab_logic import (
     have_properly_entered_data,
 )
 from mittab.libs.tab_logic.rankings import get_team_rankings
-from mittab.libs.tab_logic.stats import num_govs
-from mittab.libs import errors
+from mittab.libs import errors, profiler
 import mittab.libs.cacheing.cache_logic as cache_logic
 
 
-
+@profiler.profile_operation("perform_the_break")
+@cache_logic.stat_memo_scope()
 def perform_the_break():
+    profiler.checkpoint("rankings")
     teams, nov_teams = cache_logic.cache_fxn_key(
         get_team_rankings,
-        "team_rankings",
+        cache_logic.rankings_key("team_rankings"),
         cache_logic.DEFAULT,
         None
     )
@@ -30,6 +34,7 @@ def perform_the_break():
         return False, "Please check your break tab settings"
 
     # This forces a refresh of the breaking teams
+    profiler.checkpoint("breaking_teams")
     Outround.objects.all().delete()
     BreakingTeam.objects.all().delete()
 
@@ -62,6 +67,7 @@ def perform_the_break():
 
         current_seed += 1
 
+    profiler.checkpoint("brackets")
     pair(BreakingTeam.VARSITY)
     pair(BreakingTeam.NOVICE)
 
@@ -85,6 +91,62 @@ def is_pairing_possible(num_teams):
     have_properly_entered_data(round_to_check)
 
 
+class SideHistory:
+    """
+    What choosing sides in an outround needs to know about a set of teams:
+    how many times each has been gov, and which of them have met before.
+    Loaded for a whole bracket in a fixed number of queries.
+    """
+
+    def __init__(self, gov_counts, meetings, sidelock):
+        self.gov_counts = gov_counts
+        # (gov team id, opp team id) of every inround between two of the teams
+        self.meetings = meetings
+        self.sidelock = sidelock
+
+    @classmethod
+    def load(cls, team_ids):
+        team_ids = list(team_ids)
+        gov_counts = defaultdict(int)
+        for model in (Round, Outround):
+            for team_id, count in model.objects.filter(gov_team_id__in=team_ids) \
+                    .values("gov_team_id").annotate(count=Count("id")) \
+                    .values_list("gov_team_id", "count"):
+                gov_counts[team_id] += count
+
+        sidelock = TabSettings.get("sidelock", 0)
+        meetings = set()
+        if sidelock:
+            meetings = set(Round.objects.filter(
+                gov_team_id__in=team_ids, opp_team_id__in=team_ids
+            ).values_list("gov_team_id", "opp_team_id"))
+        return cls(gov_counts, meetings, sidelock)
+
+    def gov_team(self, team_one, team_two):
+        """See ``gov_team``"""
+        # 1. Check for sidelock
+        if self.sidelock:
+            if (team_one.team_id, team_two.team_id) in self.meetings:
+                return True, team_two
+            elif (team_two.team_id, team_one.team_id) in self.meetings:
+                return True, team_one
+
+        # 2. Check for least govs
+        team_one_govs = self.gov_counts[team_one.team_id]
+        team_two_govs = self.gov_counts[team_two.team_id]
+
+        if team_one_govs < team_two_govs:
+            return False, team_one
+        elif team_two_govs < team_one_govs:
+            return False, team_two
+
+        # 3. Random assignment (govs are equal)
+        if random.randint(0, 1) == 0:
+            return False, team_one
+        else:
+            return False, team_two
+
+
 def gov_team(team_one, team_two):
     """
     Determine which team should be gov in an outround pairing.
@@ -97,43 +159,24 @@ def gov_team(team_one, team_two):
     Returns:
         (sidelock: bool, gov_team: BreakingTeam)
     """
-    sidelock = TabSettings.get("sidelock", 0)
-
-    # 1. Check for sidelock
-    if sidelock:
-        if Round.objects.filter(gov_team=team_one.team,
-                                opp_team=team_two.team).exists():
-            return True, team_two
-        elif Round.objects.filter(gov_team=team_two.team,
-                                  opp_team=team_one.team).exists():
-            return True, team_one
-
-    # 2. Check for least govs
-    team_one_govs = num_govs(team_one.team)
-    team_two_govs = num_govs(team_two.team)
-
-    if team_one_govs < team_two_govs:
-        return False, team_one
-    elif team_two_govs < team_one_govs:
-        return False, team_two
-
-    # 3. Random assignment (govs are equal)
-    if random.randint(0, 1) == 0:
-        return False, team_one
-    else:
-        return False, team_two
+    history = SideHistory.load([team_one.team_id, team_two.team_id])
+    return history.gov_team(team_one, team_two)
 
 
 def pair(type_of_break=BreakingTeam.VARSITY):
-    lost_outround = [t.loser.id for t in Outround.objects.all() if t.loser]
-
-    base_queryset = BreakingTeam.objects.filter(
-        type_of_team=type_of_break
-    ).exclude(
-        team__id__in=lost_outround
+    """
+    Pair the next outround of a break. The remaining breaking teams, their
+    gov counts and the rounds between them are loaded up front and the whole
+    bracket is inserted at once, so the number of queries doesn't grow with
+    the size of the bracket.
+    """
+    breaking_teams = list(
+        BreakingTeam.objects.filter(type_of_team=type_of_break)
+        .exclude(team__id__in=lost_teams())
+        .order_by("pk")
     )
 
-    num_teams = base_queryset.count()
+    num_teams = len(breaking_teams)
 
     teams_for_bracket = num_teams
 
@@ -155,28 +198,27 @@ def pair(type_of_break=BreakingTeam.VARSITY):
     else:
         TabSettings.set("nov_outrounds_public", 0)
 
-    bracket = gen_bracket(num_teams)
+    by_seed = {}
+    for breaking_team in breaking_teams:
+        by_seed.setdefault(breaking_team.effective_seed, breaking_team)
+    history = SideHistory.load(bt.team_id for bt in breaking_teams)
 
-    for pairing in bracket:
-        team_one = base_queryset.filter(
-            effective_seed=pairing[0]).prefetch_related(
-                "team__gov_team",
-                "team__gov_team_outround").first()
-        team_two = base_queryset.filter(
-            effective_seed=pairing[1]).prefetch_related(
-                "team__gov_team",
-                "team__gov_team_outround").first()
+    outrounds = []
+    for pairing in gen_bracket(num_teams):
+        team_one = by_seed.get(pairing[0])
+        team_two = by_seed.get(pairing[1])
 
         if not team_one or not team_two:
             continue
 
-        sidelock, gov = gov_team(team_one, team_two)
+        sidelock, gov = history.gov_team(team_one, team_two)
         opp = team_one if gov == team_two else team_two
 
-        Outround.objects.create(
+        outrounds.append(Outround(
             num_teams=num_teams,
             type_of_round=type_of_break,
-            gov_team=gov.team,
-            opp_team=opp.team,
+            gov_team_id=gov.team_id,
+            opp_team_id=opp.team_id,
             sidelock=sidelock
-        )
+        ))
+    Outround.objects.bulk_create(outrounds)
@@ -0,0 +1,226 @@
+"""
+Lightweight profiler for tab operations.
+
+Wrap an operation with ``profile_operation`` and mark its stages inside with
+``checkpoint`` (which starts the next top level stage) or ``stage`` (which
+times a nested block, e.g. matching inside pairing). Each stage records its
+own time and query count, excluding nested stages, so the stages of a run add
+up to its total. ``note`` adds a line about the run, e.g. how much a solver
+input was pruned, that is kept alongside its stages.
+
+The last ``PROFILER_HISTORY`` runs of each operation are kept in the shared
+cache so that every worker sees them. Outside of an operation ``checkpoint``
+and ``stage`` do nothing, and an operation nested in another one is recorded
+as a stage of the outer operation.
+"""
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+PROFILER_CACHE_ALIAS = getattr(settings, "PROFILER_CACHE_ALIAS", "public")
+PROFILER_HISTORY = getattr(settings, "PROFILER_HISTORY", 10)
+PROFILER_TIMEOUT = 60 * 60 * 24
+OPERATIONS_KEY = "profiler:operations"
+
+
+class Frame:
+    __slots__ = ("name", "start", "child_seconds", "queries", "checkpoint",
+                 "operation")
+
+    def __init__(self, name, checkpoint=False, operation=False):
+        self.name = name
+        self.start = time.perf_counter()
+        self.child_seconds = 0.0
+        self.queries = 0
+        self.checkpoint = checkpoint
+        self.operation = operation
+
+
+class Run:
+    """The stages of one operation, in the order they were first entered"""
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.started_at = datetime.now(timezone.utc)
+        self.stages = {}
+        self.notes = []
+        self.stack = []
+        self.push("other")
+
+    def push(self, name, checkpoint=False, operation=False):
+        self.stages.setdefault(
+            name, {"name": name, "seconds": 0.0, "queries": 0, "calls": 0}
+        )
+        self.stack.append(Frame(name, checkpoint, operation))
+
+    def pop(self):
+        frame = self.stack.pop()
+        elapsed = time.perf_counter() - frame.start
+        stage = self.stages[frame.name]
+        stage["seconds"] += elapsed - frame.child_seconds
+        stage["queries"] += frame.queries
+        stage["calls"] += 1
+        if self.stack:
+            self.stack[-1].child_seconds += elapsed
+
+    def pop_to(self, depth):
+        while len(self.stack) > depth:
+            self.pop()
+
+    def checkpoint(self, name):
+        # Checkpoints end the previous checkpoint at the same level, and are
+        # named after the nested operation they belong to
+        if self.stack[-1].checkpoint:
+            self.pop()
+        for frame in reversed(self.stack):
+            if frame.operation:
+                name = f"{frame.name}.{name}"
+                break
+        self.push(name, checkpoint=True)
+
+    def count_query(self, execute, sql, params, many, context):
+        self.stack[-1].queries += 1
+        return execute(sql, params, many, context)
+
+    def finish(self, error=None):
+        self.pop_to(0)
+        other = self.stages["other"]
+        if other["seconds"] < 0.001 and not other["queries"]:
+            del self.stages["other"]
+        stages = list(self.stages.values())
+        for stage in stages:
+            stage["seconds"] = round(stage["seconds"], 4)
+        return {
+            "operation": self.operation,
+            "started_at": self.started_at.isoformat(),
+            "seconds": round(sum(stage["seconds"] for stage in stages), 4),
+            "queries": sum(stage["queries"] for stage in stages),
+            "error": error,
+            "stages": stages,
+            "notes": self.notes,
+        }
+
+
+# threading.local is greenlet-local once gevent has monkey patched the process
+_profiler_state = threading.local()
+
+
+def current_run():
+    """Returns the run of the active operation, or None outside of one"""
+    return getattr(_profiler_state, "run", None)
+
+
+@contextmanager
+def stage(name, operation=False):
+    """Time a nested block of the active operation"""
+    run = current_run()
+    if run is None:
+        yield
+        return
+    depth = len(run.stack)
+    run.push(name, operation=operation)
+    try:
+        yield
+    finally:
+        # Also closes any checkpoints started inside the block
+        run.pop_to(depth)
+
+
+@contextmanager
+def unrecorded():
+    """
+    Run a block without recording the operations inside it, e.g. a dry run
+    that shouldn't show up as a real run of the operation
+    """
+    if current_run() is not None:
+        yield
+        return
+    _profiler_state.run = Run("unrecorded")
+    try:
+        yield
+    finally:
+        _profiler_state.run = None
+
+
+def checkpoint(name):
+    """End the current stage of the active operation and start the next one"""
+    run = current_run()
+    if run is not None:
+        run.checkpoint(name)
+
+
+def note(message):
+    """Record a line about the active operation, shown with its stages"""
+    run = current_run()
+    if run is not None:
+        run.notes.append(message)
+
+
+def profile_operation(operation):
+    """
+    Profile every call of the decorated function as ``operation``
+
+    Usage:
+
+    @profile_operation("pair_round")
+    def pair_round():
+        checkpoint("validation")
+        ...
+        checkpoint("writes")
+        ...
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if current_run() is not None:
+                with stage(operation, operation=True):
+                    return f(*args, **kwargs)
+
+            run = Run(operation)
+            _profiler_state.run = run
+            error = None
+            try:
+                with connection.execute_wrapper(run.count_query):
+                    return f(*args, **kwargs)
+            except Exception as exp:
+                error = f"{type(exp).__name__}: {exp}"
+                raise
+            finally:
+                _profiler_state.run = None
+                record_run(run.finish(error))
+
+        return wrapper
+
+    return decorator
+
+
+def _runs_key(operation):
+    return f"profiler:runs:{operation}"
+
+
+def record_run(result):
+    cache = caches[PROFILER_CACHE_ALIAS]
+    operation = result["operation"]
+    runs = cache.get(_runs_key(operation)) or []
+    runs = [result] + runs[:PROFILER_HISTORY - 1]
+    cache.set(_runs_key(operation), runs, PROFILER_TIMEOUT)
+
+    operations = cache.get(OPERATIONS_KEY) or []
+    if operation not in operations:
+        cache.set(OPERATIONS_KEY, sorted(operations + [operation]),
+                  PROFILER_TIMEOUT)
+
+
+def recent_runs():
+    """Returns the recorded runs of every operation, newest first"""
+    cache = caches[PROFILER_CACHE_ALIAS]
+    operations = cache.get(OPERATIONS_KEY) or []
+    return {operation: cache.get(_runs_key(operation)) or []
+            for operation in operations}
@@ -1,16 +1,40 @@
+from collections import namedtuple
 from datetime import datetime
 from decimal import *
+from hashlib import sha1
 import itertools
 import random
 
+from django.core.cache import caches
+from django.db import transaction
 from django.db.models import *
 
 from mittab.apps.tab.models import *
-from mittab.libs import errors, mwmatching
+from mittab.libs import errors, matching, profiler
+from mittab.libs.cacheing import cache_logic
+from mittab.libs.cacheing.cache_logic import stat_memo_scope
 from mittab.libs.tab_logic.stats import *
 from mittab.libs.tab_logic.rankings import *
+from mittab.libs.tab_logic.standings import Standings
 
+# Seeds the random choices of a pairing, so re-pairing a round gives the same
+# result
+PAIRING_SEED = 0xBEEF
+# How long the matching of a bracket is kept for re-pairs, see perfect_pairings
+BRACKET_MATCHING_TIMEOUT = 60 * 60 * 6
 
+
+def bracket_rng(bracket):
+    """
+    The random number generator for the coin flips of one bracket. Each
+    bracket has its own so its pairing doesn't depend on which other brackets
+    were paired first.
+    """
+    return random.Random(PAIRING_SEED * 1000 + bracket)
+
+
+@profiler.profile_operation("pair_round")
+@stat_memo_scope()
 def pair_round():
     """
     Pair the next round of debate.
@@ -23,21 +47,24 @@ def pair_round():
         4) Setup the list of teams by either seed or speaks
         5) Calculate byes
         6) Calculate pull ups based on byes
-        7) Pass in evened brackets to the perfect pairing algorithm
+        7) Pass in evened brackets to the perfect pairing algorithm, which
+           pairs them all at once
 
     Judges are added later.
 
     pairings are computed in the following format: [gov,opp,judge]
     and then saved immediately into the database
     """
+    profiler.checkpoint("validation")
     current_round = TabSettings.get("cur_round")
     validate_round_data(current_round)
 
+    profiler.checkpoint("brackets")
     # Set released to false so we don't show pairings
     TabSettings.set("pairing_released", 0)
 
     # Need a reproduceable random pairing order
-    random.seed(0xBEEF)
+    rng = random.Random(PAIRING_SEED)
 
     all_pull_ups = []
 
@@ -64,14 +91,14 @@ def pair_round():
             else:
                 print("Bye: using all teams")
                 possible_teams = list_of_teams
-            bye_team = random.choice(possible_teams)
+            bye_team = rng.choice(possible_teams)
             bye = Bye(bye_team=bye_team, round_number=current_round)
             bye.save()
             list_of_teams.remove(bye.bye_team)
 
         # Sort the teams by seed. We must randomize beforehand so that similarly
         # seeded teams are paired randomly.
-        random.shuffle(list_of_teams)
+        rng.shuffle(list_of_teams)
         list_of_teams = sorted(list_of_teams, key=lambda team: team.seed, reverse=True)
     # Otherwise, pair by *speaks*
     else:
@@ -79,7 +106,7 @@ def pair_round():
         # NOTE: We do not bucket teams that have only won by
         #       forfeit/bye/lenient_late in every round because they have no speaks
         middle_of_bracket, normal_pairing_teams = get_middle_and_non_middle_teams(
-            all_checked_in_teams
+            all_checked_in_teams, rng
         )
 
         team_buckets = [(tot_wins(team), team) for team in normal_pairing_teams]
@@ -175,18 +202,21 @@ def pair_round():
 
     # Pass in the prepared nodes to the perfect pairing logic
     # to get a pairing for the round
+    profiler.checkpoint("pairing")
+    brackets = [list_of_teams] if current_round == 1 else list_of_teams
+    bracket_pairings = perfect_pairings(
+        brackets, [bracket_rng(bracket) for bracket in range(len(brackets))]
+    )
     pairings = []
-    for bracket in range(current_round):
-        if current_round == 1:
-            temp = perfect_pairing(list_of_teams)
-        else:
-            temp = perfect_pairing(list_of_teams[bracket])
+    for bracket, temp in enumerate(bracket_pairings):
+        if current_round != 1:
             print(f"Pairing bracket {bracket} of size {len(temp)}")
         for pair in temp:
             pairings.append([pair[0], pair[1]])
 
+    profiler.checkpoint("sorting")
     if current_round == 1:
-        random.shuffle(pairings)
+        rng.shuffle(pairings)
         pairings = sorted(
             pairings, key=lambda team: highest_seed(team[0], team[1]), reverse=True
         )
@@ -201,6 +231,7 @@ def pair_round():
         )
 
     # Enter into database
+    profiler.checkpoint("writes")
     all_rounds = []
     for gov, opp in pairings:
         round_obj = Round(
@@ -301,7 +332,7 @@ def hit_before(team1, team2):
     return False
 
 
-def get_middle_and_non_middle_teams(all_teams):
+def get_middle_and_non_middle_teams(all_teams, rng=random):
     """
     Given a list of teams, splits the list into two. The first value will be
     a list of teams who should be in the middle of the bracket because all of their
@@ -318,7 +349,7 @@ def get_middle_and_non_middle_teams(all_teams):
     """
     middle_of_bracket, non_middle_of_bracket = [], []
     all_teams = list(all_teams)
-    random.shuffle(all_teams)
+    rng.shuffle(all_teams)
     round_count = TabSettings.get("cur_round") - 1
 
     for team in all_teams:
@@ -336,61 +367,53 @@ def get_middle_and_non_middle_teams(all_teams):
     return middle_of_bracket, non_middle_of_bracket
 
 
-def sorted_pairings(round_number, outround=False):
+def sorted_pairings(round_number, outround=False, standings=None):
     """
     Helper function to get the sorted pairings for a round while minimizing the
-    number of DB queries required to calculate it
+    number of DB queries required to calculate it. Team records used for
+    sorting come from the stored standings rather than the related rounds.
     """
     fields = [
         "judges",
-        "judges__judges",
+        "judges__required_room_tags",
         "chair",
         "room",
+        "room__tags",
         "gov_team",
         "opp_team",
         "gov_team__breaking_team",
-        "gov_team__gov_team",  # poorly named relation, points to rounds as gov
-        "gov_team__opp_team",  # poorly named relation, points to rounds as gov
-        "gov_team__byes",
-        "gov_team__no_shows",
-        "gov_team__debaters__team_set",
-        "gov_team__debaters__team_set__byes",
-        "gov_team__debaters__team_set__no_shows",
-        "gov_team__debaters__roundstats_set",
-        "gov_team__debaters__roundstats_set__round",
-        "gov_team__gov_team_outround",
-        "gov_team__opp_team_outround",
-        "opp_team__breaking_team",
-        "opp_team__gov_team",  # poorly named relation, points to rounds as gov
-        "opp_team__opp_team",  # poorly named relation, points to rounds as gov
-        "opp_team__byes",
-        "opp_team__no_shows",
-        "opp_team__debaters__team_set",
-        "opp_team__debaters__team_set__byes",
-        "opp_team__debaters__team_set__no_shows",
-        "opp_team__debaters__roundstats_set",
-        "opp_team__debaters__roundstats_set__round",
-        "opp_team__gov_team_outround",
-        "opp_team__opp_team_outround",
-        "room__tags", "judges__required_room_tags",
+        "gov_team__debaters",
         "gov_team__required_room_tags",
-        "opp_team__required_room_tags"
+        "opp_team__breaking_team",
+        "opp_team__debaters",
+        "opp_team__required_room_tags",
     ]
     model = Outround if outround else Round
     filter_field = "num_teams" if outround else "round_number"
 
+    if standings is None and not outround and round_number != 1:
+        standings = Standings.load()
     round_pairing = list(
         model.objects.filter(**{filter_field: round_number}).prefetch_related(*fields)
     )
-    round_pairing.sort(key=lambda x: team_comp(x, round_number), reverse=True)
+    round_pairing.sort(key=lambda x: team_comp(x, round_number, standings),
+                       reverse=True)
 
     return round_pairing
 
 
-def team_comp(pairing, round_number):
+def team_comp(pairing, round_number, standings=None):
     gov, opp = pairing.gov_team, pairing.opp_team
     if round_number == 1:
         return (max(gov.seed, opp.seed), min(gov.seed, opp.seed))
+    elif standings is not None:
+        gov_stats = standings.team_stats(gov.id)
+        opp_stats = standings.team_stats(opp.id)
+        return (
+            max(gov_stats.wins, opp_stats.wins),
+            max(gov_stats.speaks, opp_stats.speaks),
+            min(gov_stats.speaks, opp_stats.speaks),
+        )
     else:
         return (
             max(tot_wins(gov), tot_wins(opp)),
@@ -483,28 +506,70 @@ class TabFlags:
         return filters, symbol_text
 
 
-def perfect_pairing(list_of_teams):
-    """Uses the mwmatching library to assign teams in a pairing"""
-    graph_edges = []
+def perfect_pairing(list_of_teams, rng=random):
+    """Uses the matching engine to assign teams in a pairing"""
+    return perfect_pairings([list_of_teams], [rng])[0]
+
+
+def perfect_pairings(brackets, rngs):
+    """
+    Pairs each bracket of teams on its own, flipping for sides with the
+    matching entry of ``rngs``. The weights are worked out here and the
+    matchings of all the brackets are then computed concurrently.
+
+    Matchings are kept in the shared cache by ``bracket_matching_key``, so
+    re-pairing a round only solves the brackets that changed, e.g. the one a
+    late team was checked in to and those its pull-ups moved.
+    """
     weights = get_weights()
-    for i, team1 in enumerate(list_of_teams):
-        for j, team2 in enumerate(list_of_teams):
-            if i > j:
-                weight = calc_weight(
-                    team1,
-                    team2,
-                    i,
-                    j,
-                    list_of_teams[len(list_of_teams) - i - 1],
-                    list_of_teams[len(list_of_teams) - j - 1],
-                    len(list_of_teams) - i - 1,
-                    len(list_of_teams) - j - 1,
-                    weights,
-                    TabSettings.get("cur_round", 1),
-                    TabSettings.get("tot_rounds", 5),
-                )
-                graph_edges += [(i, j, weight)]
-    pairings_num = mwmatching.maxWeightMatching(graph_edges, maxcardinality=True)
+    current_round = TabSettings.get("cur_round", 1)
+    tot_rounds = TabSettings.get("tot_rounds", 5)
+    backend = matching.get_backend().name
+    cache = caches[cache_logic.SHARED]
+
+    with profiler.stage("weights"):
+        all_columns = [weight_columns(list_of_teams) for list_of_teams in brackets]
+        keys = [
+            bracket_matching_key(columns, weights, current_round, tot_rounds,
+                                 backend)
+            for columns in all_columns
+        ]
+        found = cache.get_many(set(keys))
+        to_solve = [i for i, key in enumerate(keys) if key not in found]
+        edge_lists = [
+            weight_edges_from_columns(all_columns[i], weights, current_round,
+                                      tot_rounds)
+            for i in to_solve
+        ]
+    if found:
+        print(f"Reusing the matchings of {len(brackets) - len(to_solve)} "
+              f"of {len(brackets)} brackets")
+
+    solved = matching.max_weight_matchings(edge_lists, maxcardinality=True)
+    cache.set_many({keys[i]: mates for i, mates in zip(to_solve, solved)},
+                   BRACKET_MATCHING_TIMEOUT)
+    found.update((keys[i], mates) for i, mates in zip(to_solve, solved))
+    all_mates = [found[key] for key in keys]
+    return [
+        determine_gov_opp(matched_pairs(list_of_teams, pairings_num), rng)
+        for list_of_teams, pairings_num, rng in zip(brackets, all_mates, rngs)
+    ]
+
+
+def bracket_matching_key(columns, weights, current_round, tot_rounds, backend):
+    """
+    Cache key for the matching of a bracket. It covers every input of the
+    weights, so a bracket that gets the same key on a re-pair has the same
+    graph and its matching can be reused instead of solved again.
+    """
+    hit = tuple(tuple(sorted(opponents)) for opponents in columns[-1])
+    inputs = (columns[:-1], hit, sorted(weights.items()), current_round,
+              tot_rounds, backend)
+    return "pairing:bracket:" + sha1(repr(inputs).encode("utf-8")).hexdigest()
+
+
+def matched_pairs(list_of_teams, pairings_num):
+    """Turns the mates returned by the matching engine into pairs of teams"""
     all_pairs = []
     for pair in pairings_num:
         if pair < len(list_of_teams):
@@ -514,7 +579,7 @@ def perfect_pairing(list_of_teams):
 
             if pairing not in all_pairs:
                 all_pairs.append(pairing)
-    return determine_gov_opp(all_pairs)
+    return all_pairs
 
 
 def get_weights():
@@ -533,6 +598,87 @@ def get_weights():
     }
 
 
+def calc_weight_edges(list_of_teams, weights, current_round, tot_rounds):
+    """
+    Build the (i, j, weight) edge list for every i > j pair of teams in one pass.
+
+    Gives the same weights as calling calc_weight on every pair, but reads
+    each team's record once into flat per-team columns instead of walking the
+    related rounds of both teams for every pair.
+    """
+    return weight_edges_from_columns(
+        weight_columns(list_of_teams), weights, current_round, tot_rounds
+    )
+
+
+def weight_columns(list_of_teams):
+    """
+    Everything about a bracket that its pairing weights depend on, as a tuple
+    of per-team columns in bracket order
+    """
+    index_of = {team.id: i for i, team in enumerate(list_of_teams)}
+    hit = []
+    for team in list_of_teams:
+        opponent_ids = [r.opp_team_id for r in team.gov_team.all()] + \
+            [r.gov_team_id for r in team.opp_team.all()]
+        hit.append(frozenset(index_of[t] for t in opponent_ids if t in index_of))
+    return (
+        tuple(team.id for team in list_of_teams),
+        tuple(team.seed for team in list_of_teams),
+        tuple(team.school_id for team in list_of_teams),
+        tuple(num_opps(team) for team in list_of_teams),
+        tuple(num_govs(team) for team in list_of_teams),
+        tuple(hit_pull_up(team) for team in list_of_teams),
+        tuple(tot_wins(team) for team in list_of_teams),
+        tuple(hit),
+    )
+
+
+def weight_edges_from_columns(columns, weights, current_round, tot_rounds):
+    _, seeds, schools, opps, govs, pulled_up, wins, hit = columns
+    n = len(seeds)
+    half = int(tot_rounds // 2) + 1
+    high_opp = [count >= half for count in opps]
+    high_high_opp = [count >= half + 1 for count in opps]
+    high_gov = [count >= half for count in govs]
+
+    power_pairing_multiple = weights["power_pairing_multiple"]
+    graph_edges = []
+    for i in range(n):
+        opt_i = n - i - 1
+        for j in range(i):
+            opt_j = n - j - 1
+            if current_round == 1:
+                weight = (
+                    power_pairing_multiple
+                    * (abs(seeds[opt_i] - seeds[j]) + abs(seeds[opt_j] - seeds[i]))
+                    / 2.0
+                )
+            else:
+                weight = (
+                    power_pairing_multiple
+                    * (abs(opt_i - j) + abs(opt_j - i))
+                    / 2.0
+                )
+            # Penalties are added in the same order as calc_weight so the
+            # floating point totals match exactly
+            if high_opp[i] and high_opp[j]:
+                weight += weights["high_opp_penalty"]
+            if high_high_opp[i] and high_high_opp[j]:
+                weight += weights["high_high_opp_penalty"]
+            if high_gov[i] and high_gov[j]:
+                weight += weights["high_gov_penalty"]
+            if schools[i] == schools[j]:
+                weight += weights["same_school_penalty"]
+            if (pulled_up[i] and wins[j] < wins[i]) or \
+                    (pulled_up[j] and wins[i] < wins[j]):
+                weight += weights["hit_pull_up_before"]
+            if j in hit[i]:
+                weight += weights["hit_team_before"]
+            graph_edges.append((i, j, weight))
+    return graph_edges
+
+
 def calc_weight(
         team_a,
         team_b,
@@ -596,7 +742,7 @@ def calc_weight(
     return weight
 
 
-def determine_gov_opp(all_pairs):
+def determine_gov_opp(all_pairs, rng=random):
     final_pairings = []
     for team1, team2 in all_pairs:
         if num_govs(team1) < num_govs(team2):
@@ -611,7 +757,7 @@ def determine_gov_opp(all_pairs):
         elif num_opps(team2) < num_opps(team1):
             # team1 should be gov
             final_pairings += [[team1, team2]]
-        elif random.randint(0, 1) == 0:
+        elif rng.randint(0, 1) == 0:
             final_pairings += [[team1, team2]]
         else:
             final_pairings += [[team2, team1]]
@@ -639,3 +785,118 @@ def clear_current_round_pairing():
     TabSettings.set("pairing_released", 0)
 
     return current_round
+
+
+def re_pair_current_round():
+    """
+    Clear the pairing of the current round and pair it again, e.g. after a
+    late check-in. Brackets nothing changed in reuse their previous matching.
+
+    Returns the round number that was re-paired.
+    """
+    round_number = clear_current_round_pairing()
+    TabSettings.set("cur_round", round_number)
+    pair_round()
+    TabSettings.set("cur_round", round_number + 1)
+    return round_number
+
+
+PairingDiff = namedtuple(
+    "PairingDiff",
+    ["added", "removed", "unchanged", "byes_added", "byes_removed"],
+)
+
+
+def _pairing_state(round_number):
+    rounds = Round.objects.filter(round_number=round_number) \
+        .select_related("gov_team", "opp_team")
+    byes = Bye.objects.filter(round_number=round_number).select_related("bye_team")
+    return (
+        {(r.gov_team_id, r.opp_team_id): (r.gov_team, r.opp_team) for r in rounds},
+        {bye.bye_team_id: bye.bye_team for bye in byes},
+    )
+
+
+def preview_re_pair():
+    """
+    Work out what re-pairing the current round would change, without changing
+    it. The round is re-paired in a transaction that is then rolled back,
+    which also leaves the bracket matchings cached for the real re-pair.
+
+    Returns a PairingDiff of (gov, opp) pairs and bye teams. A team switching
+    sides shows up as one pair removed and one added.
+    """
+    round_number = TabSettings.get("cur_round") - 1
+    pairs_before, byes_before = _pairing_state(round_number)
+    try:
+        with profiler.unrecorded(), transaction.atomic():
+            re_pair_current_round()
+            pairs_after, byes_after = _pairing_state(round_number)
+            transaction.set_rollback(True)
+    finally:
+        # This process may still hold the rolled back settings
+        cache_logic.clear_cache()
+
+    def by_name(pairs):
+        return sorted(pairs, key=lambda pair: (pair[0].name, pair[1].name))
+
+    return PairingDiff(
+        added=by_name(pair for key, pair in pairs_after.items()
+                      if key not in pairs_before),
+        removed=by_name(pair for key, pair in pairs_before.items()
+                        if key not in pairs_after),
+        unchanged=len(pairs_before.keys() & pairs_after.keys()),
+        byes_added=sorted((team for pk, team in byes_after.items()
+                           if pk not in byes_before), key=lambda t: t.name),
+        byes_removed=sorted((team for pk, team in byes_before.items()
+                             if pk not in byes_after), key=lambda t: t.name),
+    )
+
+
+RE_PAIR_PREVIEW_TIMEOUT = 60 * 60
+
+
+def _re_pair_preview_key(round_number):
+    return f"pairing:re_pair_preview:{round_number}"
+
+
+def store_re_pair_preview(diff):
+    """
+    Keep a preview of the re-pair of the current round for the confirmation
+    page, as team ids so that any worker can show it
+    """
+    round_number = TabSettings.get("cur_round") - 1
+    caches[cache_logic.SHARED].set(_re_pair_preview_key(round_number), {
+        "computed_at": datetime.now(),
+        "added": [(gov.id, opp.id) for gov, opp in diff.added],
+        "removed": [(gov.id, opp.id) for gov, opp in diff.removed],
+        "unchanged": diff.unchanged,
+        "byes_added": [team.id for team in diff.byes_added],
+        "byes_removed": [team.id for team in diff.byes_removed],
+    }, RE_PAIR_PREVIEW_TIMEOUT)
+
+
+def clear_re_pair_preview(round_number):
+    caches[cache_logic.SHARED].delete(_re_pair_preview_key(round_number))
+
+
+def stored_re_pair_preview(round_number):
+    """
+    Returns (PairingDiff, when it was computed) for the last stored preview
+    of re-pairing ``round_number``, or (None, None) if there isn't one
+    """
+    stored = caches[cache_logic.SHARED].get(_re_pair_preview_key(round_number))
+    if stored is None:
+        return None, None
+    team_ids = {team_id for pair in stored["added"] + stored["removed"]
+                for team_id in pair}
+    team_ids.update(stored["byes_added"] + stored["byes_removed"])
+    teams = Team.objects.in_bulk(team_ids)
+    diff = PairingDiff(
+        added=[(teams[gov], teams[opp]) for gov, opp in stored["added"]],
+        removed=[(teams[gov], teams[opp]) for gov, opp in stored["removed"]],
+        unchanged=stored["unchanged"],
+        byes_added=[teams[team_id] for team_id in stored["byes_added"]],
+        byes_removed=[teams[team_id] for team_id in stored["byes_removed"]],
+    )
+    return diff, stored["computed_at"]
@@ -0,0 +1,174 @@
+"""
+Flat loader for the pairing page.
+
+``sorted_pairings`` returns full Round instances so that judge and room
+assignment can modify and save them. The pairing page only reads them, so
+``load_round_pairings`` fetches the pairings, teams, judges, rooms and room
+tags of a round with a few ``values_list`` queries and assembles lightweight
+records from them. Team records carry their wins and speaks from the stored
+standings, which is all the page needs to sort the pairings.
+"""
+from collections import defaultdict
+
+from mittab.apps.tab.models import Judge, Room, RoomTag, Round, Team
+from mittab.libs.tab_logic.standings import Standings
+
+
+class TeamRecord:
+    __slots__ = ("id", "name", "seed", "wins", "speaks", "required_tag_ids")
+
+    def __init__(self, team_id, name, seed, wins, speaks):
+        self.id = team_id
+        self.name = name
+        self.seed = seed
+        self.wins = wins
+        self.speaks = speaks
+        self.required_tag_ids = set()
+
+    @property
+    def display_backend(self):
+        return self.name
+
+    def __str__(self):
+        return self.name
+
+
+class JudgeRecord:
+    __slots__ = ("id", "name", "rank", "wing_only", "required_tag_ids")
+
+    def __init__(self, judge_id, name, rank, wing_only):
+        self.id = judge_id
+        self.name = name
+        self.rank = rank
+        self.wing_only = wing_only
+        self.required_tag_ids = set()
+
+    def __str__(self):
+        return self.name
+
+
+class RoomRecord:
+    __slots__ = ("id", "name", "tag_ids")
+
+    def __init__(self, room_id, name):
+        self.id = room_id
+        self.name = name
+        self.tag_ids = set()
+
+    def __str__(self):
+        return self.name
+
+
+class PairingRecord:
+    __slots__ = ("id", "gov_team", "opp_team", "chair_id", "room", "victor",
+                 "judges")
+
+    def __init__(self, round_id, gov_team, opp_team, chair_id, room, victor):
+        self.id = round_id
+        self.gov_team = gov_team
+        self.opp_team = opp_team
+        self.chair_id = chair_id
+        self.room = room
+        self.victor = victor
+        self.judges = []
+
+    def required_tag_ids(self):
+        tag_ids = self.gov_team.required_tag_ids | self.opp_team.required_tag_ids
+        for judge in self.judges:
+            tag_ids |= judge.required_tag_ids
+        return tag_ids
+
+
+def pairing_sort_key(gov, opp, round_number):
+    """
+    Same ordering as ``tab_logic.team_comp``, for anything with ``seed``,
+    ``wins`` and ``speaks``
+    """
+    if round_number == 1:
+        return (max(gov.seed, opp.seed), min(gov.seed, opp.seed))
+    return (
+        max(gov.wins, opp.wins),
+        max(gov.speaks, opp.speaks),
+        min(gov.speaks, opp.speaks),
+    )
+
+
+def load_round_pairings(round_number, standings=None):
+    """
+    Returns ``(pairings, tag_names)`` for an inround, with the pairings in the
+    same order as ``sorted_pairings`` and ``tag_names`` mapping room tag ids
+    to their names
+    """
+    if standings is None:
+        standings = Standings.load()
+
+    round_rows = list(
+        Round.objects.filter(round_number=round_number).values_list(
+            "id", "gov_team_id", "opp_team_id", "chair_id", "room_id", "victor"
+        )
+    )
+    round_ids = [row[0] for row in round_rows]
+    team_ids = {row[1] for row in round_rows} | {row[2] for row in round_rows}
+    room_ids = {row[4] for row in round_rows if row[4] is not None}
+
+    teams = {}
+    for team_id, name, seed in Team.objects.filter(id__in=team_ids) \
+            .values_list("id", "name", "seed"):
+        stats = standings.team_stats(team_id)
+        teams[team_id] = TeamRecord(team_id, name, seed, stats.wins, stats.speaks)
+    for team_id, tag_id in Team.required_room_tags.through.objects.filter(
+            team_id__in=team_ids).values_list("team_id", "roomtag_id"):
+        teams[team_id].required_tag_ids.add(tag_id)
+
+    rooms = {
+        room_id: RoomRecord(room_id, name)
+        for room_id, name in Room.objects.filter(id__in=room_ids)
+        .values_list("id", "name")
+    }
+    for room_id, tag_id in Room.tags.through.objects.filter(
+            room_id__in=room_ids).values_list("room_id", "roomtag_id"):
+        rooms[room_id].tag_ids.add(tag_id)
+
+    pairings = {
+        round_id: PairingRecord(round_id, teams[gov_id], teams[opp_id], chair_id,
+                                rooms.get(room_id), victor)
+        for round_id, gov_id, opp_id, chair_id, room_id, victor in round_rows
+    }
+
+    judges = {}
+    judge_rows = Round.judges.through.objects.filter(round_id__in=round_ids) \
+        .order_by(*("judge__" + field for field in Judge._meta.ordering)) \
+        .values_list("round_id", "judge_id", "judge__name", "judge__rank",
+                     "judge__wing_only")
+    for round_id, judge_id, name, rank, wing_only in judge_rows:
+        if judge_id not in judges:
+            judges[judge_id] = JudgeRecord(judge_id, name, rank, wing_only)
+        pairings[round_id].judges.append(judges[judge_id])
+    for judge_id, tag_id in Judge.required_room_tags.through.objects.filter(
+            judge_id__in=judges).values_list("judge_id", "roomtag_id"):
+        judges[judge_id].required_tag_ids.add(tag_id)
+
+    tag_names = dict(RoomTag.objects.values_list("id", "tag"))
+
+    ordered = sorted(
+        pairings.values(),
+        key=lambda p: pairing_sort_key(p.gov_team, p.opp_team, round_number),
+        reverse=True,
+    )
+    return ordered, tag_names
+
+
+def judge_team_counts(judge_ids, team_ids):
+    """
+    Flat equivalent of ``assign_judges.judge_team_rejudge_counts``: how many
+    rounds each judge has judged each team in
+    """
+    counts = defaultdict(lambda: defaultdict(int))
+    rows = Round.judges.through.objects.filter(judge_id__in=judge_ids) \
+        .values_list("judge_id", "round__gov_team_id", "round__opp_team_id")
+    for judge_id, gov_team_id, opp_team_id in rows:
+        if gov_team_id in team_ids:
+            counts[judge_id][gov_team_id] += 1
+        if opp_team_id in team_ids:
+            counts[judge_id][opp_team_id] += 1
+    return counts
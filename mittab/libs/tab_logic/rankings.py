@@ -7,48 +7,37 @@ from mittab.apps.tab.models import (
     TabSettings,
     Team,
 )
+from mittab.libs import profiler
 from mittab.libs.tab_logic.stats import *
+from mittab.libs.tab_logic.standings import Standings
 
 
-def rank_speakers():
-    debaters = Debater.objects.prefetch_related(
-        "team_set",
-        "team_set__byes",
-        "team_set__no_shows",
-        "roundstats_set",
-        "roundstats_set__round",
-    ).all()
+@profiler.profile_operation("rank_speakers")
+def rank_speakers(snapshot=None):
+    profiler.checkpoint("standings")
+    if snapshot is None:
+        snapshot = Standings.load()
+    profiler.checkpoint("sorting")
+    # Stats come from the standings, use debater_team for a debater's team
+    debaters = Debater.objects.all()
     stat_priority = speaker_stat_priority()
     return sorted([
-        DebaterScore(d, stat_priority=stat_priority)
+        DebaterScore(d, stat_priority=stat_priority, snapshot=snapshot)
         for d in debaters
     ])
 
 
-def rank_teams(exclude_round=None, up_to_round=None):
-    all_teams = Team.objects.all().prefetch_related(
-        "gov_team",  # poorly named relation, gets rounds as gov team
-        "opp_team",  # poorly named relation, rounds as opp team
-        "gov_team_outround",  # outround data for gov team
-        "opp_team_outround",  # outround data for opp team
-        # for all gov rounds, load the opp team's gov+opp rounds (opp-strength)
-        "gov_team__opp_team__gov_team",
-        "gov_team__opp_team__opp_team",
-        "gov_team__opp_team__byes",
-        # for all opp rounds, load the gov team's gov+opp rounds (opp-strength)
-        "opp_team__gov_team__gov_team",
-        "opp_team__gov_team__opp_team",
-        "opp_team__gov_team__byes",
-        "byes",
-        "no_shows",
-        "debaters",
-        "debaters__roundstats_set",
-        "debaters__roundstats_set__round",
-        "debaters__team_set",
-        "debaters__team_set__no_shows",
-        "debaters__team_set__byes",
+@profiler.profile_operation("rank_teams")
+def rank_teams(exclude_round=None, up_to_round=None, snapshot=None):
+    profiler.checkpoint("standings")
+    if snapshot is None:
+        snapshot = Standings.load()
+    profiler.checkpoint("sorting")
+    all_teams = Team.objects.all().prefetch_related("debaters")
+    return sorted(
+        TeamScore(d, exclude_round, up_to_round, snapshot=snapshot)
+        for d in all_teams
     )
-    return sorted(TeamScore(d, exclude_round, up_to_round) for d in all_teams)
 
 
 class Stat:
@@ -121,11 +110,23 @@ class Score(ABC):
 class DebaterScore(Score):
     stat_priority = speaker_stat_priority(False)
 
-    def __init__(self, debater, stat_priority=None):
+    def __init__(self, debater, stat_priority=None, snapshot=None):
         super(DebaterScore, self).__init__()
         if stat_priority is not None:
             self.stat_priority = stat_priority
         self.debater = debater
+        self.stats[COIN_FLIP] = debater.tiebreaker
+        if snapshot is not None:
+            debater_stats = snapshot.debater_stats(debater.id)
+            self.stats[SPEAKS] = debater_stats.speaks
+            self.stats[RANKS] = debater_stats.ranks
+            self.stats[SINGLE_ADJUSTED_SPEAKS] = \
+                debater_stats.single_adjusted_speaks
+            self.stats[SINGLE_ADJUSTED_RANKS] = debater_stats.single_adjusted_ranks
+            self.stats[DOUBLE_ADJUSTED_SPEAKS] = \
+                debater_stats.double_adjusted_speaks
+            self.stats[DOUBLE_ADJUSTED_RANKS] = debater_stats.double_adjusted_ranks
+            return
         self.stats[SPEAKS] = tot_speaks_deb(debater)
         self.stats[RANKS] = tot_ranks_deb(debater)
         self.stats[SINGLE_ADJUSTED_SPEAKS] = single_adjusted_speaks_deb(
@@ -134,7 +135,6 @@ class DebaterScore(Score):
         self.stats[DOUBLE_ADJUSTED_SPEAKS] = double_adjusted_speaks_deb(
             debater)
         self.stats[DOUBLE_ADJUSTED_RANKS] = double_adjusted_ranks_deb(debater)
-        self.stats[COIN_FLIP] = debater.tiebreaker
 
 
 @total_ordering
@@ -143,9 +143,21 @@ class TeamScore(Score):
                      SINGLE_ADJUSTED_RANKS, DOUBLE_ADJUSTED_SPEAKS,
                      DOUBLE_ADJUSTED_RANKS, OPP_STRENGTH, COIN_FLIP)
 
-    def __init__(self, team, exclude_round=None, up_to_round=None):
+    def __init__(self, team, exclude_round=None, up_to_round=None, snapshot=None):
         super(TeamScore, self).__init__()
         self.team = team
+        self.stats[COIN_FLIP] = team.tiebreaker
+        if snapshot is not None:
+            team_stats = snapshot.team_stats(team.id, exclude_round, up_to_round)
+            self.stats[WINS] = team_stats.wins
+            self.stats[SPEAKS] = team_stats.speaks
+            self.stats[RANKS] = team_stats.ranks
+            self.stats[SINGLE_ADJUSTED_SPEAKS] = team_stats.single_adjusted_speaks
+            self.stats[SINGLE_ADJUSTED_RANKS] = team_stats.single_adjusted_ranks
+            self.stats[DOUBLE_ADJUSTED_SPEAKS] = team_stats.double_adjusted_speaks
+            self.stats[DOUBLE_ADJUSTED_RANKS] = team_stats.double_adjusted_ranks
+            self.stats[OPP_STRENGTH] = team_stats.opp_strength
+            return
         self.stats[WINS] = tot_wins(team, exclude_round, up_to_round)
         self.stats[SPEAKS] = tot_speaks(team, exclude_round, up_to_round)
         self.stats[RANKS] = tot_ranks(team, exclude_round, up_to_round)
@@ -164,7 +176,6 @@ class TeamScore(Score):
         self.stats[OPP_STRENGTH] = opp_strength(
             team, exclude_round, up_to_round
         )
-        self.stats[COIN_FLIP] = team.tiebreaker
 
 def get_team_rankings(request, public=False, up_to_round=None):
     exclude_round = None
@@ -0,0 +1,381 @@
+"""
+Columnar, in-memory view of every result in the tournament.
+
+The functions in ``stats.py`` work on model instances and walk their related
+managers, which means callers have to prefetch a large tree of relations
+before they can rank anything. ``TournamentSnapshot`` instead loads the raw
+Round, RoundStats, Bye, NoShow and team membership rows with a handful of
+``values_list`` queries and computes every team and debater stat from those
+flat rows. The results are identical to the per-object functions in
+``stats.py``, including their handling of forfeits, byes, iron men and
+lenient late rounds.
+"""
+from collections import defaultdict, namedtuple
+
+from mittab.apps.tab.models import Bye, NoShow, Round, RoundStats, TabSettings, Team
+from mittab.libs.tab_logic.stats import MAXIMUM_DEBATER_RANKS, MINIMUM_DEBATER_SPEAKS
+
+RoundRow = namedtuple(
+    "RoundRow",
+    ["id", "round_number", "gov_team_id", "opp_team_id", "victor", "pullup"],
+)
+RoundStatRow = namedtuple("RoundStatRow", ["round_id", "speaks", "ranks"])
+
+TeamStats = namedtuple("TeamStats", [
+    "wins",
+    "speaks",
+    "ranks",
+    "single_adjusted_speaks",
+    "single_adjusted_ranks",
+    "double_adjusted_speaks",
+    "double_adjusted_ranks",
+    "opp_strength",
+])
+# Every speaks and ranks list of a debater under one round filter. The
+# ``all_`` lists count each iron man speech on its own, the others average them
+DebaterVectors = namedtuple("DebaterVectors", [
+    "speaks",
+    "all_speaks",
+    "ranks",
+    "all_ranks",
+])
+DebaterStats = namedtuple("DebaterStats", [
+    "speaks",
+    "ranks",
+    "single_adjusted_speaks",
+    "single_adjusted_ranks",
+    "double_adjusted_speaks",
+    "double_adjusted_ranks",
+])
+
+
+def _in_range(round_number, exclude_round, up_to_round):
+    if exclude_round is not None and round_number == exclude_round:
+        return False
+    if up_to_round is not None and round_number > up_to_round:
+        return False
+    return True
+
+
+class TournamentSnapshot:
+    """
+    Every result needed for tabbing, keyed by team and debater id
+
+    Build one with ``TournamentSnapshot.load()`` at the start of an operation
+    and throw it away afterwards; it does not observe later writes.
+    """
+
+    def __init__(self, cur_round, lenient_late, rounds, round_stats, byes,
+                 no_shows, team_debaters):
+        self.cur_round = cur_round
+        self.lenient_late = lenient_late
+
+        self.rounds = {}
+        self.gov_rounds = defaultdict(list)
+        self.opp_rounds = defaultdict(list)
+        for row in rounds:
+            round_row = RoundRow(*row)
+            self.rounds[round_row.id] = round_row
+            self.gov_rounds[round_row.gov_team_id].append(round_row)
+            self.opp_rounds[round_row.opp_team_id].append(round_row)
+
+        # debater_id -> round_number -> [RoundStatRow], in primary key order
+        self.debater_round_stats = defaultdict(lambda: defaultdict(list))
+        for debater_id, round_id, speaks, ranks in round_stats:
+            round_number = self.rounds[round_id].round_number
+            self.debater_round_stats[debater_id][round_number].append(
+                RoundStatRow(round_id, speaks, ranks)
+            )
+
+        self.bye_rounds = defaultdict(list)
+        for team_id, round_number in byes:
+            self.bye_rounds[team_id].append(round_number)
+
+        self.no_show_rounds = defaultdict(set)
+        for team_id, round_number in no_shows:
+            self.no_show_rounds[team_id].add(round_number)
+
+        # Mirrors Debater.team(), which returns the team with the lowest pk
+        self.team_debaters = defaultdict(list)
+        self.debater_team = {}
+        for team_id, debater_id in team_debaters:
+            self.team_debaters[team_id].append(debater_id)
+            current = self.debater_team.get(debater_id)
+            if current is None or team_id < current:
+                self.debater_team[debater_id] = team_id
+
+        self._wins = {}
+        self._vectors = {}
+        self._averages = {}
+
+    @classmethod
+    def load(cls):
+        return cls(
+            cur_round=TabSettings.get("cur_round"),
+            lenient_late=TabSettings.get("lenient_late", 0),
+            rounds=Round.objects.values_list(
+                "id", "round_number", "gov_team_id", "opp_team_id", "victor",
+                "pullup",
+            ),
+            round_stats=RoundStats.objects.order_by("pk").values_list(
+                "debater_id", "round_id", "speaks", "ranks"
+            ),
+            byes=Bye.objects.values_list("bye_team_id", "round_number"),
+            no_shows=NoShow.objects.values_list("no_show_team_id", "round_number"),
+            # Debater has a default ordering of name, which team.debaters.all()
+            # respects. Keep it so sums are accumulated in the same order.
+            team_debaters=Team.debaters.through.objects.order_by(
+                "debater__name"
+            ).values_list("team_id", "debater_id"),
+        )
+
+    ##############
+    # Team wins: #
+    ##############
+
+    def wins(self, exclude_round=None, up_to_round=None):
+        """Returns a dict of team id -> total wins, computed for every team"""
+        key = (exclude_round, up_to_round)
+        if key not in self._wins:
+            wins = defaultdict(int)
+            for round_row in self.rounds.values():
+                if not _in_range(round_row.round_number, exclude_round, up_to_round):
+                    continue
+                victor = round_row.victor
+                if victor in (Round.GOV, Round.GOV_VIA_FORFEIT, Round.ALL_WIN):
+                    wins[round_row.gov_team_id] += 1
+                if victor in (Round.OPP, Round.OPP_VIA_FORFEIT, Round.ALL_WIN):
+                    wins[round_row.opp_team_id] += 1
+            for team_id, bye_rounds in self.bye_rounds.items():
+                wins[team_id] += sum(
+                    1 for round_number in bye_rounds
+                    if _in_range(round_number, exclude_round, up_to_round)
+                )
+            self._wins[key] = wins
+        return self._wins[key]
+
+    def tot_wins(self, team_id, exclude_round=None, up_to_round=None):
+        return self.wins(exclude_round, up_to_round)[team_id]
+
+    def opp_strength(self, team_id, exclude_round=None, up_to_round=None):
+        wins = self.wins(exclude_round, up_to_round)
+        opponent_wins = [
+            wins[round_row.opp_team_id]
+            for round_row in self.gov_rounds[team_id]
+            if _in_range(round_row.round_number, exclude_round, up_to_round)
+        ] + [
+            wins[round_row.gov_team_id]
+            for round_row in self.opp_rounds[team_id]
+            if _in_range(round_row.round_number, exclude_round, up_to_round)
+        ]
+        if opponent_wins:
+            return float(sum(opponent_wins)) / float(len(opponent_wins))
+        return 0.0
+
+    ##########################
+    # Debater speaks & ranks #
+    ##########################
+
+    def _won_by_forfeit(self, round_row, team_id):
+        if team_id is None or team_id not in (round_row.gov_team_id,
+                                              round_row.opp_team_id):
+            return False
+        if round_row.victor == Round.ALL_WIN:
+            return True
+        if round_row.victor == Round.GOV_VIA_FORFEIT:
+            return round_row.gov_team_id == team_id
+        if round_row.victor == Round.OPP_VIA_FORFEIT:
+            return round_row.opp_team_id == team_id
+        return False
+
+    def _forfeited_round(self, round_row, team_id):
+        if team_id is None or team_id not in (round_row.gov_team_id,
+                                              round_row.opp_team_id):
+            return False
+        if round_row.victor == Round.GOV_VIA_FORFEIT:
+            return round_row.opp_team_id == team_id
+        if round_row.victor == Round.OPP_VIA_FORFEIT:
+            return round_row.gov_team_id == team_id
+        return False
+
+    def _debater_averages(self, debater_id):
+        """
+        (average speaks, average ranks) of a debater, the equivalents of
+        avg_deb_speaks and avg_deb_ranks computed together
+        """
+        if debater_id in self._averages:
+            return self._averages[debater_id]
+
+        team_id = self.debater_team.get(debater_id)
+        stats_per_round = self.debater_round_stats.get(debater_id, {})
+        real_speaks, real_ranks = [], []
+        for round_number in range(1, self.cur_round):
+            round_stats = stats_per_round.get(round_number)
+            if not round_stats:
+                continue
+            round_row = self.rounds[round_stats[0].round_id]
+            if (self._won_by_forfeit(round_row, team_id)
+                    or self._forfeited_round(round_row, team_id)):
+                continue
+            real_speaks.append(sum(float(rs.speaks) for rs in round_stats)
+                               / float(len(round_stats)))
+            real_ranks.append(sum(float(rs.ranks) for rs in round_stats)
+                              / float(len(round_stats)))
+
+        averages = tuple(
+            float(sum(values)) / float(len(values)) if values else 0
+            for values in (real_speaks, real_ranks)
+        )
+        self._averages[debater_id] = averages
+        return averages
+
+    def avg_deb_speaks(self, debater_id):
+        return self._debater_averages(debater_id)[0]
+
+    def avg_deb_ranks(self, debater_id):
+        return self._debater_averages(debater_id)[1]
+
+    def _abnormal_round(self, team_id, round_number):
+        """
+        Classify a round the debater has no RoundStats for. Returns "average"
+        for byes and lenient late rounds, "penalty" for other no-shows, and
+        None when the round should not count at all
+        """
+        if round_number in self.bye_rounds.get(team_id, ()):
+            return "average"
+        if round_number in self.no_show_rounds.get(team_id, ()):
+            if self.lenient_late >= round_number:
+                return "average"
+            return "penalty"
+        return None
+
+    def debater_vectors(self, debater_id, exclude_round=None, up_to_round=None):
+        """
+        Every speaks and ranks list of a debater as ``DebaterVectors``, built in
+        one pass over their rounds. The lists are those of
+        stats.speaks_for_debater and stats.ranks_for_debater, with and
+        without averaging iron men.
+        """
+        key = (debater_id, exclude_round, up_to_round)
+        if key in self._vectors:
+            return self._vectors[key]
+
+        team_id = self.debater_team.get(debater_id)
+        stats_per_round = self.debater_round_stats.get(debater_id, {})
+        if up_to_round is not None:
+            num_rounds = up_to_round
+        else:
+            num_rounds = self.cur_round - 1
+        avg_speaks, avg_ranks = self._debater_averages(debater_id)
+
+        speaks, all_speaks, ranks, all_ranks = [], [], [], []
+        for round_number in range(1, num_rounds + 1):
+            round_stats = stats_per_round.get(round_number)
+            if round_stats and _in_range(round_number, exclude_round, up_to_round):
+                # If a debater was somehow paired in twice, take the speaks they
+                # actually got. Ranks keep every row, as stats.py does.
+                speak_stats = sorted(round_stats, key=lambda rs: rs.speaks,
+                                     reverse=True)
+                speak_round = self.rounds[speak_stats[0].round_id]
+                if len(set(rs.round_id for rs in speak_stats)) != 1:
+                    speak_stats = speak_stats[:1]
+                round_speaks = [float(rs.speaks) for rs in speak_stats]
+                if self._won_by_forfeit(speak_round, team_id):
+                    speaks.append(avg_speaks)
+                    all_speaks.append(avg_speaks)
+                elif self._forfeited_round(speak_round, team_id):
+                    speaks.append(MINIMUM_DEBATER_SPEAKS)
+                    all_speaks.append(MINIMUM_DEBATER_SPEAKS)
+                else:
+                    speaks.append(sum(round_speaks) / float(len(speak_stats)))
+                    all_speaks.extend(round_speaks)
+
+                round_ranks = [float(rs.ranks) for rs in round_stats]
+                rank_round = self.rounds[round_stats[0].round_id]
+                if self._won_by_forfeit(rank_round, team_id):
+                    ranks.append(avg_ranks)
+                    all_ranks.append(avg_ranks)
+                elif self._forfeited_round(rank_round, team_id):
+                    ranks.append(MAXIMUM_DEBATER_RANKS)
+                    all_ranks.append(MAXIMUM_DEBATER_RANKS)
+                else:
+                    ranks.append(sum(round_ranks) / float(len(round_stats)))
+                    all_ranks.extend(round_ranks)
+                continue
+
+            if team_id is None:
+                # stats.debater_abnormal_round_ranks returns the speaks minimum
+                # for debaters without a team; keep the rankings identical
+                abnormal = (MINIMUM_DEBATER_SPEAKS, MINIMUM_DEBATER_SPEAKS)
+            else:
+                abnormal = {
+                    "average": (avg_speaks, avg_ranks),
+                    "penalty": (MINIMUM_DEBATER_SPEAKS, MAXIMUM_DEBATER_RANKS),
+                }.get(self._abnormal_round(team_id, round_number))
+            if abnormal is not None:
+                speaks.append(abnormal[0])
+                all_speaks.append(abnormal[0])
+                ranks.append(abnormal[1])
+                all_ranks.append(abnormal[1])
+
+        vectors = DebaterVectors(*(list(map(float, values)) for values in
+                                   (speaks, all_speaks, ranks, all_ranks)))
+        self._vectors[key] = vectors
+        return vectors
+
+    def speaks_for_debater(self, debater_id, average_ironmen=True,
+                           exclude_round=None, up_to_round=None):
+        """Equivalent of stats.speaks_for_debater"""
+        vectors = self.debater_vectors(debater_id, exclude_round, up_to_round)
+        return vectors.speaks if average_ironmen else vectors.all_speaks
+
+    def ranks_for_debater(self, debater_id, average_ironmen=True,
+                          exclude_round=None, up_to_round=None):
+        """Equivalent of stats.ranks_for_debater"""
+        vectors = self.debater_vectors(debater_id, exclude_round, up_to_round)
+        return vectors.ranks if average_ironmen else vectors.all_ranks
+
+    #################
+    # Stat bundles: #
+    #################
+
+    def team_stats(self, team_id, exclude_round=None, up_to_round=None):
+        speaks, ranks = [], []
+        tot_speaks, tot_ranks = 0, 0
+        for debater_id in self.team_debaters.get(team_id, ()):
+            debater_speaks = self.speaks_for_debater(
+                debater_id, False, exclude_round, up_to_round
+            )
+            debater_ranks = self.ranks_for_debater(
+                debater_id, False, exclude_round, up_to_round
+            )
+            tot_speaks += sum(debater_speaks)
+            tot_ranks += sum(debater_ranks)
+            speaks.extend(debater_speaks)
+            ranks.extend(debater_ranks)
+        speaks.sort()
+        ranks.sort()
+
+        return TeamStats(
+            wins=self.tot_wins(team_id, exclude_round, up_to_round),
+            speaks=tot_speaks,
+            ranks=tot_ranks,
+            single_adjusted_speaks=sum(speaks[1:-1]),
+            single_adjusted_ranks=sum(ranks[1:-1]),
+            double_adjusted_speaks=sum(speaks[2:-2]),
+            double_adjusted_ranks=sum(ranks[2:-2]),
+            opp_strength=self.opp_strength(team_id, exclude_round, up_to_round),
+        )
+
+    def debater_stats(self, debater_id):
+        vectors = self.debater_vectors(debater_id)
+        speaks, ranks = vectors.speaks, vectors.ranks
+        sorted_speaks, sorted_ranks = sorted(speaks), sorted(ranks)
+        return DebaterStats(
+            speaks=sum(speaks),
+            ranks=sum(ranks),
+            single_adjusted_speaks=sum(sorted_speaks[1:-1]),
+            single_adjusted_ranks=sum(sorted_ranks[1:-1]),
+            double_adjusted_speaks=sum(sorted_speaks[2:-2]),
+            double_adjusted_ranks=sum(sorted_ranks[2:-2]),
+        )
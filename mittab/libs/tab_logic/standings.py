@@ -0,0 +1,242 @@
+"""
+Persistent team and speaker standings.
+
+Ranking every team from scratch means recomputing every stat for every team
+on every page view. Instead the computed stats are stored in ``TeamStanding``
+and ``DebaterStanding`` rows. Writes that change a result (rounds, round
+stats, byes, no-shows and team membership, see ``mittab.apps.tab.signals``)
+only mark the rows they touch as dirty. The next read recomputes the dirty
+teams and debaters, plus the opponents of dirty teams since their opp
+strength depends on the dirty team's wins, and leaves every other row alone.
+
+Rows are stamped with the ``cur_round`` and ``lenient_late`` settings they
+were computed under, because both change which rounds count for everyone.
+When either setting moves every row is recomputed.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from mittab.apps.tab.models import (
+    Debater,
+    DebaterStanding,
+    TabSettings,
+    Team,
+    TeamStanding,
+)
+from mittab.libs.cacheing import cache_logic
+from mittab.libs.tab_logic.snapshot import DebaterStats, TeamStats, TournamentSnapshot
+
+TEAM_STAT_FIELDS = TeamStats._fields
+DEBATER_STAT_FIELDS = DebaterStats._fields
+SCOPES = (TeamStanding.ALL_ROUNDS, TeamStanding.PUBLIC)
+
+
+def scope_exclude_round(scope, cur_round):
+    """The exclude_round argument the stats of a TeamStanding scope use"""
+    if scope == TeamStanding.PUBLIC:
+        return cur_round - 1
+    return None
+
+
+def mark_teams_dirty(team_filter):
+    """
+    Flag the standings of the teams matching ``team_filter`` for recompute,
+    which also makes the rankings cached from the standings stale
+    """
+    TeamStanding.objects.filter(team_filter, dirty=False).update(dirty=True)
+    cache_logic.invalidate_rankings()
+
+
+def mark_debaters_dirty(debater_filter):
+    """Flag the standings of the debaters matching ``debater_filter``"""
+    DebaterStanding.objects.filter(debater_filter, dirty=False).update(dirty=True)
+    cache_logic.invalidate_rankings()
+
+
+def mark_team_ids_dirty(*team_ids):
+    mark_teams_dirty(Q(team_id__in=[t for t in team_ids if t is not None]))
+
+
+def invalidate_result(team_ids, debater_ids):
+    """Mark the standings a changed round result makes stale"""
+    mark_team_ids_dirty(*team_ids)
+    mark_debaters_dirty(Q(debater_id__in=debater_ids))
+
+
+class Standings:
+    """
+    Read-only view of the stored standings with the same ``team_stats`` and
+    ``debater_stats`` interface as ``TournamentSnapshot``, so it can be passed
+    anywhere the rankings accept a snapshot. Round filters that do not match a
+    stored scope fall back to a snapshot loaded on first use.
+    """
+
+    def __init__(self, cur_round, team_stats, debater_stats):
+        self.cur_round = cur_round
+        self._team_stats = team_stats
+        self._debater_stats = debater_stats
+        self._snapshot = None
+
+    @classmethod
+    def load(cls):
+        return refresh_standings()
+
+    @property
+    def snapshot(self):
+        if self._snapshot is None:
+            self._snapshot = TournamentSnapshot.load()
+        return self._snapshot
+
+    def _scope(self, exclude_round, up_to_round):
+        if up_to_round is not None:
+            return None
+        for scope in SCOPES:
+            if exclude_round == scope_exclude_round(scope, self.cur_round):
+                return scope
+        return None
+
+    def team_stats(self, team_id, exclude_round=None, up_to_round=None):
+        scope = self._scope(exclude_round, up_to_round)
+        if scope is None or (team_id, scope) not in self._team_stats:
+            return self.snapshot.team_stats(team_id, exclude_round, up_to_round)
+        return self._team_stats[(team_id, scope)]
+
+    def tot_wins(self, team_id, exclude_round=None, up_to_round=None):
+        return self.team_stats(team_id, exclude_round, up_to_round).wins
+
+    def debater_stats(self, debater_id):
+        if debater_id not in self._debater_stats:
+            return self.snapshot.debater_stats(debater_id)
+        return self._debater_stats[debater_id]
+
+
+def _needs_refresh(row, cur_round, lenient_late):
+    return row is None or row.dirty or row.cur_round != cur_round or \
+        row.lenient_late != lenient_late
+
+
+def _affected_teams(snapshot, dirty_team_ids, dirty_debater_ids):
+    """
+    Expand the dirty sets to everything whose stats can depend on them.
+    Returns (team ids, debater ids) to recompute.
+    """
+    debater_teams = defaultdict(set)
+    for team_id, debater_ids in snapshot.team_debaters.items():
+        for debater_id in debater_ids:
+            debater_teams[debater_id].add(team_id)
+
+    team_ids = set(dirty_team_ids)
+    for debater_id in dirty_debater_ids:
+        team_ids |= debater_teams[debater_id]
+
+    debater_ids = set(dirty_debater_ids)
+    for team_id in team_ids:
+        debater_ids.update(snapshot.team_debaters.get(team_id, ()))
+
+    # A change in a team's wins moves the opp strength of everyone it faced
+    for team_id in list(team_ids):
+        team_ids.update(r.opp_team_id for r in snapshot.gov_rounds.get(team_id, ()))
+        team_ids.update(r.gov_team_id for r in snapshot.opp_rounds.get(team_id, ()))
+    return team_ids, debater_ids
+
+
+def refresh_standings():
+    """
+    Recompute every dirty, missing or stale standing and return a
+    ``Standings`` over the full table. Does no stat computation at all when
+    nothing has changed since the last refresh.
+    """
+    cur_round = TabSettings.get("cur_round")
+    lenient_late = TabSettings.get("lenient_late", 0)
+
+    team_rows = {(row.team_id, row.scope): row
+                 for row in TeamStanding.objects.all()}
+    debater_rows = {row.debater_id: row for row in DebaterStanding.objects.all()}
+    all_team_ids = list(Team.objects.values_list("id", flat=True))
+    all_debater_ids = list(Debater.objects.values_list("id", flat=True))
+
+    dirty_team_ids = {
+        team_id for team_id in all_team_ids for scope in SCOPES
+        if _needs_refresh(team_rows.get((team_id, scope)), cur_round, lenient_late)
+    }
+    dirty_debater_ids = {
+        debater_id for debater_id in all_debater_ids
+        if _needs_refresh(debater_rows.get(debater_id), cur_round, lenient_late)
+    }
+
+    if dirty_team_ids or dirty_debater_ids:
+        with transaction.atomic():
+            # Clear the flags before reading results so that a write landing
+            # while we compute marks its rows dirty again rather than being lost
+            TeamStanding.objects.filter(team_id__in=dirty_team_ids,
+                                        dirty=True).update(dirty=False)
+            DebaterStanding.objects.filter(debater_id__in=dirty_debater_ids,
+                                           dirty=True).update(dirty=False)
+            snapshot = TournamentSnapshot.load()
+            team_ids, debater_ids = _affected_teams(
+                snapshot, dirty_team_ids, dirty_debater_ids
+            )
+            _write_team_standings(snapshot, team_rows,
+                                  team_ids & set(all_team_ids), lenient_late)
+            _write_debater_standings(snapshot, debater_rows,
+                                     debater_ids & set(all_debater_ids),
+                                     lenient_late)
+
+    return Standings(
+        cur_round,
+        {key: TeamStats(*(getattr(row, f) for f in TEAM_STAT_FIELDS))
+         for key, row in team_rows.items()},
+        {key: DebaterStats(*(getattr(row, f) for f in DEBATER_STAT_FIELDS))
+         for key, row in debater_rows.items()},
+    )
+
+
+def _write_team_standings(snapshot, team_rows, team_ids, lenient_late):
+    to_create, to_update = [], []
+    for team_id in team_ids:
+        for scope in SCOPES:
+            stats = snapshot.team_stats(
+                team_id, scope_exclude_round(scope, snapshot.cur_round)
+            )
+            row = team_rows.get((team_id, scope))
+            if row is None:
+                row = TeamStanding(team_id=team_id, scope=scope)
+                team_rows[(team_id, scope)] = row
+                to_create.append(row)
+            else:
+                to_update.append(row)
+            for field, value in zip(TEAM_STAT_FIELDS, stats):
+                setattr(row, field, value)
+            row.cur_round = snapshot.cur_round
+            row.lenient_late = lenient_late
+            row.dirty = False
+
+    TeamStanding.objects.bulk_update(
+        to_update, TEAM_STAT_FIELDS + ("cur_round", "lenient_late")
+    )
+    TeamStanding.objects.bulk_create(to_create, ignore_conflicts=True)
+
+
+def _write_debater_standings(snapshot, debater_rows, debater_ids, lenient_late):
+    to_create, to_update = [], []
+    for debater_id in debater_ids:
+        stats = snapshot.debater_stats(debater_id)
+        row = debater_rows.get(debater_id)
+        if row is None:
+            row = DebaterStanding(debater_id=debater_id)
+            debater_rows[debater_id] = row
+            to_create.append(row)
+        else:
+            to_update.append(row)
+        for field, value in zip(DEBATER_STAT_FIELDS, stats):
+            setattr(row, field, value)
+        row.cur_round = snapshot.cur_round
+        row.lenient_late = lenient_late
+        row.dirty = False
+
+    DebaterStanding.objects.bulk_update(
+        to_update, DEBATER_STAT_FIELDS + ("cur_round", "lenient_late")
+    )
+    DebaterStanding.objects.bulk_create(to_create, ignore_conflicts=True)
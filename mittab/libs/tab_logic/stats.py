@@ -1,8 +1,8 @@
 from collections import defaultdict
 import statistics
 
-from mittab.apps.tab.models import Round, TabSettings, RoundStats, Outround
-from mittab.libs.cacheing.cache_logic import cache
+from mittab.apps.tab.models import Round, TabSettings, RoundStats, Outround, Team
+from mittab.libs.cacheing.cache_logic import current_stat_memo, stat_memo
 
 MAXIMUM_DEBATER_RANKS = 3.5
 MINIMUM_DEBATER_SPEAKS = 0.0
@@ -30,6 +30,34 @@ def _filter_byes(byes, exclude_round=None, up_to_round=None):
 ##############################
 
 
+@stat_memo
+def debater_team_index():
+    """
+    Maps every debater id to their team, with the team's byes and no-shows
+    loaded. Uses the lowest team pk for a debater on several teams, like
+    Debater.team().
+    """
+    team_ids = {}
+    for debater_id, team_id in Team.debaters.through.objects.values_list(
+            "debater_id", "team_id"):
+        if debater_id not in team_ids or team_id < team_ids[debater_id]:
+            team_ids[debater_id] = team_id
+    teams = Team.objects.prefetch_related("byes", "no_shows") \
+        .in_bulk(set(team_ids.values()))
+    return {debater_id: teams[team_id] for debater_id, team_id in team_ids.items()}
+
+
+def debater_team(debater):
+    """
+    Returns the team of ``debater``. Inside a stat_memo_scope every lookup
+    shares one ``debater_team_index``, so the stats of any number of debaters
+    take a fixed number of queries to resolve their teams.
+    """
+    if current_stat_memo() is None:
+        return debater.team()
+    return debater_team_index().get(debater.id)
+
+
 ##############################
 
 
@@ -64,9 +92,9 @@ def won_by_forfeit(round_obj, team):
     elif round_obj.victor == Round.ALL_WIN:
         return True
     elif round_obj.victor == Round.GOV_VIA_FORFEIT:
-        return round_obj.gov_team == team
+        return round_obj.gov_team_id == team.id
     elif round_obj.victor == Round.OPP_VIA_FORFEIT:
-        return round_obj.opp_team == team
+        return round_obj.opp_team_id == team.id
     return False
 
 
@@ -75,9 +103,9 @@ def forfeited_round(round_obj, team):
             (round_obj.opp_team_id != team.id and round_obj.gov_team_id != team.id):
         return False
     elif round_obj.victor == Round.GOV_VIA_FORFEIT:
-        return round_obj.opp_team == team
+        return round_obj.opp_team_id == team.id
     elif round_obj.victor == Round.OPP_VIA_FORFEIT:
-        return round_obj.gov_team == team
+        return round_obj.gov_team_id == team.id
     return False
 
 
@@ -119,7 +147,7 @@ def had_bye(team, round_number=None):
 ##############
 
 
-@cache()
+@stat_memo
 def tot_wins(team, exclude_round=None, up_to_round=None):
     """
     Calculate total wins, using in-memory iteration rather than db queries to avoid n+1
@@ -149,13 +177,13 @@ def tot_wins(team, exclude_round=None, up_to_round=None):
 ################
 
 
-@cache()
+@stat_memo
 def tot_speaks(team, exclude_round=None, up_to_round=None):
     return sum([tot_speaks_deb(deb, False, exclude_round, up_to_round)
                 for deb in team.debaters.all()])
 
 
-@cache()
+@stat_memo
 def single_adjusted_speaks(team, exclude_round=None, up_to_round=None):
     speaks = [speaks_for_debater(deb, False, exclude_round, up_to_round)
               for deb in team.debaters.all()]
@@ -163,7 +191,7 @@ def single_adjusted_speaks(team, exclude_round=None, up_to_round=None):
     return sum(speaks[1:-1])
 
 
-@cache()
+@stat_memo
 def double_adjusted_speaks(team, exclude_round=None, up_to_round=None):
     speaks = [speaks_for_debater(deb, False, exclude_round, up_to_round)
               for deb in team.debaters.all()]
@@ -176,13 +204,13 @@ def double_adjusted_speaks(team, exclude_round=None, up_to_round=None):
 ###############
 
 
-@cache()
+@stat_memo
 def tot_ranks(team, exclude_round=None, up_to_round=None):
     return sum([tot_ranks_deb(deb, False, exclude_round, up_to_round)
                 for deb in team.debaters.all()])
 
 
-@cache()
+@stat_memo
 def single_adjusted_ranks(team, exclude_round=None, up_to_round=None):
     ranks = [ranks_for_debater(deb, False, exclude_round, up_to_round)
              for deb in team.debaters.all()]
@@ -190,7 +218,7 @@ def single_adjusted_ranks(team, exclude_round=None, up_to_round=None):
     return sum(ranks[1:-1])
 
 
-@cache()
+@stat_memo
 def double_adjusted_ranks(team, exclude_round=None, up_to_round=None):
     ranks = [ranks_for_debater(deb, False, exclude_round, up_to_round)
              for deb in team.debaters.all()]
@@ -198,7 +226,7 @@ def double_adjusted_ranks(team, exclude_round=None, up_to_round=None):
     return sum(ranks[2:-2])
 
 
-@cache()
+@stat_memo
 def opp_strength(team, exclude_round=None, up_to_round=None):
     """
     Average number of wins per opponent
@@ -234,7 +262,7 @@ def opp_strength(team, exclude_round=None, up_to_round=None):
 ###################
 
 
-@cache()
+@stat_memo
 def avg_deb_speaks(debater):
     """ Computes the average debater speaks for the supplied debater
 
@@ -248,7 +276,7 @@ def avg_deb_speaks(debater):
     real_speaks = []
     num_speaks = TabSettings.get("cur_round") - 1
     debater_roundstats = debater.roundstats_set.all()
-    team = debater.team()
+    team = debater_team(debater)
 
     speaks_per_round = defaultdict(list)
     # We might have multiple roundstats per round if we have iron men, so first
@@ -282,7 +310,7 @@ def debater_forfeit_speaks(_debater):
     return 0.0
 
 
-@cache()
+@stat_memo
 def speaks_for_debater(
     debater, average_ironmen=True, exclude_round=None, up_to_round=None
 ):
@@ -304,7 +332,7 @@ def speaks_for_debater(
     If a debater wins in a bye, they get their average speaks
     If a debater was late to a lenient round, they get average speaks
     """
-    team = debater.team()
+    team = debater_team(debater)
     # We start counting at 1, so when cur_round says 6 that means that we are
     # in round 5 and should have 5 speaks
 
@@ -369,7 +397,7 @@ def debater_abnormal_round_speaks(debater, round_number):
     Byes:
     Uses average speaks
     """
-    team = debater.team()
+    team = debater_team(debater)
     if team is None:
         return MINIMUM_DEBATER_SPEAKS
 
@@ -387,18 +415,16 @@ def debater_abnormal_round_speaks(debater, round_number):
 
 
 def single_adjusted_speaks_deb(debater):
-    debater_speaks = speaks_for_debater(debater)
-    debater_speaks.sort()
+    debater_speaks = sorted(speaks_for_debater(debater))
     return sum(debater_speaks[1:-1])
 
 
 def double_adjusted_speaks_deb(debater):
-    debater_speaks = speaks_for_debater(debater)
-    debater_speaks.sort()
+    debater_speaks = sorted(speaks_for_debater(debater))
     return sum(debater_speaks[2:-2])
 
 
-@cache()
+@stat_memo
 def tot_speaks_deb(
     debater, average_ironmen=True, exclude_round=None, up_to_round=None
 ):
@@ -414,7 +440,7 @@ def tot_speaks_deb(
 ##################
 
 
-@cache()
+@stat_memo
 def avg_deb_ranks(debater):
     """ Computes the average debater ranks for the supplied debater
 
@@ -428,7 +454,7 @@ def avg_deb_ranks(debater):
     real_ranks = []
     num_ranks = TabSettings.get("cur_round") - 1
     debater_roundstats = debater.roundstats_set.all()
-    team = debater.team()
+    team = debater_team(debater)
 
     ranks_per_round = defaultdict(list)
     # We might have multiple roundstats per round if we have iron men, so first
@@ -453,7 +479,7 @@ def avg_deb_ranks(debater):
         return float(sum(real_ranks)) / float(len(real_ranks))
 
 
-@cache()
+@stat_memo
 def ranks_for_debater(
     debater, average_ironmen=True, exclude_round=None, up_to_round=None
 ):
@@ -475,7 +501,7 @@ def ranks_for_debater(
     If a debater wins in a bye, they get their average ranks
     If a debater was late to a lenient round, they get average ranks
     """
-    team = debater.team()
+    team = debater_team(debater)
     # We start counting at 1, so when cur_round says 6 that means that we are
     # in round 5 and should have 5 ranks
     if up_to_round is not None:
@@ -523,7 +549,7 @@ def ranks_for_debater(
     return debater_ranks
 
 
-@cache()
+@stat_memo
 def debater_abnormal_round_ranks(debater, round_number):
     """
     Calculate the ranks for a bye/forfeit round
@@ -535,7 +561,7 @@ def debater_abnormal_round_ranks(debater, round_number):
     Byes:
     Uses average ranks
     """
-    team = debater.team()
+    team = debater_team(debater)
     had_noshow = None
     if team is None:
         return MINIMUM_DEBATER_SPEAKS
@@ -550,21 +576,19 @@ def debater_abnormal_round_ranks(debater, round_number):
         return MAXIMUM_DEBATER_RANKS
 
 
-@cache()
+@stat_memo
 def single_adjusted_ranks_deb(debater):
-    debater_ranks = ranks_for_debater(debater)
-    debater_ranks.sort()
+    debater_ranks = sorted(ranks_for_debater(debater))
     return sum(debater_ranks[1:-1])
 
 
-@cache()
+@stat_memo
 def double_adjusted_ranks_deb(debater):
-    debater_ranks = ranks_for_debater(debater)
-    debater_ranks.sort()
+    debater_ranks = sorted(ranks_for_debater(debater))
     return sum(debater_ranks[2:-2])
 
 
-@cache()
+@stat_memo
 def tot_ranks_deb(debater, average_ironmen=True, exclude_round=None, up_to_round=None):
     debater_ranks = ranks_for_debater(debater,
                                       average_ironmen=average_ironmen,
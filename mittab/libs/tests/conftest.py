@@ -1,4 +1,5 @@
 import pytest
+from django.core.cache import caches
 
 from mittab.libs.cacheing import cache_logic
 
@@ -7,5 +8,7 @@ from mittab.libs.cacheing import cache_logic
 def clear_django_caches_between_tests():
     """Prevent stale cached stats (TabSettings-dependent) from leaking across tests."""
     cache_logic.clear_cache()
+    caches[cache_logic.SHARED].clear()
     yield
     cache_logic.clear_cache()
+    caches[cache_logic.SHARED].clear()
@@ -0,0 +1,31 @@
+from mittab.libs import assign_judges, profiler
+
+
+def test_prune_keeps_best_edges_per_pairing():
+    edges = [(0, 2, 1), (0, 3, 5), (0, 4, 3), (1, 2, 2), (1, 3, 1)]
+    assert sorted(assign_judges.prune_candidate_edges(edges, 2)) == [
+        (0, 3, 5), (0, 4, 3), (1, 2, 2), (1, 3, 1),
+    ]
+
+
+def test_pruned_matching_is_used_when_it_covers_every_pairing():
+    edges = [(0, 2, 10), (0, 3, 1), (1, 2, 1), (1, 3, 10)]
+    matches = assign_judges.match_judges(edges, 2, candidate_limit=1)
+    assert matches[:2] == [2, 3]
+
+
+def test_falls_back_to_full_graph_when_pruning_strands_a_pairing():
+    # Both pairings prefer judge 2, so a limit of one leaves pairing 1 empty
+    edges = [(0, 2, 10), (0, 3, 1), (1, 2, 9), (1, 3, 1)]
+    matches = assign_judges.match_judges(edges, 2, candidate_limit=1)
+    assert -1 not in matches[:2]
+
+
+def test_pruning_is_noted_on_the_profiled_run():
+    edges = [(0, 2, 10), (0, 3, 1), (1, 2, 9), (1, 3, 1)]
+    profiled = profiler.profile_operation("assign_judges")(assign_judges.match_judges)
+    profiled(edges, 2, candidate_limit=1)
+    assert profiler.recent_runs()["assign_judges"][0]["notes"] == [
+        "Judge matching kept 2 of 4 candidate edges (50%), "
+        "falling back to the full graph"
+    ]
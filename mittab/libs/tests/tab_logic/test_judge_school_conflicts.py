@@ -71,6 +71,48 @@ class TestMinimalSchoolConflictScenarios(TestCase):
             "Judges without matching schools should be eligible",
         )
 
+    def test_conflict_index_matches_judge_conflict(self):
+        school_primary = School.objects.create(name="Primary U")
+        school_other = School.objects.create(name="Other U")
+        hybrid_school = School.objects.create(name="Hybrid U")
+
+        gov_team = self.make_team("Gov Team", school_primary)
+        opp_team = self.make_team("Opp Team", school_other, hybrid_school=hybrid_school)
+        third_team = self.make_team("Third Team", school_other)
+
+        school_judge = self.make_judge("School Judge")
+        school_judge.schools.add(hybrid_school)
+        scratched_judge = self.make_judge("Scratched Judge")
+        Scratch.objects.create(judge=scratched_judge, team=third_team,
+                               scratch_type=Scratch.TEAM_SCRATCH)
+        rejudge = self.make_judge("Rejudge")
+        previous_round = Round.objects.create(round_number=1, gov_team=gov_team,
+                                              opp_team=third_team)
+        previous_round.judges.add(rejudge)
+        neutral_judge = self.make_judge("Neutral Judge")
+
+        judges = list(Judge.objects.prefetch_related("scratches", "schools", "judges"))
+        teams = [gov_team, opp_team, third_team]
+        for team_ids in (None, [gov_team.id, third_team.id]):
+            index = assign_judges.ConflictIndex.load(team_ids=team_ids)
+            for judge in judges:
+                for team1 in teams:
+                    for team2 in teams:
+                        if team_ids and {team1.id, team2.id} - set(team_ids):
+                            continue
+                        for allow_rejudges in (True, False):
+                            self.assertEqual(
+                                judge_conflict(judge, team1, team2, allow_rejudges),
+                                index.judge_conflict(judge.id, team1.id, team2.id,
+                                                     allow_rejudges),
+                                f"{judge} {team1} {team2} {allow_rejudges}",
+                            )
+
+        self.assertEqual(
+            assign_judges.can_judge_teams(judges, gov_team, third_team, False),
+            [neutral_judge, school_judge],
+        )
+
     def test_add_judges_skips_school_conflicts_in_inrounds(self):
         TabSettings.set("cur_round", 2)
         TabSettings.set("pair_wings", 0)
@@ -1,4 +1,5 @@
 from decimal import Decimal
+from unittest import mock
 
 from django.test import TestCase
 from django.db.models import Q
@@ -11,11 +12,13 @@ from mittab.apps.tab.models import (
     Outround,
     Room,
     RoomCheckIn,
+    RoomTag,
     School,
+    Scratch,
     TabSettings,
     Team,
 )
-from mittab.libs import assign_judges, assign_rooms
+from mittab.libs import assign_judges, assign_rooms, matching, profiler
 
 
 @pytest.mark.django_db
@@ -137,6 +140,39 @@ class TestOutroundAssignmentScope(TestCase):
         self.assertEqual(self._assigned_ranks(varsity_rounds), [9, 8, 6, 5, 3, 2])
         self.assertEqual(self._assigned_ranks([novice_round]), [7, 4, 1])
 
+    def test_outround_panels_are_filled_in_one_matching(self):
+        with mock.patch.object(assign_judges.matching, "max_weight_matching",
+                               wraps=matching.max_weight_matching) as solve:
+            objective = assign_judges.add_outround_judges(
+                round_specs=[(Outround.VARSITY, 4)]
+            )
+
+        self.assertEqual(solve.call_count, 1)
+        self.assertEqual(objective, 0)
+        top_round = Outround.objects.get(pk=self.var_round[0].pk)
+        self.assertEqual(top_round.chair.name, "Judge 9")
+        self.assertEqual(self._assigned_ranks([top_round]), [9, 6, 5])
+
+    def test_outround_panel_objective_counts_conflicts(self):
+        top_round = self.var_round[0]
+        for name in ("Judge 9", "Judge 8"):
+            Scratch.objects.create(judge=Judge.objects.get(name=name),
+                                   team=top_round.gov_team,
+                                   scratch_type=Scratch.TAB_SCRATCH)
+
+        objective = assign_judges.add_outround_judges(
+            round_specs=[(Outround.VARSITY, 4)]
+        )
+
+        # The top chair seat gets the third best judge, two places late
+        self.assertEqual(objective, -4)
+        run = profiler.recent_runs()["add_outround_judges"][0]
+        self.assertEqual(run["notes"],
+                         ["Outround panels assigned with a total weight of -4"])
+        top_round.refresh_from_db()
+        self.assertEqual(top_round.chair.name, "Judge 7")
+        self.assertEqual(self._assigned_ranks([top_round]), [7, 6, 5])
+
     def test_assign_outround_rooms_across_scope_has_no_overlap(self):
         assign_rooms.add_outround_rooms(
             round_specs=[(Outround.VARSITY, 4), (Outround.NOVICE, 2)]
@@ -152,6 +188,20 @@ class TestOutroundAssignmentScope(TestCase):
         self.assertNotIn(None, room_ids)
         self.assertEqual(len(room_ids), len(set(room_ids)))
 
+    def test_assign_outround_rooms_meets_required_tags(self):
+        tag = RoomTag.objects.create(tag="Accessible", priority=Decimal(1))
+        accessible = Room.objects.get(name="Room 2")
+        accessible.tags.add(tag)
+        bottom_round = self.var_round[1]
+        bottom_round.opp_team.required_room_tags.add(tag)
+
+        assign_rooms.add_outround_rooms(
+            round_specs=[(Outround.VARSITY, 4), (Outround.NOVICE, 2)]
+        )
+
+        bottom_round.refresh_from_db()
+        self.assertEqual(bottom_round.room_id, accessible.id)
+
     def test_assign_outround_judges_ignores_decided_rounds(self):
         decided_round = self.var_round[0]
         pending_round = self.var_round[1]
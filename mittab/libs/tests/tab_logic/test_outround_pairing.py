@@ -1,6 +1,8 @@
 import random
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 import pytest
 
 from mittab.apps.tab.models import *
@@ -89,3 +91,47 @@ class TestOutroundPairingLogic(TestCase):
             self.enter_results(BreakingTeam.VARSITY)
 
             var_teams_to_break /= 2
+
+    def pairing_queries(self, teams_to_break):
+        TabSettings.set("var_teams_to_break", teams_to_break)
+        outround_tab_logic.perform_the_break()
+        TabSettings.get("cur_round")
+        with CaptureQueriesContext(connection) as queries:
+            outround_tab_logic.pair(BreakingTeam.VARSITY)
+        return len(queries)
+
+    def test_pairing_queries_do_not_grow_with_the_bracket(self):
+        self.generate_checkins()
+        TabSettings.set("sidelock", 1)
+
+        small = self.pairing_queries(8)
+        partial_double_octos = self.pairing_queries(24)
+
+        assert Outround.objects.filter(type_of_round=BreakingTeam.VARSITY,
+                                       num_teams=32).count() == 8
+        self.confirm_pairing(Outround.objects.filter(num_teams=32), 32)
+        assert partial_double_octos == small
+        assert partial_double_octos < 30
+
+    def test_outround_status_matches_outround_losers(self):
+        self.generate_checkins()
+        outround_tab_logic.perform_the_break()
+        outround_tab_logic.pair(BreakingTeam.VARSITY)
+        for outround in Outround.objects.all():
+            outround.victor = random.choice([Outround.GOV, Outround.OPP_VIA_FORFEIT])
+            outround.save()
+
+        TabSettings.get("var_panel_size", 3)
+        TabSettings.get("nov_panel_size", 3)
+        with self.assertNumQueries(3):
+            status = outround_tab_logic.OutroundStatus.load()
+
+        losers = {outround.loser.id for outround in Outround.objects.all()}
+        breakers = BreakingTeam.objects.filter(type_of_team=BreakingTeam.VARSITY)
+        assert status.eliminated == losers
+        assert status.remaining[BreakingTeam.VARSITY] == [
+            t.team_id for t in breakers.order_by("pk") if t.team_id not in losers
+        ]
+        assert status.enough_rooms(BreakingTeam.VARSITY) == (
+            True, (Room.objects.count(), len(breakers) // 4)
+        )
@@ -1,5 +1,8 @@
+from unittest import mock
+
+from django.core.cache import caches
 from django.db import transaction
-from django.test import TestCase
+from django.test import TestCase, override_settings
 import pytest
 
 from mittab.apps.tab.models import (
@@ -12,7 +15,8 @@ from mittab.apps.tab.models import (
     TabSettings,
     Team,
 )
-from mittab.libs import assign_judges, assign_rooms
+from mittab.libs import assign_judges, assign_rooms, jobs, matching, offload
+from mittab.libs import profiler
 from mittab.libs import tab_logic
 from mittab.libs.cacheing import cache_logic
 from mittab.libs.tests.helpers import generate_results
@@ -138,6 +142,26 @@ class TestPairingLogic(TestCase):
             school_team.school = new_school
             school_team.save()
 
+    def test_weight_edges_match_calc_weight(self):
+        first_round = self.pair_round()
+        generate_results(first_round, seed="weights")
+        teams = list(Team.with_preloaded_relations_for_tabbing().order_by("pk"))
+        weights = tab_logic.get_weights()
+        n = len(teams)
+
+        for current_round in (1, 2):
+            expected = [
+                (i, j, tab_logic.calc_weight(
+                    teams[i], teams[j], i, j, teams[n - i - 1], teams[n - j - 1],
+                    n - i - 1, n - j - 1, weights, current_round, 5,
+                ))
+                for i in range(n) for j in range(i)
+            ]
+            self.assertEqual(
+                tab_logic.calc_weight_edges(teams, weights, current_round, 5),
+                expected,
+            )
+
     def test_repair_is_deterministic(self):
         paired_round = self.pair_round()
         baseline_pairings = self.pairings_for(paired_round)
@@ -146,6 +170,77 @@ class TestPairingLogic(TestCase):
             self.re_pair_latest_round()
             self.assertEqual(self.pairings_for(paired_round), baseline_pairings)
 
+    def test_brackets_paired_in_the_process_pool_match_inline(self):
+        first_round = self.pair_round()
+        generate_results(first_round, seed="pool")
+        second_round = self.pair_round()
+        baseline_pairings = self.pairings_for(second_round)
+
+        with override_settings(CPU_POOL_WORKERS=2, MATCHING_OFFLOAD_MIN_EDGES=1):
+            try:
+                self.re_pair_latest_round()
+            finally:
+                offload.shutdown()
+        self.assertEqual(self.pairings_for(second_round), baseline_pairings)
+
+    def test_repair_only_solves_brackets_that_changed(self):
+        first_round = self.pair_round()
+        generate_results(first_round, seed="warm")
+        second_round = self.pair_round()
+        baseline_pairings = self.pairings_for(second_round)
+
+        with mock.patch.object(matching, "max_weight_matchings",
+                               wraps=matching.max_weight_matchings) as solve:
+            cache_logic.clear_cache()
+            tab_logic.re_pair_current_round()
+        solve.assert_called_once_with([], maxcardinality=True)
+        self.assertEqual(self.pairings_for(second_round), baseline_pairings)
+        self.assertEqual(TabSettings.get("cur_round"), second_round + 1)
+
+    def test_re_pair_preview_does_not_save(self):
+        first_round = self.pair_round()
+        generate_results(first_round, seed="preview")
+        second_round = self.pair_round()
+        baseline_pairings = self.pairings_for(second_round)
+
+        diff = tab_logic.preview_re_pair()
+        self.assertEqual((diff.added, diff.removed), ([], []))
+        self.assertEqual(diff.unchanged, len(baseline_pairings))
+
+        late = Round.objects.filter(round_number=second_round).first().gov_team
+        late.checked_in = False
+        late.save()
+        diff = tab_logic.preview_re_pair()
+        self.assertIn(late, [gov for gov, _ in diff.removed])
+        self.assertNotIn(late, [team for pair in diff.added for team in pair])
+        self.assertEqual(self.pairings_for(second_round), baseline_pairings)
+        self.assertEqual(TabSettings.get("cur_round"), second_round + 1)
+
+    def test_re_pair_preview_is_stored_by_its_job(self):
+        first_round = self.pair_round()
+        generate_results(first_round, seed="preview job")
+        second_round = self.pair_round()
+        caches[profiler.PROFILER_CACHE_ALIAS].clear()
+        self.assertEqual(tab_logic.stored_re_pair_preview(second_round),
+                         (None, None))
+
+        late = Round.objects.filter(round_number=second_round).first().gov_team
+        late.checked_in = False
+        late.save()
+        job = jobs.enqueue("preview_re_pair")
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, job.SUCCEEDED)
+        diff, previewed_at = tab_logic.stored_re_pair_preview(second_round)
+        self.assertIsNotNone(previewed_at)
+        self.assertIn(late, [gov for gov, _ in diff.removed])
+        # The dry run isn't recorded as a run of pair_round
+        self.assertNotIn("pair_round", profiler.recent_runs())
+
+        tab_logic.clear_re_pair_preview(second_round)
+        self.assertEqual(tab_logic.stored_re_pair_preview(second_round),
+                         (None, None))
+
     def test_repair_recovers_after_data_mutations(self):
         first_round = self.pair_round()
         generate_results(first_round, seed="repair")
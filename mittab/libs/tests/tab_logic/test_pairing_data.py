@@ -0,0 +1,40 @@
+from django.test import TestCase
+import pytest
+
+from mittab.apps.tab.models import TabSettings
+from mittab.libs import tab_logic
+from mittab.libs.tab_logic.pairing_data import load_round_pairings
+from mittab.libs.tab_logic.standings import refresh_standings
+
+
+@pytest.mark.django_db
+class TestPairingData(TestCase):
+    """Tests that the flat pairing loader agrees with sorted_pairings"""
+
+    fixtures = ["testing_finished_db"]
+    pytestmark = pytest.mark.django_db(transaction=True)
+
+    def setUp(self):
+        super().setUp()
+        TabSettings.set("cur_round", 6)
+
+    def test_records_match_sorted_pairings(self):
+        for round_number in (1, 5):
+            expected = tab_logic.sorted_pairings(round_number)
+            actual, _ = load_round_pairings(round_number)
+
+            assert [p.id for p in actual] == [p.id for p in expected]
+            for record, round_obj in zip(actual, expected):
+                assert record.gov_team.id == round_obj.gov_team_id
+                assert record.opp_team.id == round_obj.opp_team_id
+                assert record.chair_id == round_obj.chair_id
+                assert record.victor == round_obj.victor
+                assert [j.id for j in record.judges] == \
+                    [j.id for j in round_obj.judges.all()]
+                assert getattr(record.room, "id", None) == round_obj.room_id
+
+    def test_query_count_does_not_grow_with_the_round(self):
+        standings = refresh_standings()
+        with self.assertNumQueries(8):
+            pairings, _ = load_round_pairings(5, standings=standings)
+        assert pairings
@@ -0,0 +1,86 @@
+from django.test import TestCase
+import pytest
+
+from mittab.apps.tab.models import Debater, TabSettings, Team
+from mittab.libs.tab_logic.rankings import (
+    DebaterScore,
+    TeamScore,
+    rank_speakers,
+    rank_teams,
+)
+from mittab.libs.tab_logic import stats
+from mittab.libs.tab_logic.snapshot import TournamentSnapshot
+from mittab.libs.tests.assertion import assert_nearly_equal
+
+
+@pytest.mark.django_db
+class TestTournamentSnapshot(TestCase):
+    """Tests that snapshot stats match the per-object stats in stats.py"""
+
+    fixtures = ["testing_finished_db"]
+    pytestmark = pytest.mark.django_db(transaction=True)
+
+    def setUp(self):
+        super().setUp()
+        TabSettings.set("cur_round", 6)
+
+    def assert_scores_match(self, expected, actual, name):
+        msg = f"{name} - snapshot: {actual}, expected: {expected}"
+        for left, right in zip(expected, actual):
+            assert_nearly_equal(left, right, message=msg)
+
+    def test_team_stats_match_stats_module(self):
+        snapshot = TournamentSnapshot.load()
+        for round_filter in ({}, {"exclude_round": 5}, {"up_to_round": 3}):
+            for team in Team.objects.order_by("pk"):
+                self.assert_scores_match(
+                    TeamScore(team, **round_filter).scoring_tuple(),
+                    TeamScore(team, snapshot=snapshot,
+                              **round_filter).scoring_tuple(),
+                    team.name,
+                )
+
+    def test_debater_stats_match_stats_module(self):
+        snapshot = TournamentSnapshot.load()
+        for debater in Debater.objects.order_by("pk"):
+            self.assert_scores_match(
+                DebaterScore(debater).scoring_tuple(),
+                DebaterScore(debater, snapshot=snapshot).scoring_tuple(),
+                debater.name,
+            )
+
+    def test_debater_vectors_match_stats_module(self):
+        snapshot = TournamentSnapshot.load()
+        for round_filter in ({}, {"exclude_round": 5}, {"up_to_round": 3}):
+            for debater in Debater.objects.order_by("pk"):
+                vectors = snapshot.debater_vectors(debater.id, **round_filter)
+                for average_ironmen, speaks, ranks in (
+                        (True, vectors.speaks, vectors.ranks),
+                        (False, vectors.all_speaks, vectors.all_ranks)):
+                    self.assert_scores_match(
+                        stats.speaks_for_debater(debater, average_ironmen,
+                                                 **round_filter),
+                        speaks, debater.name)
+                    self.assert_scores_match(
+                        stats.ranks_for_debater(debater, average_ironmen,
+                                                **round_filter),
+                        ranks, debater.name)
+
+    def test_load_uses_constant_queries(self):
+        TabSettings.get("cur_round")
+        TabSettings.get("lenient_late", 0)
+        team_ids = list(Team.objects.values_list("id", flat=True))
+        with self.assertNumQueries(5):
+            snapshot = TournamentSnapshot.load()
+        with self.assertNumQueries(0):
+            for team_id in team_ids:
+                snapshot.team_stats(team_id)
+
+    def test_rankings_are_ordered_the_same(self):
+        expected_teams = sorted(TeamScore(t) for t in Team.objects.all())
+        expected_debaters = sorted(DebaterScore(d) for d in Debater.objects.all())
+
+        assert [s.team.id for s in rank_teams()] == \
+            [s.team.id for s in expected_teams]
+        assert [s.debater.id for s in rank_speakers()] == \
+            [s.debater.id for s in expected_debaters]
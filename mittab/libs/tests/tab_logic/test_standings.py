@@ -0,0 +1,122 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+import pytest
+
+from mittab.apps.tab.models import (
+    Bye,
+    Debater,
+    DebaterStanding,
+    Round,
+    RoundStats,
+    TabSettings,
+    Team,
+    TeamStanding,
+)
+from mittab.apps.tab.views.debater_views import get_speaker_rankings
+from mittab.libs.cacheing.cache_logic import stat_memo_scope
+from mittab.libs.tab_logic.snapshot import TournamentSnapshot
+from mittab.libs.tab_logic.stats import debater_team
+from mittab.libs.tab_logic.standings import refresh_standings
+from mittab.libs.tests.assertion import assert_nearly_equal
+
+
+@pytest.mark.django_db
+class TestStandings(TestCase):
+    """Tests that stored standings track the results they are computed from"""
+
+    fixtures = ["testing_finished_db"]
+    pytestmark = pytest.mark.django_db(transaction=True)
+
+    def setUp(self):
+        super().setUp()
+        TabSettings.set("cur_round", 6)
+
+    def assert_matches_snapshot(self, standings):
+        snapshot = TournamentSnapshot.load()
+        for team_id in Team.objects.values_list("id", flat=True):
+            for exclude_round in (None, 5):
+                expected = snapshot.team_stats(team_id, exclude_round)
+                actual = standings.team_stats(team_id, exclude_round)
+                for left, right in zip(expected, actual):
+                    assert_nearly_equal(left, right, message=f"team {team_id}")
+        for debater_id in Debater.objects.values_list("id", flat=True):
+            expected = snapshot.debater_stats(debater_id)
+            actual = standings.debater_stats(debater_id)
+            for left, right in zip(expected, actual):
+                assert_nearly_equal(left, right, message=f"debater {debater_id}")
+
+    def test_initial_refresh_matches_snapshot(self):
+        standings = refresh_standings()
+        assert TeamStanding.objects.count() == 2 * Team.objects.count()
+        assert DebaterStanding.objects.count() == Debater.objects.count()
+        self.assert_matches_snapshot(standings)
+
+    def test_clean_refresh_does_not_recompute(self):
+        refresh_standings()
+        TabSettings.get("cur_round")
+        TabSettings.get("lenient_late", 0)
+        # Two standings tables and the team and debater ids, no results
+        with self.assertNumQueries(4):
+            refresh_standings()
+
+    def test_speaker_rankings_take_fixed_queries(self):
+        def speaker_ranking_queries():
+            refresh_standings()
+            TabSettings.get("cur_round")
+            with CaptureQueriesContext(connection) as queries:
+                debaters, _ = get_speaker_rankings()
+            return len(queries), debaters
+
+        query_count, debaters = speaker_ranking_queries()
+        assert all(entry[3] == debater_team(entry[0]) for entry in debaters)
+
+        school = Team.objects.first().school
+        for i in range(10):
+            team = Team.objects.create(name=f"Extra team {i}", school=school,
+                                       seed=Team.UNSEEDED)
+            team.debaters.add(Debater.objects.create(
+                name=f"Extra debater {i}", novice_status=Debater.VARSITY
+            ))
+        grown_count, debaters = speaker_ranking_queries()
+        assert len(debaters) == Debater.objects.count()
+        assert grown_count == query_count
+
+    def test_debater_team_index_matches_debater_team(self):
+        debaters = list(Debater.objects.all())
+        # Membership, then the teams with their byes and no-shows
+        with stat_memo_scope(), self.assertNumQueries(4):
+            teams = [debater_team(debater) for debater in debaters]
+        assert teams == [debater.team() for debater in debaters]
+
+    def test_ballot_edit_only_recomputes_affected_rows(self):
+        refresh_standings()
+        round_obj = Round.objects.filter(round_number=3).first()
+
+        round_obj.victor = Round.OPP if round_obj.victor == Round.GOV else Round.GOV
+        round_obj.save()
+        stat = RoundStats.objects.filter(round=round_obj).first()
+        stat.speaks = Decimal("15.0")
+        stat.save()
+
+        dirty = set(TeamStanding.objects.filter(dirty=True)
+                    .values_list("team_id", flat=True))
+        assert dirty == {round_obj.gov_team_id, round_obj.opp_team_id}
+        assert DebaterStanding.objects.get(debater=stat.debater).dirty
+
+        standings = refresh_standings()
+        assert not TeamStanding.objects.filter(dirty=True).exists()
+        assert not DebaterStanding.objects.filter(dirty=True).exists()
+        # Opponents' opp strength moved with the flipped decision too
+        self.assert_matches_snapshot(standings)
+
+    def test_bye_and_setting_changes_are_picked_up(self):
+        refresh_standings()
+        team = Team.objects.first()
+        Bye.objects.create(bye_team=team, round_number=6)
+        TabSettings.set("cur_round", 7)
+
+        self.assert_matches_snapshot(refresh_standings())
+        assert set(TeamStanding.objects.values_list("cur_round", flat=True)) == {7}
@@ -0,0 +1,122 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+import pytest
+
+from mittab.apps.tab.models import (
+    DebaterStanding,
+    Round,
+    RoundStats,
+    TabSettings,
+    TeamStanding,
+)
+from mittab.libs import ballots, errors
+from mittab.libs.cacheing import cache_logic
+from mittab.libs.tab_logic import standings
+
+
+@pytest.mark.django_db
+class TestBallots(TestCase):
+    fixtures = ["testing_finished_db"]
+
+    def setUp(self):
+        super().setUp()
+        self.round = Round.objects.filter(roundstats__isnull=False).first()
+
+    def results_of(self, round_obj):
+        return [
+            ballots.SpeakerResult(stats.debater_role, stats.debater_id,
+                                  float(stats.speaks), int(stats.ranks))
+            for stats in RoundStats.objects.filter(round=round_obj)
+        ]
+
+    def test_recommitting_the_same_ballot_changes_nothing(self):
+        standings.refresh_standings()
+        results = self.results_of(self.round)
+        rankings_key = cache_logic.rankings_key("team_rankings")
+
+        changed = ballots.commit_ballot(self.round, self.round.victor, results)
+
+        assert not changed
+        assert cache_logic.rankings_key("team_rankings") == rankings_key
+        assert not TeamStanding.objects.filter(dirty=True).exists()
+        assert not DebaterStanding.objects.filter(dirty=True).exists()
+
+    def test_changed_ballot_is_upserted_and_marks_its_standings(self):
+        standings.refresh_standings()
+        results = self.results_of(self.round)
+        results[0] = results[0]._replace(speaks=results[0].speaks - 1)
+        victor = Round.OPP if self.round.victor == Round.GOV else Round.GOV
+        rankings_key = cache_logic.rankings_key("team_rankings")
+
+        with self.assertNumQueries(9):
+            changed = ballots.commit_ballot(self.round, victor, results)
+
+        assert changed
+        assert cache_logic.rankings_key("team_rankings") != rankings_key
+        self.round.refresh_from_db()
+        assert self.round.victor == victor
+        assert sorted(self.results_of(self.round)) == sorted(results)
+        dirty_teams = set(TeamStanding.objects.filter(dirty=True)
+                          .values_list("team_id", flat=True))
+        assert dirty_teams == {self.round.gov_team_id, self.round.opp_team_id}
+        assert list(DebaterStanding.objects.filter(dirty=True)
+                    .values_list("debater_id", flat=True)) == [results[0].debater_id]
+
+    def test_victor_is_compared_with_the_stored_round(self):
+        standings.refresh_standings()
+        results = self.results_of(self.round)
+        # Another tab edit flipped the result after this round was loaded
+        flipped = Round.OPP if self.round.victor == Round.GOV else Round.GOV
+        Round.objects.filter(pk=self.round.pk).update(victor=flipped)
+
+        changed = ballots.commit_ballot(self.round, self.round.victor, results)
+
+        assert changed
+        dirty_teams = set(TeamStanding.objects.filter(dirty=True)
+                          .values_list("team_id", flat=True))
+        assert dirty_teams == {self.round.gov_team_id, self.round.opp_team_id}
+
+    def test_first_ballot_is_refused_once_the_round_has_one(self):
+        with pytest.raises(errors.BallotAlreadyEnteredError):
+            ballots.commit_ballot(self.round, self.round.victor,
+                                  self.results_of(self.round), first_ballot=True)
+
+    def test_e_ballot_submission_saves_the_ballot(self):
+        standings.refresh_standings()
+        TabSettings.set("cur_round", self.round.round_number + 1)
+        TabSettings.set("pairing_released", 1)
+        RoundStats.objects.filter(round=self.round).delete()
+        self.round.victor = Round.NONE
+        self.round.save()
+        chair = self.round.chair
+        chair.ballot_code = "BALLOT1"
+        chair.save()
+
+        gov = list(self.round.gov_team.debaters.all())
+        opp = list(self.round.opp_team.debaters.all())
+        data = {
+            "round_instance": self.round.pk,
+            "ballot_code": "BALLOT1",
+            "winner": Round.GOV,
+        }
+        for role, debater, speaks, ranks in (
+                ("pm", gov[0], 28, 1), ("mg", gov[-1], 27, 2),
+                ("lo", opp[0], 26, 3), ("mo", opp[-1], 25, 4)):
+            data[f"{role}_debater"] = debater.pk
+            data[f"{role}_speaks"] = speaks
+            data[f"{role}_ranks"] = ranks
+
+        response = Client().post(
+            reverse("enter_e_ballot", args=["BALLOT1"]), data
+        )
+
+        assert response.status_code == 302
+        assert response.url == reverse("view_submitted_ballot",
+                                       kwargs={"ballot_code": "BALLOT1"})
+        self.round.refresh_from_db()
+        assert self.round.victor == Round.GOV
+        assert RoundStats.objects.filter(round=self.round).count() == 4
+        # Standings are left for the next read to recompute
+        dirty_teams = set(TeamStanding.objects.filter(dirty=True)
+                          .values_list("team_id", flat=True))
+        assert dirty_teams == {self.round.gov_team_id, self.round.opp_team_id}
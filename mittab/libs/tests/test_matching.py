@@ -0,0 +1,127 @@
+import random
+from unittest import mock
+
+import pytest
+from django.test import override_settings
+
+from mittab.libs import matching, offload
+
+
+def random_bipartite_edges(rng, num_left, num_right, density):
+    return [
+        (i, num_left + j, rng.choice([rng.randint(-50, 50), rng.random() * 10]))
+        for i in range(num_left)
+        for j in range(num_right)
+        if rng.random() < density
+    ]
+
+
+def summarize(edges, mates):
+    weights = {(min(i, j), max(i, j)): w for i, j, w in edges}
+    pairs = {(min(v, m), max(v, m)) for v, m in enumerate(mates) if m != -1}
+    return len(pairs), sum(weights[pair] for pair in pairs)
+
+
+@pytest.mark.parametrize("maxcardinality", [True, False])
+@pytest.mark.parametrize("seed", range(20))
+def test_assignment_backend_matches_blossom_totals(seed, maxcardinality):
+    rng = random.Random(seed)
+    num_left, num_right = rng.randint(1, 12), rng.randint(1, 12)
+    edges = random_bipartite_edges(rng, num_left, num_right, rng.random())
+
+    expected = matching.max_weight_matching(
+        edges, maxcardinality, num_left=num_left, backend="blossom"
+    )
+    actual = matching.max_weight_matching(
+        edges, maxcardinality, num_left=num_left, backend="assignment"
+    )
+
+    assert len(actual) == len(expected)
+    expected_size, expected_total = summarize(edges, expected)
+    actual_size, actual_total = summarize(edges, actual)
+    assert actual_size == expected_size
+    assert actual_total == pytest.approx(expected_total)
+    for vertex, mate in enumerate(actual):
+        assert mate == -1 or actual[mate] == vertex
+
+
+@pytest.mark.parametrize("backend", ["blossom", "assignment"])
+def test_max_cardinality_uses_negative_edges(backend):
+    # Judge weights are never positive, e.g. with a rejudge penalty
+    edges = [(0, 2, -100), (0, 3, -101), (1, 3, -100)]
+
+    mates = matching.max_weight_matching(edges, True, num_left=2,
+                                         backend=backend)
+
+    assert mates == [2, 3, 0, 1]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_assignment_backend_matches_blossom_on_negative_weights(seed):
+    rng = random.Random(seed)
+    num_left, num_right = rng.randint(1, 10), rng.randint(1, 10)
+    edges = [edge for edge in random_bipartite_edges(rng, num_left, num_right,
+                                                     rng.random())
+             if edge[2] < 0]
+
+    expected = matching.max_weight_matching(
+        edges, True, num_left=num_left, backend="blossom"
+    )
+    actual = matching.max_weight_matching(
+        edges, True, num_left=num_left, backend="assignment"
+    )
+
+    expected_size, expected_total = summarize(edges, expected)
+    actual_size, actual_total = summarize(edges, actual)
+    assert actual_size == expected_size
+    assert actual_total == pytest.approx(expected_total)
+
+
+def test_assignment_backend_rejects_edges_within_a_side():
+    with pytest.raises(ValueError):
+        matching.max_weight_matching([(0, 1, 1)], num_left=2, backend="assignment")
+
+
+@pytest.mark.parametrize("backend", ["blossom", "assignment"])
+def test_large_matchings_run_in_the_process_pool(backend):
+    rng = random.Random(7)
+    edges = random_bipartite_edges(rng, 10, 10, 0.8)
+    expected = matching.max_weight_matching(edges, True, num_left=10,
+                                            backend=backend)
+
+    with override_settings(CPU_POOL_WORKERS=1, MATCHING_OFFLOAD_MIN_EDGES=1):
+        try:
+            assert matching.max_weight_matching(
+                edges, True, num_left=10, backend=backend
+            ) == expected
+        finally:
+            offload.shutdown()
+
+
+@pytest.mark.parametrize("backend", ["blossom", "assignment"])
+@pytest.mark.parametrize("seed", range(10))
+def test_dense_assignment_matches_blossom_total(seed, backend):
+    rng = random.Random(seed)
+    num_rows = rng.randint(1, 12)
+    num_cols = rng.randint(num_rows, 15)
+    weights = [[rng.randint(-50, 50) for _ in range(num_cols)]
+               for _ in range(num_rows)]
+    edges = [(i, num_rows + j, weight)
+             for i, row in enumerate(weights)
+             for j, weight in enumerate(row)]
+
+    expected = matching.max_weight_matching(edges, True, num_left=num_rows,
+                                            backend="blossom")
+    columns = matching.max_weight_assignment(weights, backend=backend)
+
+    assert len(set(columns)) == num_rows
+    assert sum(weights[i][j] for i, j in enumerate(columns)) == \
+        summarize(edges, expected)[1]
+
+
+def test_dense_assignment_follows_the_backend_setting():
+    weights = [[3, 1], [2, 4]]
+    with override_settings(MATCHING_BACKEND="blossom"), \
+            mock.patch.object(matching, "hungarian") as hungarian:
+        assert matching.max_weight_assignment(weights) == [0, 1]
+    hungarian.assert_not_called()
@@ -0,0 +1,76 @@
+from django.core.cache import caches
+from django.test import TestCase
+import pytest
+
+from mittab.apps.tab.models import Team
+from mittab.libs import profiler
+
+
+@profiler.profile_operation("inner")
+def inner_operation():
+    profiler.checkpoint("count")
+    Team.objects.count()
+
+
+@profiler.profile_operation("outer")
+def outer_operation(fail=False):
+    profiler.checkpoint("load")
+    list(Team.objects.all())
+    with profiler.stage("matching"):
+        Team.objects.exists()
+    profiler.checkpoint("nested")
+    profiler.note("nested next")
+    inner_operation()
+    if fail:
+        raise ValueError("boom")
+
+
+@pytest.mark.django_db
+class TestProfiler(TestCase):
+    fixtures = ["testing_db"]
+
+    def setUp(self):
+        super().setUp()
+        caches[profiler.PROFILER_CACHE_ALIAS].clear()
+
+    def test_stages_split_time_and_queries(self):
+        outer_operation()
+
+        runs = profiler.recent_runs()
+        assert list(runs) == ["outer"]
+        run = runs["outer"][0]
+        stages = {stage["name"]: stage for stage in run["stages"]}
+        assert list(stages) == ["load", "matching", "nested", "inner",
+                                "inner.count"]
+        assert stages["load"]["queries"] == 1
+        assert stages["matching"]["queries"] == 1
+        assert stages["inner.count"]["queries"] == 1
+        assert stages["nested"]["queries"] == 0
+        assert run["queries"] == 3
+        assert run["error"] is None
+        assert run["notes"] == ["nested next"]
+        assert run["seconds"] == pytest.approx(
+            sum(stage["seconds"] for stage in run["stages"]), abs=1e-3
+        )
+
+    def test_keeps_the_most_recent_runs(self):
+        for _ in range(profiler.PROFILER_HISTORY + 2):
+            inner_operation()
+        with pytest.raises(ValueError):
+            outer_operation(fail=True)
+
+        runs = profiler.recent_runs()
+        assert len(runs["inner"]) == profiler.PROFILER_HISTORY
+        assert runs["outer"][0]["error"] == "ValueError: boom"
+
+    def test_stages_are_noops_outside_an_operation(self):
+        with profiler.stage("matching"):
+            profiler.checkpoint("load")
+        assert profiler.current_run() is None
+        assert not profiler.recent_runs()
+
+    def test_unrecorded_operations_are_not_kept(self):
+        with profiler.unrecorded():
+            outer_operation()
+        assert profiler.current_run() is None
+        assert not profiler.recent_runs()
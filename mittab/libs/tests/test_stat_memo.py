@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+from mittab.libs.cacheing import cache_logic
+
+
+calls = []
+
+
+@cache_logic.stat_memo
+def fake_stat(team, exclude_round=None, up_to_round=None):
+    calls.append((team.pk, exclude_round, up_to_round))
+    return len(calls)
+
+
+def setup_function():
+    calls.clear()
+
+
+def test_memo_is_keyed_by_pk_and_round_filters():
+    team = SimpleNamespace(pk=1)
+    same_team = SimpleNamespace(pk=1)
+    other_team = SimpleNamespace(pk=2)
+
+    with cache_logic.stat_memo_scope() as memo:
+        assert fake_stat(team) == fake_stat(same_team)
+        fake_stat(other_team)
+        fake_stat(team, 3)
+        fake_stat(team, None, 3)
+
+        assert memo.counters() == {"hits": 1, "misses": 4, "size": 4}
+
+    assert len(calls) == 4
+
+
+def test_memo_does_not_outlive_scope():
+    team = SimpleNamespace(pk=1)
+    with cache_logic.stat_memo_scope():
+        fake_stat(team)
+    with cache_logic.stat_memo_scope():
+        fake_stat(team)
+    fake_stat(team)
+    fake_stat(team)
+
+    assert len(calls) == 4
+    assert cache_logic.current_stat_memo() is None
+
+
+def test_nested_scopes_share_memo_and_invalidate():
+    team = SimpleNamespace(pk=1)
+    with cache_logic.stat_memo_scope() as outer:
+        fake_stat(team)
+        with cache_logic.stat_memo_scope() as inner:
+            assert inner is outer
+            fake_stat(team)
+        cache_logic.invalidate_stat_memo()
+        fake_stat(team)
+
+        assert outer.hits == 1
+        assert outer.misses == 2
+
+    assert len(calls) == 2
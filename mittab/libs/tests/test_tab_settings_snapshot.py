@@ -0,0 +1,47 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+import pytest
+
+from mittab.apps.tab import models
+from mittab.apps.tab.models import TabSettings
+from mittab.libs.cacheing import cache_logic
+
+
+@pytest.mark.django_db
+class TestTabSettingsSnapshot(TestCase):
+    fixtures = ["testing_db"]
+
+    def test_settings_are_loaded_with_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(50):
+                TabSettings.get("cur_round")
+                TabSettings.get("tot_rounds")
+                TabSettings.get("missing_setting", 0)
+        assert len(queries) == 1
+
+    def test_saving_a_setting_reloads_the_snapshot(self):
+        TabSettings.get("cur_round")
+        TabSettings.set("cur_round", 4)
+        assert TabSettings.get("cur_round") == 4
+        TabSettings.set("new_setting", "value")
+        assert TabSettings.get("new_setting") == "value"
+
+        TabSettings.objects.get(key="new_setting").delete()
+        with pytest.raises(ValueError):
+            TabSettings.get("new_setting")
+
+    def test_changes_from_other_workers_are_picked_up(self):
+        TabSettings.get("cur_round")
+        # Another worker saves a setting and changes the version token
+        TabSettings.objects.filter(key="cur_round").update(value=7)
+        snapshot = models._tab_settings_snapshot  # pylint: disable=protected-access
+        caches[cache_logic.SHARED].set(snapshot.version_key, "another-worker", None)
+
+        with mock.patch.object(cache_logic, "SNAPSHOT_REVALIDATE_SECONDS", 60):
+            assert TabSettings.get("cur_round") != 7
+        with mock.patch.object(cache_logic, "SNAPSHOT_REVALIDATE_SECONDS", 0):
+            assert TabSettings.get("cur_round") == 7
@@ -0,0 +1,37 @@
+import json
+import os
+import tempfile
+
+import pytest
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from mittab.apps.tab.models import Outround, Round, Team
+
+
+@pytest.mark.django_db(transaction=True)
+class TestBenchCommand(TransactionTestCase):
+    def test_bench_runs_every_stage_and_writes_results(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "bench.json")
+            call_command("bench", teams=16, rounds=2, var_break=4, nov_break=2,
+                         output=output, interactive=False)
+            with open(output, encoding="utf-8") as results_file:
+                results = json.load(results_file)
+
+        assert results["config"]["teams"] == 16
+        stages = [(stage["stage"], stage["round"]) for stage in results["stages"]]
+        assert stages == [
+            ("pair_round", 1), ("add_judges", 1), ("add_rooms", 1),
+            ("pair_round", 2), ("add_judges", 2), ("add_rooms", 2),
+            ("rank_teams", None), ("rank_speakers", None),
+            ("perform_the_break", None), ("add_outround_judges", None),
+            ("add_outround_rooms", None),
+        ]
+        assert all(stage["queries"] > 0 for stage in results["stages"])
+        assert all(stage["peak_memory_kb"] is not None
+                   for stage in results["stages"])
+
+        assert Team.objects.count() == 16
+        assert not Round.objects.filter(victor=Round.NONE).exists()
+        assert Outround.objects.exclude(chair=None).count() == 3
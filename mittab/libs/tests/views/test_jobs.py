@@ -0,0 +1,79 @@
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from mittab.apps.tab.models import Round, TabJob, TabSettings
+from mittab.libs import jobs
+
+
+@jobs.register_job("test_progress", "Testing")
+def progress_job(fail=False):
+    jobs.report_progress(50, "Halfway")
+    assert jobs.job_progress(jobs.current_job())["message"] == "Halfway"
+    if fail:
+        raise ValueError("boom")
+    return True, "All done"
+
+
+@pytest.mark.django_db
+class TestJobs(TestCase):
+    fixtures = ["testing_db"]
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.login(username="tab", password="password")
+
+    def test_jobs_run_in_the_request_without_a_worker(self):
+        job = jobs.enqueue("test_progress")
+        assert job.status == TabJob.SUCCEEDED
+        assert job.result_message == "All done"
+
+        failed = jobs.enqueue("test_progress", fail=True)
+        assert failed.status == TabJob.FAILED
+        assert failed.result_message == "Got error: boom"
+
+    @override_settings(TAB_JOBS_IN_BACKGROUND=True)
+    def test_worker_runs_the_queue_once(self):
+        job = jobs.enqueue("test_progress")
+        assert jobs.enqueue("test_progress").pk == job.pk
+        assert jobs.job_progress(job) == {"percent": 0, "message": "Queued"}
+
+        call_command("run_jobs", once=True)
+
+        job.refresh_from_db()
+        assert job.status == TabJob.SUCCEEDED
+        assert jobs.job_progress(job) == {"percent": 100, "message": "All done"}
+        assert jobs.enqueue("test_progress").pk != job.pk
+
+    def test_worker_fails_jobs_it_was_running_when_it_stopped(self):
+        job = TabJob.objects.create(kind="test_progress", status=TabJob.RUNNING)
+        with mock.patch("mittab.libs.backup.backup_round"):
+            jobs.work(once=True)
+        job.refresh_from_db()
+        assert job.status == TabJob.FAILED
+
+    @override_settings(TAB_JOBS_IN_BACKGROUND=True)
+    def test_pairing_is_queued_and_polled(self):
+        TabSettings.set("cur_round", 1)
+        response = self.client.post(reverse("pair_round"))
+        job = TabJob.objects.get(kind="pair_round")
+        assert response.url == reverse("job_status", args=[job.pk])
+
+        status = self.client.get(response.url)
+        assert status.status_code == 200
+        progress = self.client.get(reverse("job_progress", args=[job.pk])).json()
+        assert progress["status"] == TabJob.QUEUED
+        assert not progress["finished"]
+
+        with mock.patch("mittab.libs.backup.backup_round"):
+            jobs.work(once=True)
+        job.refresh_from_db()
+        assert job.status == TabJob.SUCCEEDED, job.result_message
+        assert Round.objects.filter(round_number=1).exists()
+        assert TabSettings.get("cur_round") == 2
+        finished = self.client.get(response.url)
+        assert finished.url == reverse("view_status")
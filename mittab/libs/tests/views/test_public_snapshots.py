@@ -0,0 +1,171 @@
+import gzip
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+from django.conf import settings
+from django.core.cache import caches
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from mittab.apps.tab.models import TabSettings
+from mittab.libs.cacheing import cache_logic, data_versions, public_snapshots
+from mittab.libs.cacheing.public_cache import (
+    build_cache_key,
+    invalidate_all_public_caches,
+    invalidate_inround_public_pairings_cache,
+    invalidate_public_judges_cache,
+)
+
+
+@pytest.mark.django_db(transaction=True)
+class TestPublicSnapshots(TestCase):
+    fixtures = ["testing_finished_db"]
+
+    def setUp(self):
+        super().setUp()
+        self.cache = caches["public"]
+        self.cache.clear()
+        cache_logic.clear_cache()
+        self.client = Client()
+        self.url = reverse("pretty_pair")
+        self.cache_key = build_cache_key("pretty_pair", {}, False)
+        TabSettings.set("cur_round", 3)
+        TabSettings.set("pairing_released", 1)
+
+    def tearDown(self):
+        self.cache.clear()
+        super().tearDown()
+
+    def snapshot(self):
+        return self.cache.get(public_snapshots.snapshot_key(self.cache_key))
+
+    def test_second_visit_is_served_compressed_from_the_snapshot(self):
+        first = self.client.get(self.url)
+        assert self.snapshot() is not None
+
+        plain = self.client.get(self.url)
+        compressed = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, br")
+
+        assert plain.content == first.content
+        assert plain["ETag"] == self.snapshot()["etag"]
+        assert compressed["Content-Encoding"] in ("gzip", "br")
+        assert "Accept-Encoding" in compressed["Vary"]
+        if compressed["Content-Encoding"] == "gzip":
+            assert gzip.decompress(compressed.content) == first.content
+
+    def test_invalidation_makes_the_snapshot_stale(self):
+        released = self.client.get(self.url).content
+
+        TabSettings.set("pairing_released", 0)
+        invalidate_inround_public_pairings_cache()
+
+        # No publish ran, so the visitor renders the page themselves
+        unreleased = self.client.get(self.url).content
+        assert unreleased != released
+        assert self.client.get(self.url).content == unreleased
+
+    @override_settings(PUBLIC_SNAPSHOTS_IN_BACKGROUND=False)
+    def test_invalidation_republishes_the_snapshot_on_commit(self):
+        self.client.get(self.url)
+        old = self.snapshot()
+
+        TabSettings.set("pairing_released", 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_inround_public_pairings_cache()
+
+        new = self.snapshot()
+        assert new["versions"] != old["versions"]
+        assert new["etag"] != old["etag"]
+        assert self.cache.get(public_snapshots.publish_lock_key(self.cache_key)) \
+            is None
+        assert self.client.get(self.url)["ETag"] == new["etag"]
+
+    def test_authenticated_visitors_are_not_served_snapshots(self):
+        self.client.get(self.url)
+        self.client.login(username="tab", password="password")
+        self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        assert not response.has_header("Content-Encoding")
+
+    def test_conditional_requests_get_a_304_until_the_page_changes(self):
+        first = self.client.get(self.url)
+        etag, last_modified = first["ETag"], first["Last-Modified"]
+
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        assert not_modified.status_code == 304
+        assert not not_modified.content
+        assert not_modified["ETag"] == etag
+        assert not_modified["Last-Modified"] == last_modified
+        since = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        assert since.status_code == 304
+
+        TabSettings.set("pairing_released", 0)
+        invalidate_inround_public_pairings_cache()
+
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        assert changed.status_code == 200
+        assert changed["ETag"] != etag
+
+    def test_authenticated_pages_answer_conditional_requests(self):
+        self.client.login(username="tab", password="password")
+        first = self.client.get(self.url)
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        assert not_modified.status_code == 304
+
+        invalidate_inround_public_pairings_cache()
+        assert self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=first["ETag"]
+        ).status_code == 200
+
+    def test_invalidation_only_bumps_a_version(self):
+        self.client.login(username="tab", password="password")
+        self.client.get(self.url)
+        keys = set(self.cache._cache)  # pylint: disable=protected-access
+
+        invalidate_inround_public_pairings_cache()
+
+        assert keys < set(self.cache._cache)  # pylint: disable=protected-access
+        assert self.cache.get(data_versions.version_key(
+            data_versions.PAIRINGS)) == 1
+
+    def test_pages_only_go_stale_when_their_data_changes(self):
+        self.client.get(self.url)
+        etag = self.snapshot()["etag"]
+
+        invalidate_public_judges_cache()
+        assert self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        invalidate_all_public_caches()
+        assert self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    def test_the_job_worker_finds_public_views_without_importing_them(self):
+        # The job worker publishes snapshots without ever importing the views
+        script = (
+            "import django; django.setup()\n"
+            "from mittab.libs.cacheing import public_snapshots\n"
+            f"print(public_snapshots.public_view({self.url!r}).__name__)\n"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        result = subprocess.run([sys.executable, "-c", script], env=env,
+                                capture_output=True, text=True, check=True)
+        assert result.stdout.split()[-1] == "pretty_pair"
+        assert public_snapshots.public_view(reverse("index")) is None
+
+    def test_concurrent_first_renders_keep_every_target(self):
+        key = public_snapshots.targets_key(data_versions.PAIRINGS)
+        lock_key = f"{key}:lock"
+        # Another worker is recording its page
+        self.cache.add(lock_key, True)
+        waiting = threading.Thread(target=public_snapshots.remember_target, args=(
+            self.cache, "pv:first", {}, [data_versions.PAIRINGS]))
+        waiting.start()
+        self.cache.set(key, {"pv:second": ({}, [data_versions.PAIRINGS])}, None)
+        self.cache.delete(lock_key)
+        waiting.join()
+
+        assert set(self.cache.get(key)) == {"pv:first", "pv:second"}
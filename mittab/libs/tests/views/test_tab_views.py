@@ -112,6 +112,7 @@ class TestTabViews(TestCase):
             (reverse("rank_debaters_ajax"), "Debater Rankings"),
             (reverse("rank_debaters"), "Varsity Ranking"),
             (reverse("view_status"), "Round Status for Round"),
+            (reverse("operation_profiles"), "rank_teams"),
             (reverse("view_rounds"), "Rounds"),
             (reverse("view_round", args=[round_obj.round_number]), "Round"),
             (reverse("add_scratch"), "Add Scratch"),
@@ -20,6 +20,13 @@ BLACK_ROD_API_BASE_URL = os.environ.get(
 ).rstrip("/")
 BLACK_ROD_PRIVATE_API_TOKEN = os.environ.get("BLACK_ROD_PRIVATE_API_TOKEN", "")
 
+# Solver for judge and room assignment, see mittab/libs/matching.py.
+# "blossom" forces the general-graph reference solver everywhere.
+MATCHING_BACKEND = os.environ.get("MITTAB_MATCHING_BACKEND", "assignment")
+# Processes per web or job worker for CPU bound computations (see
+# mittab/libs/offload.py), 0 computes them in the calling process
+CPU_POOL_WORKERS = int(os.environ.get("MITTAB_CPU_POOL_WORKERS", 0))
+
 ALLOWED_HOSTS = ["*"]
 
 # Application definition
@@ -41,6 +48,7 @@ MIDDLEWARE = (
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "mittab.apps.tab.middleware.TournamentStatusCheck",
     "mittab.apps.tab.middleware.Login",
+    "mittab.apps.tab.middleware.StatMemoScope",
 )
 
 if os.environ.get("SILK_ENABLED"):
@@ -193,8 +201,19 @@ if os.environ.get("mittab_env") not in [
 else:
     CACHES["public"] = {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        # Kept apart from "default", like memcached is in production, so
+        # clearing the stats cache doesn't clear it
+        "LOCATION": "public",
     }
 
+# The tab operation profiler keeps its runs in the cache shared by every worker
+PROFILER_CACHE_ALIAS = "public"
+PROFILER_HISTORY = int(os.environ.get("MITTAB_PROFILER_HISTORY", 10))
+
+# Pairing, assignment and the break are queued for `manage.py run_jobs` when a
+# worker is running, otherwise they run in the request that queued them
+TAB_JOBS_IN_BACKGROUND = os.environ.get("MITTAB_JOB_WORKER") == "1"
+
 DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
 
 
@@ -12,6 +12,7 @@ import mittab.apps.tab.views.team_views as team_views
 import mittab.apps.tab.views.debater_views as debater_views
 import mittab.apps.tab.views.pairing_views as pairing_views
 import mittab.apps.tab.views.outround_pairing_views as outround_pairing_views
+import mittab.apps.tab.views.job_views as job_views
 import mittab.apps.tab.views.motion_views as motion_views
 import mittab.apps.tab.views.staff_invite_views as staff_invite_views
 import mittab.apps.tab.views.tournament_todo_views as tournament_todo_views
@@ -193,6 +194,13 @@ urlpatterns = [
 
     # Pairing related
     path("pairings/status/", pairing_views.view_status, name="view_status"),
+    path("pairings/status/profiles/",
+         pairing_views.operation_profiles,
+         name="operation_profiles"),
+    path("jobs/<int:job_id>/", job_views.job_status, name="job_status"),
+    path("jobs/<int:job_id>/progress/",
+         job_views.job_progress,
+         name="job_progress"),
     path("pairings/quick_judge_checkin/",
          pairing_views.quick_judge_checkin,
          name="quick_judge_checkin"),